@@ -2,125 +2,243 @@
 """
 Add Geometric Elements and Starting Diagram to deconstruct_parallel_symbols.json
 Copies geometric elements and starting diagram from math_solution_standard.json
+
+merge_geometric_elements() works on the in-memory documents: geo_scriptwriter_parallel.py
+hands it the timing data it has just built, so nothing is read back from disk, and the
+merged document is serialized once to geometric_elements_with_timing.json.
+
+Both inputs are checked first (validate_merge_inputs): steps and sentences must have the
+expected types and the two documents must describe the same steps with the same number
+of sentences. Malformed LLM output raises GeometricTimingSchemaError here instead of
+failing in the scene code generation or the render.
 """
 
 import json
-from pathlib import Path
+import argparse
+from typing import Any, Dict, List, Optional
+
+from run_context import RunContext
+
+# Fields copied from each geometric element of math_solution_standard.json (no start_time_seconds)
+ELEMENT_FIELDS = ("element_type", "element_id", "animation_type")
+
+class ProblemListError(ValueError):
+    """
+    Raised with every problem a validation found; the message shows the first five.
+    Subclasses name the kind of problem in their description.
+    """
+
+    description = "problems"
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        shown = "; ".join(problems[:5])
+        more = f" (and {len(problems) - 5} more)" if len(problems) > 5 else ""
+        super().__init__(f"{len(problems)} {self.description}: {shown}{more}")
+
+class GeometricTimingSchemaError(ProblemListError):
+    """Raised when the timing data or the standard solution does not have the expected structure."""
+
+    description = "schema problems"
+
+def _check_steps(data: Any, name: str, problems: List[str]) -> Dict[str, dict]:
+    """Check the solution_steps list of a document; returns step_id -> step of the valid steps."""
+    if not isinstance(data, dict) or not isinstance(data.get("solution_steps"), list):
+        problems.append(f"{name}: expected an object with a 'solution_steps' list")
+        return {}
+    if not data["solution_steps"]:
+        problems.append(f"{name}: 'solution_steps' is empty")
+
+    steps = {}
+    for i, step in enumerate(data["solution_steps"]):
+        path = f"{name}.solution_steps[{i}]"
+        if not isinstance(step, dict):
+            problems.append(f"{path}: expected an object")
+            continue
+        step_id = step.get("step_id")
+        if not isinstance(step_id, str) or not step_id:
+            problems.append(f"{path}: missing 'step_id'")
+            continue
+        if step_id in steps:
+            problems.append(f"{path}: duplicate step_id '{step_id}'")
+            continue
+        if not isinstance(step.get("sentences"), list):
+            problems.append(f"{path} ({step_id}): expected a 'sentences' list")
+            continue
+        steps[step_id] = step
+    return steps
+
+def _check_standard_sentence(sentence: Any, path: str, problems: List[str]):
+    if not isinstance(sentence, dict):
+        problems.append(f"{path}: expected an object")
+        return
+    if not isinstance(sentence.get("text"), str):
+        problems.append(f"{path}: missing 'text'")
+    if not isinstance(sentence.get("khan_academy_text", ""), str):
+        problems.append(f"{path}: 'khan_academy_text' must be a string")
+
+    elements = sentence.get("geometric_elements", [])
+    if not isinstance(elements, list):
+        problems.append(f"{path}: 'geometric_elements' must be a list")
+        return
+    for j, element in enumerate(elements):
+        if element is None:
+            continue
+        if not isinstance(element, dict):
+            problems.append(f"{path}.geometric_elements[{j}]: expected an object")
+        elif any(not isinstance(element.get(field), (str, type(None))) for field in ELEMENT_FIELDS):
+            problems.append(f"{path}.geometric_elements[{j}]: {', '.join(ELEMENT_FIELDS)} must be strings")
+
+def validate_merge_inputs(timing_data: Any, standard_data: Any):
+    """
+    Check that the timing data (or the verbose solution it is built from) and the standard
+    solution can be merged.
+
+    Args:
+        timing_data: deconstruct_parallel_symbols.json or math_solution_verbose.json content
+        standard_data: math_solution_standard.json content
+
+    Raises:
+        GeometricTimingSchemaError: listing every problem found
+    """
+    problems = []
+    timing_steps = _check_steps(timing_data, "timing", problems)
+    standard_steps = _check_steps(standard_data, "standard", problems)
+
+    for step_id, step in standard_steps.items():
+        diagram = step.get("starting_diagram", [])
+        if not isinstance(diagram, list):
+            problems.append(f"standard step '{step_id}': 'starting_diagram' must be a list")
+        for i, sentence in enumerate(step["sentences"]):
+            _check_standard_sentence(sentence, f"standard step '{step_id}'.sentences[{i}]", problems)
+
+    for step_id, step in timing_steps.items():
+        for i, sentence in enumerate(step["sentences"]):
+            if not isinstance(sentence, str) and not (isinstance(sentence, dict) and isinstance(sentence.get("text"), str)):
+                problems.append(f"timing step '{step_id}'.sentences[{i}]: expected a string or an object with 'text'")
+
+        standard_step = standard_steps.get(step_id)
+        if standard_step is None:
+            if standard_steps:
+                problems.append(f"timing step '{step_id}': not in the standard solution")
+        elif len(standard_step["sentences"]) != len(step["sentences"]):
+            problems.append(f"step '{step_id}': {len(step['sentences'])} narrated sentences but "
+                            f"{len(standard_step['sentences'])} in the standard solution")
+
+    if problems:
+        raise GeometricTimingSchemaError(problems)
+
+def merge_geometric_elements(timing_data: dict, standard_data: dict) -> dict:
+    """
+    Merge the starting diagrams, standard texts, Khan Academy texts and geometric elements of
+    the standard solution into the timing data. The inputs are validated and left unchanged.
+
+    Args:
+        timing_data: Timing data built by geo_scriptwriter_parallel.py
+        standard_data: math_solution_standard.json content
+
+    Returns:
+        dict: The merged document (geometric_elements_with_timing.json content)
+
+    Raises:
+        GeometricTimingSchemaError: If either input is malformed
+    """
+    validate_merge_inputs(timing_data, standard_data)
+    standard_steps = {step["step_id"]: step for step in standard_data["solution_steps"]}
+
+    merged_steps = []
+    for timing_step in timing_data["solution_steps"]:
+        standard_step = standard_steps.get(timing_step["step_id"], {})
+        merged_step = dict(timing_step)
 
-def add_geometric_elements_to_timing():
-    """Add geometric elements and starting diagram to the timing JSON file."""
-    
-    # File paths - updated for current directory structure
-    timing_file = Path("deconstruct_parallel_symbols.json")
-    geometric_file = Path("math_solution_pipeline/math_solution_standard.json")
-    output_file = Path("geometric_elements_with_timing.json")
-    
-    print("📂 Loading files...")
-    
-    # Load timing data
-    try:
-        with open(timing_file, 'r', encoding='utf-8') as f:
-            timing_data = json.load(f)
-        print(f"✅ Loaded timing data from: {timing_file}")
-    except Exception as e:
-        print(f"❌ Error loading timing file: {e}")
-        return False
-    
-    # Load geometric data
-    try:
-        with open(geometric_file, 'r', encoding='utf-8') as f:
-            geometric_data = json.load(f)
-        print(f"✅ Loaded geometric data from: {geometric_file}")
-    except Exception as e:
-        print(f"❌ Error loading geometric file: {e}")
-        return False
-    
-    # Create lookup for geometric data
-    geometric_lookup = {step.get("step_id"): step for step in geometric_data.get("solution_steps", [])}
-    
-    print("🔧 Processing steps...")
-    
-    # Process each step in timing data
-    for timing_step in timing_data.get("solution_steps", []):
-        step_id = timing_step.get("step_id")
-        geometric_step = geometric_lookup.get(step_id, {})
-        
-        print(f"   📋 Processing step: {step_id}")
-        
         # Add starting_diagram to the step (as is from math_solution_standard.json)
-        starting_diagram = geometric_step.get("starting_diagram", [])
+        starting_diagram = standard_step.get("starting_diagram", [])
         if starting_diagram:
-            timing_step["starting_diagram"] = starting_diagram
-            print(f"      🎬 Added {len(starting_diagram)} starting diagram elements")
-        
-        # Process sentences
-        timing_sentences = timing_step.get("sentences", [])
-        geometric_sentences = geometric_step.get("sentences", [])
-        
-        for i, timing_sentence in enumerate(timing_sentences):
-            geometric_sentence = geometric_sentences[i] if i < len(geometric_sentences) else {}
-            
-            # Use text from geometric_sentence (math_solution_standard.json) instead of timing_sentence
-            standard_text = geometric_sentence.get("text", timing_sentence.get("text", ""))
-            timing_sentence["text"] = standard_text
-            
-            # Add khan_academy_text from geometric_sentence
-            khan_academy_text = geometric_sentence.get("khan_academy_text", "")
-            timing_sentence["khan_academy_text"] = khan_academy_text
-            
-            # Add geometric_elements to the sentence (without start_time_seconds)
-            original_elements = geometric_sentence.get("geometric_elements", [])
-            simplified_elements = []
-            
-            for element in original_elements:
-                if element and any(element.values()):
-                    simplified_element = {
-                        "element_type": element.get("element_type", ""),
-                        "element_id": element.get("element_id", ""),
-                        "animation_type": element.get("animation_type", "")
-                        # No start_time_seconds field
-                    }
-                    simplified_elements.append(simplified_element)
-                else:
-                    simplified_elements.append({})
-            
-            timing_sentence["geometric_elements"] = simplified_elements
-            
-            # Count valid elements
-            valid_elements = [e for e in simplified_elements if e and any(e.values())]
-            if valid_elements:
-                print(f"      📝 Sentence {i+1}: {len(valid_elements)} geometric elements")
-    
-    # Save the modified data
+            merged_step["starting_diagram"] = starting_diagram
+
+        merged_sentences = []
+        for timing_sentence, standard_sentence in zip(timing_step["sentences"], standard_step.get("sentences", [])):
+            merged_sentence = {"text": timing_sentence} if isinstance(timing_sentence, str) else dict(timing_sentence)
+            # Use the text of math_solution_standard.json instead of the narrated text
+            merged_sentence["text"] = standard_sentence.get("text", merged_sentence["text"])
+            merged_sentence["khan_academy_text"] = standard_sentence.get("khan_academy_text", "")
+            merged_sentence["geometric_elements"] = [
+                {field: element.get(field, "") for field in ELEMENT_FIELDS} if element and any(element.values()) else {}
+                for element in standard_sentence.get("geometric_elements", [])
+            ]
+            merged_sentences.append(merged_sentence)
+        merged_step["sentences"] = merged_sentences
+        merged_steps.append(merged_step)
+
+    merged = dict(timing_data)
+    merged["solution_steps"] = merged_steps
+    return merged
+
+def merge_and_write_geometric_timing(context: RunContext, timing_data: Optional[dict] = None,
+                                     standard_data: Optional[dict] = None) -> dict:
+    """
+    Merge the geometric elements into the timing data and write geometric_elements_with_timing.json.
+    Inputs not passed in are read from the run directory.
+
+    Returns:
+        dict: The merged document
+
+    Raises:
+        GeometricTimingSchemaError: If either input is malformed
+        OSError, json.JSONDecodeError: If an input file cannot be read or the output cannot be written
+    """
+    if timing_data is None:
+        with open(context.audio_timing_file, 'r', encoding='utf-8') as f:
+            timing_data = json.load(f)
+    if standard_data is None:
+        with open(context.solution_standard_file, 'r', encoding='utf-8') as f:
+            standard_data = json.load(f)
+
+    merged = merge_geometric_elements(timing_data, standard_data)
+    with open(context.geometric_timing_file, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, indent=2, ensure_ascii=False)
+    return merged
+
+def print_merge_summary(merged: dict):
+    """Print the number of steps, sentences and diagram elements of a merged document."""
+    steps = merged.get("solution_steps", [])
+    print(f"\n📊 Summary:")
+    print(f"   • Steps processed: {len(steps)}")
+    print(f"   • Sentences processed: {sum(len(step.get('sentences', [])) for step in steps)}")
+    print(f"   • Starting diagram elements: {sum(len(step.get('starting_diagram', [])) for step in steps)}")
+    print(f"   • Geometric elements: "
+          f"{sum(1 for step in steps for s in step['sentences'] for e in s['geometric_elements'] if e)}")
+
+def add_geometric_elements_to_timing(context: RunContext = None, timing_data: Optional[dict] = None,
+                                     standard_data: Optional[dict] = None) -> bool:
+    """Add geometric elements and starting diagram to the timing JSON file."""
+    context = context or RunContext()
+
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(timing_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"\n🎉 Successfully created: {output_file}")
-        print("✅ Added geometric elements and starting diagram to timing data")
-        
-        # Show summary
-        total_steps = len(timing_data.get("solution_steps", []))
-        total_sentences = sum(len(step.get("sentences", [])) for step in timing_data.get("solution_steps", []))
-        total_starting_elements = sum(len(step.get("starting_diagram", [])) for step in timing_data.get("solution_steps", []))
-        
-        print(f"\n📊 Summary:")
-        print(f"   • Steps processed: {total_steps}")
-        print(f"   • Sentences processed: {total_sentences}")
-        print(f"   • Starting diagram elements: {total_starting_elements}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error saving output file: {e}")
+        merged = merge_and_write_geometric_timing(context, timing_data, standard_data)
+    except GeometricTimingSchemaError as e:
+        print(f"❌ Malformed solution data, {len(e.problems)} problems:")
+        for problem in e.problems:
+            print(f"   • {problem}")
         return False
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error merging geometric elements: {e}")
+        return False
+
+    print(f"🎉 Successfully created: {context.geometric_timing_file}")
+    print_merge_summary(merged)
+    return True
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add geometric elements and starting diagram to the timing JSON")
+    RunContext.add_argument(parser)
+    args = parser.parse_args()
+
     print("🚀 Adding Geometric Elements to Timing Data")
     print("="*50)
-    
-    success = add_geometric_elements_to_timing()
-    
+
+    success = add_geometric_elements_to_timing(RunContext(args.run_dir))
+
     if success:
         print("\n✨ SUCCESS! Timing data now includes geometric elements and starting diagram.")
     else:
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Batch Pipeline Script
+Runs the geometry video pipeline for a whole directory (or manifest) of question images.
+
+Questions are processed by a bounded pool of workers. Independently of the number of
+workers, API-bound steps (LLM and TTS calls, steps 1-4) and CPU-bound steps (Manim
+rendering, step 5) are limited by separate semaphores shared by all pipelines.
+
+Each question runs in its own run directory (runs/<question>/ by default), so the
+pipelines of different questions never share intermediate files.
+
+Outputs:
+- runs/<question>/: all intermediate files and final_geometry_video.mp4 of each question
+- batch_reports/<question>_summary.json: outcome, step timings and token usage per question
+- batch_reports/batch_throughput_report.json: aggregate throughput and latency percentiles
+
+Usage:
+  python batch_pipeline.py --questions-dir "Math Questions"
+  python batch_pipeline.py --manifest questions.txt --workers 4 --api-concurrency 6
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from terminal_pipeline import TerminalPipeline, logger
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+REPORT_DIR = "batch_reports"
+RUNS_DIR = "runs"
+
+def natural_sort_key(path: Path):
+    """Sort question_2.png before question_10.png."""
+    parts = []
+    for chunk in re.split(r"(\d+)", path.name):
+        parts.append(int(chunk) if chunk.isdigit() else chunk.lower())
+    return parts
+
+def load_questions(questions_dir: Optional[str] = None, manifest: Optional[str] = None) -> List[Path]:
+    """
+    Collect the question images to process.
+
+    Args:
+        questions_dir (str): Directory whose image files are all processed
+        manifest (str): JSON list or text file (one path per line, # for comments) of
+                        image paths, relative paths being resolved against the manifest
+
+    Returns:
+        list: Absolute paths of the question images
+    """
+    questions = []
+
+    if questions_dir:
+        directory = Path(questions_dir).resolve()
+        questions.extend(sorted(
+            (p for p in directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS),
+            key=natural_sort_key
+        ))
+
+    if manifest:
+        manifest_path = Path(manifest).resolve()
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if manifest_path.suffix.lower() == ".json":
+            entries = json.loads(content)
+        else:
+            entries = [line.strip() for line in content.splitlines()
+                       if line.strip() and not line.strip().startswith("#")]
+        for entry in entries:
+            path = Path(entry)
+            if not path.is_absolute():
+                path = manifest_path.parent / path
+            questions.append(path.resolve())
+
+    # Drop duplicates while keeping the order
+    unique = []
+    for path in questions:
+        if path not in unique:
+            unique.append(path)
+    return unique
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values (None for an empty list)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return round(ordered[rank - 1], 2)
+
+class BatchPipeline:
+    """Run TerminalPipeline for many questions with bounded concurrency."""
+
+    def __init__(self, questions: List[Path], workers: int = 2, api_concurrency: int = 4,
+                 render_concurrency: int = 1, resume: bool = False, runs_dir: Optional[str] = None,
+                 in_process: bool = False):
+        self.questions = questions
+        self.workers = max(1, workers)
+        self.resume = resume
+        self.in_process = in_process
+        self.api_concurrency = max(1, api_concurrency)
+        self.render_concurrency = max(1, render_concurrency)
+        self.resource_limits = {
+            "api": threading.BoundedSemaphore(self.api_concurrency),
+            "cpu": threading.BoundedSemaphore(self.render_concurrency)
+        }
+        script_dir = Path(__file__).resolve().parent
+        self.runs_dir = Path(runs_dir).resolve() if runs_dir else script_dir / RUNS_DIR
+        self.report_dir = script_dir / REPORT_DIR
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+
+        # Run directory name per question; questions from different folders may share a file name
+        self.run_names = {}
+        for question in questions:
+            name, index = question.stem, 2
+            while name in self.run_names.values():
+                name, index = f"{question.stem}_{index}", index + 1
+            self.run_names[question] = name
+
+    def run_question(self, question_image: Path) -> Dict:
+        """Run the pipeline for one question in its own run directory and write its summary file."""
+        started_at = time.time()
+        run_name = self.run_names[question_image]
+        run_dir = self.runs_dir / run_name
+        logger.info(f"📦 Batch: starting {question_image.name} in {run_dir}")
+        try:
+            pipeline = TerminalPipeline(
+                str(question_image),
+                run_dir=str(run_dir),
+                resume=self.resume,
+                resource_limits=self.resource_limits,
+                in_process=self.in_process
+            )
+            success = pipeline.run_pipeline()
+            summary = pipeline.build_run_summary(success)
+            if success:
+                summary["final_video"] = str(pipeline.context.final_video)
+        except Exception as e:
+            logger.error(f"❌ Batch: {question_image.name} failed with exception: {e}")
+            summary = {
+                "question_image": str(question_image),
+                "run_dir": str(run_dir),
+                "success": False,
+                "error": str(e),
+                "total_duration_seconds": round(time.time() - started_at, 2),
+                "step_timings": {}
+            }
+
+        summary_file = self.report_dir / f"{run_name}_summary.json"
+        with open(summary_file, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        status = "✅" if summary["success"] else "❌"
+        logger.info(f"{status} Batch: {question_image.name} finished in {summary['total_duration_seconds']:.1f}s "
+                    f"(summary: {summary_file})")
+        return summary
+
+    def run(self) -> Dict:
+        """Process every question and write the aggregate throughput report."""
+        batch_start = time.time()
+        summaries = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.run_question, question) for question in self.questions]
+            for future in as_completed(futures):
+                summaries.append(future.result())
+
+        report = self.build_throughput_report(summaries, time.time() - batch_start)
+        report_file = self.report_dir / "batch_throughput_report.json"
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"📊 Batch throughput report saved to: {report_file}")
+
+        return report
+
+    def build_throughput_report(self, summaries: List[Dict], wall_seconds: float) -> Dict:
+        """Aggregate per-question summaries into throughput and latency statistics."""
+        durations = [s["total_duration_seconds"] for s in summaries if s["success"]]
+        succeeded = len(durations)
+
+        step_stats = {}
+        step_names = sorted({name for s in summaries for name in s.get("step_timings", {})})
+        for name in step_names:
+            timings = [s["step_timings"][name] for s in summaries if name in s.get("step_timings", {})]
+            step_durations = [t["duration_seconds"] for t in timings]
+            step_waits = [t["wait_seconds"] for t in timings]
+            step_stats[name] = {
+                "resource": timings[0]["resource"],
+                "runs": len(timings),
+                "duration_p50_seconds": percentile(step_durations, 50),
+                "duration_p95_seconds": percentile(step_durations, 95),
+                "wait_p50_seconds": percentile(step_waits, 50),
+                "wait_p95_seconds": percentile(step_waits, 95)
+            }
+
+        total_tokens = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        for s in summaries:
+            for key in total_tokens:
+                total_tokens[key] += s.get("token_usage", {}).get("total", {}).get(key, 0)
+        total_cost = round(sum(s.get("cost_usd", 0.0) for s in summaries), 6)
+        tts_cache = {"hits": 0, "misses": 0}
+        for s in summaries:
+            for key in tts_cache:
+                tts_cache[key] += (s.get("tts_cache") or {}).get(key, 0)
+
+        return {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "settings": {
+                "workers": self.workers,
+                "api_concurrency": self.api_concurrency,
+                "render_concurrency": self.render_concurrency,
+                "resume": self.resume,
+                "in_process": self.in_process
+            },
+            "questions": len(summaries),
+            "succeeded": succeeded,
+            "failed": [s["question_image"] for s in summaries if not s["success"]],
+            "wall_clock_seconds": round(wall_seconds, 2),
+            "questions_per_hour": round(succeeded / wall_seconds * 3600, 2) if wall_seconds > 0 else None,
+            "question_duration_p50_seconds": percentile(durations, 50),
+            "question_duration_p95_seconds": percentile(durations, 95),
+            "steps": step_stats,
+            "token_usage": total_tokens,
+            "cost_usd": total_cost,
+            "tts_cache": tts_cache
+        }
+
+def main():
+    """Main function to run the batch pipeline."""
+    parser = argparse.ArgumentParser(
+        description="Run the geometry video pipeline for many question images",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python batch_pipeline.py --questions-dir "Math Questions"
+  python batch_pipeline.py --manifest questions.txt --workers 4 --api-concurrency 6 --render-concurrency 2
+        """
+    )
+    parser.add_argument("--questions-dir", help="Directory of question images to process")
+    parser.add_argument("--manifest", help="JSON list or text file of question image paths")
+    parser.add_argument("--workers", type=int, default=2, help="Number of questions processed at once (default: 2)")
+    parser.add_argument("--api-concurrency", type=int, default=4,
+                        help="Maximum API-bound steps running at once across all questions (default: 4)")
+    parser.add_argument("--render-concurrency", type=int, default=1,
+                        help="Maximum render steps running at once across all questions (default: 1)")
+    parser.add_argument("--runs-dir", help="Directory holding one run directory per question (default: runs/)")
+    parser.add_argument("--resume", action="store_true", help="Skip steps that are up to date for each question")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run the steps of every question inside this process instead of one subprocess per step")
+
+    args = parser.parse_args()
+
+    if not args.questions_dir and not args.manifest:
+        parser.error("one of --questions-dir or --manifest is required")
+
+    if args.no_cache:
+        os.environ["LLM_CACHE_BYPASS"] = "1"
+
+    questions = load_questions(args.questions_dir, args.manifest)
+    missing = [str(q) for q in questions if not q.exists()]
+    if missing:
+        print(f"❌ Question image files not found: {', '.join(missing)}")
+        sys.exit(1)
+    if not questions:
+        print("❌ No question images found")
+        sys.exit(1)
+
+    print(f"📦 Processing {len(questions)} questions with {args.workers} workers")
+
+    batch = BatchPipeline(
+        questions,
+        workers=args.workers,
+        api_concurrency=args.api_concurrency,
+        render_concurrency=args.render_concurrency,
+        resume=args.resume,
+        runs_dir=args.runs_dir,
+        in_process=args.in_process
+    )
+    report = batch.run()
+
+    print("\n" + "=" * 80)
+    print("📊 BATCH SUMMARY")
+    print("=" * 80)
+    print(f"✅ Succeeded: {report['succeeded']}/{report['questions']}")
+    for failed in report["failed"]:
+        print(f"   ❌ {failed}")
+    print(f"⏱️  Wall clock: {report['wall_clock_seconds']:.1f}s ({report['questions_per_hour']} questions/hour)")
+    if report["question_duration_p50_seconds"] is not None:
+        print(f"📈 Per-question duration: p50 {report['question_duration_p50_seconds']:.1f}s, "
+              f"p95 {report['question_duration_p95_seconds']:.1f}s")
+    print(f"🔢 Total tokens: {report['token_usage']['total_tokens']:,} (${report['cost_usd']:.4f})")
+    print(f"🗄️  TTS cache: {report['tts_cache']['hits']} hits, {report['tts_cache']['misses']} misses")
+    print("=" * 80)
+
+    sys.exit(0 if not report["failed"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+r"""
+JSON Extraction Benchmark
+Times the extraction of the standard and verbose solutions from saved Step 1 responses
+(math_solution_raw*.txt and raw_response_debug.txt in math_solution_pipeline/).
+
+Two extractors are compared on every file:
+- single-pass: SolutionStepsGenerator.extract_both_json_from_response, one
+  JsonDocumentExtractor pass that repairs LaTeX backslashes inside string literals only
+- legacy: the four strategies it replaced (re.findall over the whole response, twenty
+  str.replace passes plus a lookbehind regex over the JSON text, and a brace scanner
+  that calls json.loads on every balanced candidate), kept below as the baseline
+
+Besides the timings, the report says whether both extractors returned the same
+solutions. Where they differ, the legacy cleaning mangled the text: it doubles the
+backslash of every escape (\" and \n included), and "\text{In }" matches two of its
+patterns, leaving a tab in the LaTeX.
+
+Usage: python benchmark_json_extraction.py [files...] [--repeat 50] [--json]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+from typing import Any, Dict, List
+
+from generate_solution_steps import SolutionStepsGenerator
+from run_context import RunContext
+
+LEGACY_LATEX_PATTERNS = [
+    '\\text{', '\\triangle', '\\angle', '\\cong', '\\implies', '\\frac', '\\times', '\\circ',
+    '\\therefore', '\\text{ cm}', '\\text{ cm}^2', '\\text{ is isosceles}', '\\text{ (Given)}',
+    '\\text{ (Common side)}', '\\text{ (RHS Congruence)}', '\\text{Area(ABCED)}', '\\text{Area}(',
+    '\\text{In }', '\\text{Key Method 1:', '\\text{Key Method 2:', '\\text{Key Method 3:',
+]
+
+def legacy_clean_json_content(json_content: str) -> str:
+    """The former SolutionStepsGenerator._clean_json_content."""
+    if '\\\\' in json_content:
+        return json_content
+    cleaned = json_content
+    for pattern in LEGACY_LATEX_PATTERNS:
+        cleaned = cleaned.replace(pattern, '\\' + pattern)
+    return re.sub(r'(?<!\\)\\(?!\\)', r'\\\\', cleaned)
+
+def _loads_with_fallback(json_content: str):
+    try:
+        return json.loads(legacy_clean_json_content(json_content))
+    except json.JSONDecodeError:
+        return json.loads(json_content.replace('\\', '\\\\'))
+
+def legacy_extract_both_json(generator: SolutionStepsGenerator, content: str):
+    """The former extract_both_json_from_response, without its logging."""
+    # Strategy 1: single ```json block
+    code_blocks = re.findall(r'```json\s*(.*?)```', content, re.DOTALL)
+    if len(code_blocks) == 1:
+        try:
+            main_json_obj = _loads_with_fallback(code_blocks[0].strip())
+            if "visual_output" in main_json_obj and "tts_output" in main_json_obj:
+                return main_json_obj["visual_output"], main_json_obj["tts_output"]
+            standard_json, verbose_json = generator._extract_nested_json_objects(main_json_obj)
+            if standard_json and verbose_json:
+                return standard_json, verbose_json
+            return generator._create_standard_json(main_json_obj), generator._create_verbose_json(main_json_obj)
+        except json.JSONDecodeError:
+            pass
+
+    # Strategy 2: "### **OUTPUT N:" sections
+    sections = re.split(r'### \*\*OUTPUT \d+:', content)
+    if len(sections) >= 3:
+        json_objects = []
+        for section in sections[1:]:
+            json_match = re.search(r'```json\s*(.*?)```', section, re.DOTALL)
+            if json_match:
+                try:
+                    json_objects.append(_loads_with_fallback(json_match.group(1).strip()))
+                except json.JSONDecodeError:
+                    continue
+        if len(json_objects) >= 2:
+            return json_objects[0], json_objects[1]
+
+    # Strategy 3: several code blocks
+    if len(code_blocks) >= 2:
+        json_objects = []
+        for block in code_blocks:
+            try:
+                json_objects.append(json.loads(legacy_clean_json_content(block.strip())))
+            except json.JSONDecodeError:
+                continue
+        if len(json_objects) >= 2:
+            return json_objects[0], json_objects[1]
+
+    # Strategy 4: brace scanner over the whole response
+    json_objects = []
+    brace_count = 0
+    start_pos = -1
+    for i, char in enumerate(content):
+        if char == '{':
+            if brace_count == 0:
+                start_pos = i
+            brace_count += 1
+        elif char == '}':
+            brace_count -= 1
+            if brace_count == 0 and start_pos != -1:
+                try:
+                    json_objects.append(json.loads(content[start_pos:i + 1]))
+                except json.JSONDecodeError:
+                    pass
+                start_pos = -1
+    if len(json_objects) >= 2:
+        return json_objects[0], json_objects[1]
+    if len(json_objects) == 1:
+        standard_json, verbose_json = generator._extract_nested_json_objects(json_objects[0])
+        if standard_json and verbose_json:
+            return standard_json, verbose_json
+        return generator._create_standard_json(json_objects[0]), generator._create_verbose_json(json_objects[0])
+    return None, None
+
+def _time_call(function, content: str, repeat: int):
+    result = function(content)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(content)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+def _count_steps(solution) -> int:
+    return len(solution.get("solution_steps", [])) if isinstance(solution, dict) else 0
+
+def benchmark_file(generator: SolutionStepsGenerator, path: Path, repeat: int) -> Dict[str, Any]:
+    """
+    Time both extractors on one saved response.
+
+    Returns:
+        dict: File, size, milliseconds per extraction of each extractor, speedup, steps found
+              and whether both extractors agree
+    """
+    content = path.read_text(encoding="utf-8")
+    new_result, new_ms = _time_call(generator.extract_both_json_from_response, content, repeat)
+    legacy_result, legacy_ms = _time_call(lambda text: legacy_extract_both_json(generator, text), content, repeat)
+    return {
+        "file": str(path),
+        "chars": len(content),
+        "single_pass_ms": round(new_ms, 3),
+        "legacy_ms": round(legacy_ms, 3),
+        "speedup": round(legacy_ms / new_ms, 2) if new_ms else None,
+        "steps": [_count_steps(solution) for solution in new_result],
+        "legacy_steps": [_count_steps(solution) for solution in legacy_result],
+        "same_result": new_result == legacy_result
+    }
+
+def find_saved_responses(context: RunContext) -> List[Path]:
+    """Saved Step 1 responses of a run directory."""
+    patterns = ("math_solution_raw*.txt", "raw_response_debug.txt")
+    return sorted(path for pattern in patterns for path in context.solution_dir.glob(pattern))
+
+def main():
+    """Benchmark the JSON extraction from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the extraction of both solutions from saved Step 1 responses")
+    parser.add_argument("files", nargs="*", help="Saved responses (default: math_solution_pipeline/ of the run directory)")
+    parser.add_argument("--repeat", type=int, default=50, help="Extractions timed per file and extractor")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    RunContext.add_argument(parser)
+
+    args = parser.parse_args()
+
+    # The extractors log every strategy; only the timings matter here
+    logging.disable(logging.CRITICAL)
+
+    files = [Path(f) for f in args.files] or find_saved_responses(RunContext(args.run_dir))
+    if not files:
+        print("❌ No saved responses found")
+        sys.exit(1)
+
+    generator = SolutionStepsGenerator(api_key="benchmark", use_cache=False)
+    results = [benchmark_file(generator, path, args.repeat) for path in files]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"⏱️  JSON extraction, mean of {args.repeat} runs per file")
+    for result in results:
+        agreement = "✅ same result" if result["same_result"] else "⚠️  results differ"
+        print(f"\n📄 {Path(result['file']).name} ({result['chars']:,} chars)")
+        print(f"   single-pass: {result['single_pass_ms']:.3f} ms, steps {result['steps']}")
+        print(f"   legacy:      {result['legacy_ms']:.3f} ms, steps {result['legacy_steps']}")
+        print(f"   speedup:     {result['speedup']}x, {agreement}")
+
+if __name__ == "__main__":
+    main()
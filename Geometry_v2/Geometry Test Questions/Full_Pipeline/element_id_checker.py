@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Element Id Checker
+Checks, without running it, that the scenes of a generated all_scenes.py only look up
+element ids their diagram functions define.
+
+The diagram creation functions (create_complete_diagram_*) return
+{"complete_figure": VGroup, "elements": dict}, and the scenes take their mobjects from that
+dict by id (elements["line_PQ"]). An id the model misspelled or invented only fails with a
+KeyError once its scene is rendered. The checker collects:
+- the literal keys of each diagram function's "elements" dict (a dict literal, or a
+  variable filled with literal subscript assignments)
+- the literal lookups of every scene class into a dict taken from ["elements"] (or a
+  variable named elements), and the diagram function it came from where that is visible
+
+A function whose elements dict gets computed keys (loops, update(), comprehensions)
+cannot be checked, so lookups that may come from it are skipped.
+
+Usage: python element_id_checker.py [--run-dir DIR] [--scenes-file all_scenes.py]
+"""
+
+import ast
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Set
+
+from run_context import RunContext
+
+DIAGRAM_FUNCTION_PREFIX = "create_complete_diagram"
+ELEMENTS_KEY = "elements"
+
+def _literal_string(node: Optional[ast.AST]) -> Optional[str]:
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+def _dict_literal_keys(node: ast.Dict) -> Optional[Set[str]]:
+    """Keys of a dict literal, or None if any key is computed (or a ** spread)."""
+    keys = set()
+    for key in node.keys:
+        name = _literal_string(key)
+        if name is None:
+            return None
+        keys.add(name)
+    return keys
+
+def defined_element_ids(function: ast.FunctionDef) -> Optional[Set[str]]:
+    """
+    Element ids a diagram function puts into its "elements" dict.
+
+    Returns:
+        set or None: The ids, or None if the dict gets keys that are not literals
+    """
+    keys = set()
+    tracked = set()
+    for node in ast.walk(function):
+        if not isinstance(node, ast.Dict):
+            continue
+        for key, value in zip(node.keys, node.values):
+            if _literal_string(key) != ELEMENTS_KEY:
+                continue
+            if isinstance(value, ast.Dict):
+                literal_keys = _dict_literal_keys(value)
+                if literal_keys is None:
+                    return None
+                keys |= literal_keys
+            elif isinstance(value, ast.Name):
+                tracked.add(value.id)
+            else:
+                return None
+
+    for node in ast.walk(function):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in tracked:
+                    if isinstance(node.value, ast.Dict):
+                        literal_keys = _dict_literal_keys(node.value)
+                        if literal_keys is None:
+                            return None
+                        keys |= literal_keys
+                    elif not (isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name)
+                              and node.value.func.id == "dict" and not node.value.args):
+                        return None
+                    else:
+                        keys |= {keyword.arg for keyword in node.value.keywords if keyword.arg}
+                elif isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name) \
+                        and target.value.id in tracked:
+                    name = _literal_string(target.slice)
+                    if name is None:
+                        return None
+                    keys.add(name)
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+            target = node.target
+            if isinstance(target, ast.Name) and target.id in tracked:
+                return None
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and isinstance(node.func.value, ast.Name) and node.func.value.id in tracked \
+                and node.func.attr in ("update", "setdefault"):
+            return None
+    return keys
+
+def _diagram_function_of(node: ast.AST) -> Optional[str]:
+    """Name of the diagram function a call expression invokes, if it is one."""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id.startswith(DIAGRAM_FUNCTION_PREFIX):
+        return node.func.id
+    return None
+
+def _is_elements_lookup(node: ast.AST) -> bool:
+    return isinstance(node, ast.Subscript) and _literal_string(node.slice) == ELEMENTS_KEY
+
+def scene_element_lookups(scene: ast.ClassDef) -> List[Dict[str, Any]]:
+    """
+    Literal element id lookups of a scene class.
+
+    Returns:
+        list: {"element_id", "line", "function": diagram function the dict came from, or None}
+    """
+    diagram_variables = {}
+    element_variables = {ELEMENTS_KEY: None}
+    # Assignments first, so lookups before or after them in the walk order are resolved alike
+    for node in ast.walk(scene):
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            if _diagram_function_of(node.value):
+                diagram_variables[target.id] = _diagram_function_of(node.value)
+            elif _is_elements_lookup(node.value):
+                source = node.value.value
+                element_variables[target.id] = (_diagram_function_of(source) or
+                                                (diagram_variables.get(source.id) if isinstance(source, ast.Name) else None))
+
+    lookups = []
+    for node in ast.walk(scene):
+        if not isinstance(node, ast.Subscript) or isinstance(node.ctx, ast.Store):
+            continue
+        element_id = _literal_string(node.slice)
+        if element_id is None:
+            continue
+        if isinstance(node.value, ast.Name) and node.value.id in element_variables:
+            function = element_variables[node.value.id]
+        elif _is_elements_lookup(node.value):
+            source = node.value.value
+            function = _diagram_function_of(source) or (
+                diagram_variables.get(source.id) if isinstance(source, ast.Name) else None)
+        else:
+            continue
+        lookups.append({"element_id": element_id, "line": node.lineno, "function": function})
+    return lookups
+
+def check_element_ids(source: str) -> Dict[str, Any]:
+    """
+    Check the element id lookups of every class in generated scene code.
+
+    Args:
+        source (str): Code of a Manim scenes file
+
+    Returns:
+        dict: {"success": bool, "unknown_ids": [{"scene", "line", "element_id", "function"}],
+               "unchecked_functions": diagram functions with computed ids, "error": str}
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return {"success": False, "unknown_ids": [], "unchecked_functions": [], "error": str(e)}
+
+    defined = {node.name: defined_element_ids(node) for node in tree.body
+               if isinstance(node, ast.FunctionDef) and node.name.startswith(DIAGRAM_FUNCTION_PREFIX)}
+    unchecked = sorted(name for name, ids in defined.items() if ids is None)
+    # Ids any diagram function defines, for lookups whose function is not visible
+    all_ids = None if unchecked else set().union(*defined.values())
+
+    unknown = []
+    for scene in (node for node in tree.body if isinstance(node, ast.ClassDef)):
+        for lookup in scene_element_lookups(scene):
+            if lookup["function"] in defined:
+                ids = defined[lookup["function"]]
+            elif defined:
+                ids = all_ids
+            else:
+                # No diagram function in the file: nothing to check against
+                ids = None
+            if ids is not None and lookup["element_id"] not in ids:
+                unknown.append({"scene": scene.name, **lookup})
+
+    return {
+        "success": not unknown,
+        "unknown_ids": unknown,
+        "unchecked_functions": unchecked,
+        "error": None
+    }
+
+def main():
+    """Check the element ids of a run's generated scenes from the command line."""
+    parser = argparse.ArgumentParser(description="Check that the scenes of all_scenes.py only use defined element ids")
+    parser.add_argument("--scenes-file", help="Scenes file to check (default: all_scenes.py in the run directory)")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    RunContext.add_argument(parser)
+
+    args = parser.parse_args()
+
+    scenes_file = args.scenes_file or str(RunContext(args.run_dir).scenes_file)
+    try:
+        with open(scenes_file, "r", encoding="utf-8") as f:
+            report = check_element_ids(f.read())
+    except OSError as e:
+        print(f"❌ Could not read {scenes_file}: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif report["error"]:
+        print(f"❌ Element id check failed: {report['error']}")
+    else:
+        for unknown in report["unknown_ids"]:
+            print(f"   ❌ {unknown['scene']} (line {unknown['line']}): unknown element id '{unknown['element_id']}'")
+        for function in report["unchecked_functions"]:
+            print(f"   ⚠️  {function}() computes its element ids, lookups into it were not checked")
+        if report["success"]:
+            print("✅ All element ids are defined by the diagram functions")
+
+    sys.exit(0 if report["success"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Figure Builder
+Builds figure.py locally from the geometric blueprint, without an LLM call.
+
+The blueprint (coordinates.txt, written by integrated_geometry_pipeline.py from the
+Geometry_Blueprint_v2 prompt) lays out every subpart in fixed Markdown tables: point
+coordinates, lines, angles and components (circles, polygons). parse_blueprint() turns
+those tables into a structured coordinate model, saved as coordinates.json:
+
+    {"subparts": [{"id": "a", "points": {"O": [0.0, 0.0, 0.0], ...},
+                   "lines": [{"id": "line_OQ", "start": "O", "end": "Q"}, ...],
+                   "angles": [{"id": "angle_QPR", "vertex": "P", "arms": ["Q", "R"],
+                               "degrees": 70.0, "label": "a"}, ...],
+                   "circles": [{"id": "circle_main", "center": "O", "radius": 2.5}],
+                   "polygons": [{"id": "region_quadrilateral_OQPR", "points": ["O", "Q", "P", "R"]}]}]}
+
+build_figure_code() then writes one CompleteScene_<subpart> class per subpart with the
+same structure the LLM-generated figure.py has: Dots, Lines, Circles, Polygons and
+create_2d_angle_arc_geometric arcs (create_3d_angle_arc_with_connections and a
+ThreeDScene for non-planar figures) at the blueprint coordinates, labels, auto-scaling
+with auto_scale_to_left_screen and a reveal of the complete figure.
+
+build_element_code() is shared with scene_code_generator.py, which builds the diagram of
+every scene of all_scenes.py from the same model.
+
+A blueprint whose tables cannot be read raises CoordinateModelError; the geometry
+stage then falls back to the LLM (see --figure-mode in integrated_geometry_pipeline.py).
+
+Usage: python figure_builder.py [--run-dir DIR] [--blueprint coordinates.txt]
+"""
+
+import re
+import json
+import math
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from run_context import RunContext
+from add_geometric_elements import ProblemListError
+
+SUBPART_HEADER = re.compile(r"Geometric Blueprint for Subpart\s*\(?\s*([A-Za-z0-9]+)\s*\)?", re.IGNORECASE)
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+# Component types drawn as filled polygons
+POLYGON_TYPES = ("polygon", "triangle", "quadrilateral", "pentagon", "hexagon", "region", "face", "square",
+                 "rectangle", "parallelogram", "rhombus", "trapezium", "trapezoid", "kite")
+
+# Styling, matching the figures the LLM generated from Enhanced_Manim_Geometric_Surveyor_v2
+BACKGROUND_COLOR = "#0C0C0C"
+POINT_COLOR = "#FFFFFF"
+LINE_COLOR = "#FFFFFF"
+REGION_COLOR = "#FFA500"
+ANGLE_COLORS = ["#FFFF00", "#00FFFF", "#FF00FF", "#00FF00", "#FF8800", "#0088FF"]
+DOT_RADIUS = 0.08
+POINT_LABEL_FONT_SIZE = 72
+ANGLE_LABEL_FONT_SIZE = 60
+POINT_LABEL_OFFSET = 0.4
+ANGLE_ARC_RADIUS = 0.5
+# Further angles at the same vertex get larger arcs so they do not overlap
+ANGLE_ARC_RADIUS_STEP = 0.1
+ANGLE_LABEL_GAP = 0.35
+PLANAR_TOLERANCE = 1e-6
+
+class CoordinateModelError(ProblemListError):
+    """Raised when a blueprint does not yield a usable coordinate model."""
+
+    description = "blueprint problems"
+
+# --- Blueprint parsing ---
+
+def _clean_cell(cell: str) -> str:
+    return cell.replace("**", "").replace("`", "").strip()
+
+def _is_separator(row: List[str]) -> bool:
+    return all(re.fullmatch(r":?-+:?", cell) for cell in row if cell) and any(row)
+
+def _markdown_tables(lines: List[str]) -> List[Tuple[List[str], List[List[str]]]]:
+    """(lower-case header cells, data rows) of every Markdown table in the lines."""
+    tables = []
+    for line in lines:
+        if not line.strip().startswith("|"):
+            continue
+        row = [_clean_cell(cell) for cell in line.strip().strip("|").split("|")]
+        if _is_separator(row):
+            # The row above a |:---|:---| separator is the header of a new table
+            previous = tables[-1][1].pop() if tables and tables[-1][1] else None
+            if previous is not None:
+                tables.append(([cell.lower() for cell in previous], []))
+        elif tables:
+            tables[-1][1].append(row)
+        else:
+            tables.append(([], [row]))
+    return [(header, rows) for header, rows in tables if header]
+
+def _column(header: List[str], *keywords: str) -> Optional[int]:
+    for i, name in enumerate(header):
+        if any(keyword in name for keyword in keywords):
+            return i
+    return None
+
+def _has_cells(row: List[str], *columns: Optional[int]) -> bool:
+    """Whether a row is long enough for every column found in its header."""
+    return bool(row) and all(column is None or column < len(row) for column in columns)
+
+def element_identifier(text: str) -> str:
+    """Python identifier fragment for an element name (A' becomes A_prime)."""
+    text = text.replace("'", "_prime")
+    text = re.sub(r"\W+", "_", text).strip("_")
+    return text if text and not text[0].isdigit() else f"e_{text}"
+
+def _element_name(cell: str) -> str:
+    """'OQ (Radius)' -> 'OQ'."""
+    return cell.split("(")[0].strip()
+
+def _point_names(cell: str, points: Dict[str, List[float]]) -> List[str]:
+    """Point names in a defining-elements cell: 'O, Q, P, R', 'Q, P, R' or 'OQPR'."""
+    names = [name.strip() for name in re.split(r"[,;]|\band\b", cell) if name.strip()]
+    if len(names) == 1 and names[0] not in points and all(ch in points for ch in names[0]):
+        names = list(names[0])
+    return names
+
+def parse_subpart(subpart_id: str, lines: List[str]) -> Dict[str, Any]:
+    """Coordinate model of one subpart section of the blueprint."""
+    subpart = {"id": subpart_id, "points": {}, "lines": [], "angles": [], "circles": [], "polygons": [], "skipped": []}
+    tables = _markdown_tables(lines)
+
+    # Points first: the other tables refer to them
+    for header, rows in tables:
+        x_col, y_col, z_col = _column(header, "x coord", "x"), _column(header, "y coord", "y"), _column(header, "z coord", "z")
+        if not header or not header[0].startswith("point") or x_col is None or y_col is None:
+            continue
+        for row in rows:
+            try:
+                coords = [float(NUMBER.search(row[x_col]).group()), float(NUMBER.search(row[y_col]).group())]
+                z_match = NUMBER.search(row[z_col]) if z_col is not None and z_col < len(row) else None
+                coords.append(float(z_match.group()) if z_match else 0.0)
+            except (AttributeError, IndexError):
+                subpart["skipped"].append(f"point row {row}")
+                continue
+            subpart["points"][row[0]] = coords
+
+    points = subpart["points"]
+    for header, rows in tables:
+        start_col, end_col = _column(header, "start"), _column(header, "end")
+        vertex_col = _column(header, "vertex")
+        type_col = _column(header, "type")
+
+        if start_col is not None and end_col is not None:
+            for row in rows:
+                if not _has_cells(row, start_col, end_col):
+                    subpart["skipped"].append(f"line row {row}")
+                    continue
+                name = _element_name(row[0])
+                subpart["lines"].append({"id": f"line_{element_identifier(name)}", "name": name,
+                                         "start": row[start_col], "end": row[end_col]})
+
+        elif vertex_col is not None:
+            points_col = _column(header, "defining", "points")
+            value_col = _column(header, "value", "degree")
+            note_col = _column(header, "note")
+            for row in rows:
+                if not _has_cells(row, vertex_col, points_col):
+                    subpart["skipped"].append(f"angle row {row}")
+                    continue
+                name = _element_name(row[0])
+                vertex = row[vertex_col]
+                defining = _point_names(row[points_col], points) if points_col is not None else list(name)
+                arms = [p for p in defining if p != vertex]
+                value_match = NUMBER.search(row[value_col]) if value_col is not None and value_col < len(row) else None
+                note = row[note_col] if note_col is not None and note_col < len(row) else ""
+                named = re.search(r"(?:defined as|labell?ed|denoted)\s+'([^']+)'", note, re.IGNORECASE)
+                subpart["angles"].append({
+                    "id": f"angle_{element_identifier(name)}", "name": name, "vertex": vertex, "arms": arms[:2],
+                    "degrees": float(value_match.group()) if value_match else None,
+                    "label": named.group(1) if named else None
+                })
+
+        elif type_col is not None:
+            defining_col = _column(header, "defining")
+            for row in rows:
+                if not _has_cells(row, type_col):
+                    subpart["skipped"].append(f"component row {row}")
+                    continue
+                name, kind = row[0], row[type_col].lower()
+                defining = row[defining_col] if defining_col is not None and defining_col < len(row) else ""
+                slug = element_identifier(name.replace(" ", "_"))
+                if "circle" in kind:
+                    center = re.search(r"center\s+([A-Za-z0-9_']+)", defining, re.IGNORECASE)
+                    radius = re.search(r"radius\s+(-?\d+(?:\.\d+)?)", defining, re.IGNORECASE)
+                    subpart["circles"].append({
+                        "id": slug if slug.lower().startswith("circle") else f"circle_{slug}",
+                        "name": name,
+                        "center": center.group(1) if center else None,
+                        "radius": float(radius.group(1)) if radius else None
+                    })
+                elif any(polygon_type in kind or polygon_type in name.lower() for polygon_type in POLYGON_TYPES):
+                    # Vertex letters keep their case: "Quadrilateral OQPR" -> region_quadrilateral_OQPR
+                    region_slug = "_".join(word if word.isupper() else word.lower() for word in slug.split("_"))
+                    region_id = region_slug if region_slug.startswith("region") else f"region_{region_slug}"
+                    subpart["polygons"].append({"id": region_id, "name": name,
+                                                "points": _point_names(defining, points)})
+                else:
+                    subpart["skipped"].append(f"{name} ({row[type_col]})")
+    return subpart
+
+def validate_coordinate_model(model: Dict[str, Any]):
+    """
+    Check that every element of the model refers to known points and has its measurements.
+
+    Raises:
+        CoordinateModelError: listing every problem found
+    """
+    problems = []
+    if not model.get("subparts"):
+        problems.append("no point coordinates table found")
+    for subpart in model.get("subparts", []):
+        sid = subpart["id"]
+        points = subpart["points"]
+        if len(points) < 2:
+            problems.append(f"subpart {sid}: fewer than two points")
+        for line in subpart["lines"]:
+            for end in (line["start"], line["end"]):
+                if end not in points:
+                    problems.append(f"subpart {sid}: {line['id']} uses unknown point '{end}'")
+        for angle in subpart["angles"]:
+            if angle["vertex"] not in points or len(angle["arms"]) != 2 or any(p not in points for p in angle["arms"]):
+                problems.append(f"subpart {sid}: {angle['id']} needs a known vertex and two known arm points")
+        for circle in subpart["circles"]:
+            if circle["center"] not in points or not circle["radius"]:
+                problems.append(f"subpart {sid}: {circle['id']} needs a known center and a radius")
+        for polygon in subpart["polygons"]:
+            if len(polygon["points"]) < 3 or any(p not in points for p in polygon["points"]):
+                problems.append(f"subpart {sid}: {polygon['id']} needs at least three known points")
+    if problems:
+        raise CoordinateModelError(problems)
+
+def parse_blueprint(blueprint_text: str) -> Dict[str, Any]:
+    """
+    Build the coordinate model of a blueprint (one entry per subpart section).
+
+    Returns:
+        dict: {"subparts": [...]} as described in the module docstring
+
+    Raises:
+        CoordinateModelError: If a subpart's tables are missing or refer to unknown points
+    """
+    lines = blueprint_text.splitlines()
+    sections = []
+    for index, line in enumerate(lines):
+        match = SUBPART_HEADER.search(line)
+        if match:
+            sections.append((match.group(1).lower(), index))
+
+    if not sections:
+        sections = [("main", 0)]
+    subparts = []
+    for i, (subpart_id, start) in enumerate(sections):
+        end = sections[i + 1][1] if i + 1 < len(sections) else len(lines)
+        subpart = parse_subpart(subpart_id, lines[start:end])
+        if subpart["points"]:
+            subparts.append(subpart)
+
+    model = {"subparts": subparts}
+    validate_coordinate_model(model)
+    return model
+
+def write_coordinate_model(model: Dict[str, Any], path) -> str:
+    """Save the coordinate model as JSON and return the file path."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, indent=2)
+    return str(path)
+
+# --- Code generation ---
+
+def _vector(values: List[float]) -> str:
+    return f"np.array([{values[0]:.3f}, {values[1]:.3f}, {values[2]:.3f}])"
+
+def _unit(vector: List[float]) -> Optional[List[float]]:
+    length = math.sqrt(sum(c * c for c in vector))
+    return [c / length for c in vector] if length > 1e-9 else None
+
+def _point_label_offset(point: List[float], centroid: List[float], is_3d: bool) -> List[float]:
+    """Offset that places a point label away from the middle of the figure."""
+    away = [p - c for p, c in zip(point, centroid)]
+    direction = _unit(away if is_3d else away[:2] + [0.0]) or [-0.707, -0.707, 0.0]
+    return [c * POINT_LABEL_OFFSET for c in direction]
+
+def _angle_label_offset(angle: Dict[str, Any], points: Dict[str, List[float]], radius: float) -> List[float]:
+    """Offset from the vertex along the angle bisector, just outside the arc."""
+    vertex = points[angle["vertex"]]
+    arms = [_unit([p - v for p, v in zip(points[name], vertex)]) for name in angle["arms"]]
+    if None in arms:
+        return [0.0, 0.0, 0.0]
+    bisector = _unit([a + b for a, b in zip(*arms)])
+    if bisector is None:
+        # Straight angle: the label goes beside the line
+        bisector = [-arms[0][1], arms[0][0], 0.0]
+    if angle["degrees"] is not None and angle["degrees"] > 180:
+        bisector = [-c for c in bisector]
+    return [c * (radius + ANGLE_LABEL_GAP) for c in bisector]
+
+def _angle_label_tex(angle: Dict[str, Any]) -> str:
+    if angle["label"]:
+        return angle["label"]
+    if angle["degrees"] is None:
+        return angle["name"]
+    return f"{round(angle['degrees'], 1):g}^{{\\\\circ}}"
+
+def is_3d_subpart(subpart: Dict[str, Any]) -> bool:
+    """True if the points of a subpart do not all lie in one z plane."""
+    z_values = [coords[2] for coords in subpart["points"].values()]
+    return max(z_values) - min(z_values) > PLANAR_TOLERANCE
+
+def visible_opacity(kind: str) -> float:
+    """Opacity of a visible element: shapes and regions stay translucent."""
+    return 0.2 if kind in ("circle", "region") else 1.0
+
+def build_element_code(subpart: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Manim statements creating every element of one subpart, one variable per element.
+    Variables are named after the element ids of math_solution_standard.json
+    (point_O, point_O_label, line_PQ, angle_QPR, angle_QPR_label, circle_main, region_...).
+
+    Returns:
+        dict: {"is_3d": bool, "statements": [unindented source lines],
+               "elements": [(element id, kind) in creation order]}
+    """
+    points = subpart["points"]
+    is_3d = is_3d_subpart(subpart)
+    centroid = [sum(coords[i] for coords in points.values()) / len(points) for i in range(3)]
+    coord = {name: f"coord_{element_identifier(name)}" for name in points}
+    statements = [f"# Coordinates for subpart ({subpart['id']})"]
+    statements += [f"{coord[name]} = {_vector(coords)}" for name, coords in points.items()]
+    elements = []
+
+    def add(element_id: str, kind: str, source: str):
+        statements.append(f"{element_id} = {source}")
+        elements.append((element_id, kind))
+
+    statements += ["", "# Points"]
+    for name in points:
+        point = f"point={coord[name]}" if is_3d else coord[name]
+        add(f"point_{element_identifier(name)}", "point",
+            f"{'Dot3D' if is_3d else 'Dot'}({point}, radius={DOT_RADIUS}, color=\"{POINT_COLOR}\")")
+
+    statements += ["", "# Point labels"]
+    for name in points:
+        offset = _vector(_point_label_offset(points[name], centroid, is_3d))
+        add(f"point_{element_identifier(name)}_label", "label",
+            f"MathTex(\"{name}\", font_size={POINT_LABEL_FONT_SIZE}, color=\"{POINT_COLOR}\")"
+            f".move_to({coord[name]} + {offset})")
+
+    if subpart["circles"]:
+        statements += ["", "# Circles (shape/region elements)"]
+        for circle in subpart["circles"]:
+            add(element_identifier(circle["id"]), "circle",
+                f"Circle(radius={circle['radius']:.3f}, color=\"{LINE_COLOR}\", stroke_width=2)"
+                f".move_to({coord[circle['center']]})")
+
+    if subpart["lines"]:
+        statements += ["", "# Lines (structural elements)"]
+        for line in subpart["lines"]:
+            ends = f"{coord[line['start']]}, {coord[line['end']]}"
+            width = "thickness=0.02" if is_3d else "stroke_width=3"
+            add(element_identifier(line["id"]), "line",
+                f"{'Line3D' if is_3d else 'Line'}({ends}, color=\"{LINE_COLOR}\", {width})")
+
+    angle_labels = []
+    if subpart["angles"]:
+        statements += ["", "# Angle arcs (structural elements)"]
+        arcs_at_vertex = {}
+        for i, angle in enumerate(subpart["angles"]):
+            element_id = element_identifier(angle["id"])
+            color = ANGLE_COLORS[i % len(ANGLE_COLORS)]
+            radius = ANGLE_ARC_RADIUS + ANGLE_ARC_RADIUS_STEP * arcs_at_vertex.get(angle["vertex"], 0)
+            arcs_at_vertex[angle["vertex"]] = arcs_at_vertex.get(angle["vertex"], 0) + 1
+            degrees = angle["degrees"]
+            center, first, second = coord[angle["vertex"]], coord[angle["arms"][0]], coord[angle["arms"][1]]
+            if degrees is not None:
+                statements.append(f"# {angle['name']} = {degrees:g}°")
+            if is_3d:
+                add(element_id, "angle",
+                    f"create_3d_angle_arc_with_connections(\n"
+                    f"    center={center}, point1={first}, point2={second},\n"
+                    f"    radius={radius:.1f}, num_points=30, show_connections=False,\n"
+                    f"    connection_color=\"#FFFFFF\", connection_opacity=0.2, "
+                    f"connection_style=\"solid\", color=\"{color}\"\n)")
+            else:
+                smaller = degrees is None or degrees <= 180
+                add(element_id, "angle",
+                    f"create_2d_angle_arc_geometric(\n"
+                    f"    center={center}, point1={first}, point2={second},\n"
+                    f"    radius={radius:.1f}, num_points=30, use_smaller_angle={smaller},\n"
+                    f"    show_connections=False, connection_color=\"#FFFFFF\",\n"
+                    f"    connection_opacity=0.2, connection_style=\"solid\", color=\"{color}\"\n)")
+            offset = _vector(_angle_label_offset(angle, points, radius))
+            angle_labels.append((f"{element_id}_label",
+                                 f"MathTex(\"{_angle_label_tex(angle)}\", font_size={ANGLE_LABEL_FONT_SIZE}, "
+                                 f"color=\"{color}\").move_to({center} + {offset})"))
+        statements += ["", "# Angle labels"]
+        for element_id, source in angle_labels:
+            add(element_id, "label", source)
+
+    if subpart["polygons"]:
+        statements += ["", "# Polygons (shape/region elements)"]
+        for polygon in subpart["polygons"]:
+            vertices = ", ".join(coord[name] for name in polygon["points"])
+            add(element_identifier(polygon["id"]), "region",
+                f"Polygon({vertices},\n    fill_opacity=0.2, fill_color=\"{REGION_COLOR}\", "
+                f"stroke_width=2, stroke_color=\"{REGION_COLOR}\")")
+
+    return {"is_3d": is_3d, "statements": statements, "elements": elements}
+
+def indent_lines(statements: List[str], indent: str) -> List[str]:
+    """Indent multi-line statements line by line (blank lines stay empty)."""
+    return [f"{indent}{line}" if line else "" for statement in statements for line in statement.split("\n")]
+
+def build_scene_code(subpart: Dict[str, Any]) -> str:
+    """Manim scene class drawing one subpart of the coordinate model."""
+    built = build_element_code(subpart)
+    is_3d = built["is_3d"]
+    indent = " " * 8
+    by_kind = {}
+    for element_id, kind in built["elements"]:
+        by_kind.setdefault(kind, []).append(element_id)
+    point_labels = [e for e in by_kind.get("label", []) if e.startswith("point_")]
+    angle_labels = [e for e in by_kind.get("label", []) if not e.startswith("point_")]
+    lines, angles = by_kind.get("line", []), by_kind.get("angle", [])
+    circles, regions = by_kind.get("circle", []), by_kind.get("region", [])
+    shapes = circles + regions
+
+    code = [
+        f"class CompleteScene_{element_identifier(subpart['id'])}({'ThreeDScene' if is_3d else 'Scene'}):",
+        "    def construct(self):",
+        f"{indent}self.camera.background_color = \"{BACKGROUND_COLOR}\"",
+        "",
+        f"{indent}# STEP 1: Create ALL geometric elements from the blueprint tables (invisible)"
+    ]
+    code += indent_lines(built["statements"], indent)
+
+    groups = [("dots", by_kind["point"]), ("lines", lines), ("labels", point_labels), ("angle_labels", angle_labels)]
+    code += ["", f"{indent}# Groups"]
+    code += [f"{indent}{name} = VGroup({', '.join(members)})" for name, members in groups if members]
+    figure_parts = ["dots"] + (["lines"] if lines else []) + ["labels"] + angles \
+        + (["angle_labels"] if angle_labels else []) + shapes
+    code += [
+        "",
+        f"{indent}# Combine all elements",
+        f"{indent}complete_figure = VGroup({', '.join(figure_parts)})",
+        "",
+        f"{indent}# STEP 2: Set all elements invisible initially",
+        f"{indent}complete_figure.set_opacity(0)",
+        "",
+        f"{indent}# STEP 3: Auto-scale the complete figure",
+        f"{indent}auto_scale_to_left_screen(complete_figure, is_3d={is_3d}, margin_factor=0.85, pitch_angle=-40, yaw_angle=-20)",
+        f"{indent}self.add(complete_figure)",
+        "",
+        f"{indent}# STEP 4: Reveal the figure (shape/region elements at 0.2 opacity)"
+    ]
+    code += [f"{indent}{shape}.set_opacity(0.2)" for shape in shapes]
+    code += [f"{indent}{group}.set_opacity(1)" for group in ("dots", "labels", "lines") if group in figure_parts]
+    code += [f"{indent}{angle}.set_opacity(1)" for angle in angles]
+    if angle_labels:
+        code.append(f"{indent}angle_labels.set_opacity(1)")
+
+    code.append(f"{indent}self.play({', '.join([f'Create({c})' for c in circles] + ['FadeIn(dots)', 'FadeIn(labels)'])})")
+    if lines:
+        code.append(f"{indent}self.play({', '.join(f'Create({line})' for line in lines)})")
+    if angles:
+        code.append(f"{indent}self.play({', '.join(f'Create({angle})' for angle in angles)})")
+        code.append(f"{indent}self.play(FadeIn(angle_labels))")
+    if regions:
+        code.append(f"{indent}self.play({', '.join(f'FadeIn({region})' for region in regions)})")
+    if is_3d:
+        code.append(f"{indent}self.wait(0.5)")
+        code.append(f"{indent}self.play(Rotate(complete_figure, angle=2*PI, axis=UP), run_time=8)")
+    code.append(f"{indent}self.wait(2)")
+    return "\n".join(code)
+
+def build_figure_code(model: Dict[str, Any]) -> str:
+    """figure.py source with one CompleteScene_<subpart> class per subpart of the coordinate model."""
+    header = [
+        "#!/usr/bin/env python3",
+        "# Generated by figure_builder.py from the coordinate model (coordinates.json)",
+        "",
+        "from manim import *",
+        "import numpy as np",
+        "import os",
+        "import sys",
+        "",
+        "# CRITICAL: Add grandparent directory to path to import helpers",
+        "sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))",
+        "from functions import *",
+        ""
+    ]
+    scenes = [build_scene_code(subpart) for subpart in model["subparts"]]
+    return "\n".join(header) + "\n" + "\n\n".join(scenes) + "\n"
+
+def build_figure_file(blueprint_text: str, context: RunContext) -> Dict[str, Any]:
+    """
+    Parse the blueprint, save coordinates.json and write figure.py in the run directory.
+
+    Returns:
+        dict: {"coordinate_model": model, "figure_code": source, "output_file": figure.py path}
+
+    Raises:
+        CoordinateModelError: If the blueprint does not yield a usable coordinate model
+    """
+    model = parse_blueprint(blueprint_text)
+    write_coordinate_model(model, context.coordinates_json_file)
+    figure_code = build_figure_code(model)
+    with open(context.figure_file, "w", encoding="utf-8") as f:
+        f.write(figure_code)
+    return {"coordinate_model": model, "figure_code": figure_code, "output_file": str(context.figure_file)}
+
+def main():
+    """Build coordinates.json and figure.py from a run's blueprint from the command line."""
+    parser = argparse.ArgumentParser(description="Build figure.py from the geometric blueprint without an LLM call")
+    parser.add_argument("--blueprint", help="Blueprint to read (default: coordinates.txt in the run directory)")
+    RunContext.add_argument(parser)
+
+    args = parser.parse_args()
+
+    context = RunContext(args.run_dir)
+    blueprint_path = Path(args.blueprint or context.coordinates_file)
+    try:
+        result = build_figure_file(blueprint_path.read_text(encoding="utf-8"), context)
+    except CoordinateModelError as e:
+        print(f"❌ Could not build a coordinate model from {blueprint_path}:")
+        for problem in e.problems:
+            print(f"   • {problem}")
+        raise SystemExit(1)
+
+    for subpart in result["coordinate_model"]["subparts"]:
+        print(f"📐 Subpart {subpart['id']}: {len(subpart['points'])} points, {len(subpart['lines'])} lines, "
+              f"{len(subpart['angles'])} angles, {len(subpart['circles'])} circles, {len(subpart['polygons'])} polygons")
+        for skipped in subpart["skipped"]:
+            print(f"   ⚠️  Not drawn: {skipped}")
+    print(f"✅ Coordinate model saved to: {context.coordinates_json_file}")
+    print(f"✅ Figure code saved to: {result['output_file']}")
+
+if __name__ == "__main__":
+    main()
@@ -20,9 +20,14 @@ from pdf2image import convert_from_path
 import tempfile
 
 # Import the Solution_Steps prompt
-import sys
-sys.path.append('/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline')
 from pipeline_prompts import Solution_Steps_v3
+from llm_cache import LLMResponseCache
+from run_context import RunContext, StageResult
+from usage_records import UsageLog, UsageRecord
+from stream_extractors import (JsonDocumentExtractor, JsonStepExtractor, StreamError, parse_json_document,
+                               read_sse_completion, stream_options)
+from geo_scriptwriter_parallel import TTSPrefetcher
+from tts_cache import bypass_requested as tts_cache_bypass_requested
 
 # Load environment variables from current directory
 load_dotenv('.env')
@@ -37,11 +42,30 @@ logger = logging.getLogger(__name__)
 class SolutionStepsGenerator:
     """Generate solution steps using Gemini-2.5-pro API."""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, use_cache: bool = True, context: RunContext = None,
+                 stream: bool = False):
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable not set")
         
+        # Run directory that receives the math_solution_pipeline outputs
+        self.context = context or RunContext()
+        
+        # Results of the last successful generate_solution_steps() call
+        self.last_api_result = None
+        self.standard_json = None
+        self.verbose_json = None
+        
+        # On-disk cache of API responses, keyed by model, prompt, images and sampling settings
+        self.response_cache = LLMResponseCache(bypass=not use_cache)
+        
+        # Token and latency record of every API call, read back by the orchestrator
+        self.usage_log = UsageLog(self.context.usage_log_file)
+        
+        # Stream the response and start narrating finished steps before the rest arrives
+        self.stream = stream
+        self.prefetch_summary = None
+        
         logger.info("Initialized Solution Steps Generator with Gemini-2.5-pro")
     
     def convert_pdf_to_images(self, pdf_path: str, dpi: int = 300):
@@ -89,21 +113,28 @@ class SolutionStepsGenerator:
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
     
-    def make_gemini_api_call(self, image_paths: list):
+    def make_gemini_api_call(self, image_paths: list, on_step=None):
         """
         Make API call to Gemini-2.5-pro to generate solution steps.
         
         Args:
             image_paths (list): List of paths to image files
+            on_step (callable, optional): When streaming, called with each solution step
+                                          (see JsonStepExtractor.feed) as soon as it is complete
             
         Returns:
             dict: API response with content and metadata
         """
+        start_time = None
         try:
             # Encode all images
             image_contents = []
+            image_bytes_list = []
             for i, image_path in enumerate(image_paths):
-                base64_image = self.encode_image_to_base64(image_path)
+                with open(image_path, "rb") as image_file:
+                    image_bytes = image_file.read()
+                image_bytes_list.append(image_bytes)
+                base64_image = base64.b64encode(image_bytes).decode('utf-8')
                 image_contents.append({
                     "type": "image_url",
                     "image_url": {
@@ -133,6 +164,29 @@ class SolutionStepsGenerator:
                 "temperature": 0.1
             }
             
+            # Return the cached response if this exact request was made before
+            cache_key = self.response_cache.make_key(
+                model=payload["model"],
+                prompt_parts=[prompt_text],
+                images=image_bytes_list,
+                temperature=payload["temperature"],
+                max_tokens=payload["max_tokens"]
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"⚡ Using cached Gemini response (saved {cached['total_tokens']} tokens)")
+                logger.info(f"   - Tokens: 0 (input: 0, output: 0)")
+                self.usage_log.record(UsageRecord("generate_solution_steps", payload["model"], cached=True))
+                return {
+                    "success": True,
+                    "content": cached["content"],
+                    "api_call_duration": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                    "cache_hit": True
+                }
+            
             # API endpoint
             url = "https://openrouter.ai/api/v1/chat/completions"
             
@@ -149,15 +203,21 @@ class SolutionStepsGenerator:
             
             # Make the API call
             logger.info(f"Making Gemini API call with {len(image_paths)} images...")
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            # End timing
-            end_time = time.time()
-            api_call_duration = end_time - start_time
-            
-            # Parse the response
-            response_data = response.json()
+            if self.stream:
+                response_data = self.stream_gemini_response(url, headers, payload, start_time, on_step)
+                api_call_duration = response_data["wall_seconds"]
+                ttft_seconds = response_data["ttft_seconds"]
+            else:
+                response = requests.post(url, headers=headers, json=payload)
+                response.raise_for_status()
+                
+                # End timing (the response is not streamed, so the first token arrives with the rest)
+                end_time = time.time()
+                api_call_duration = end_time - start_time
+                ttft_seconds = api_call_duration
+                
+                # Parse the response
+                response_data = response.json()
             
             # Extract token usage information
             usage = response_data.get("usage", {})
@@ -169,9 +229,8 @@ class SolutionStepsGenerator:
             if response_data.get("choices") and len(response_data["choices"]) > 0:
                 content = response_data["choices"][0]["message"]["content"]
                 
-                # Use the specific absolute path for debug files
-                output_dir = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline"
-                os.makedirs(output_dir, exist_ok=True)
+                # Make sure the run's output directory exists for the debug files
+                os.makedirs(self.context.solution_dir, exist_ok=True)
                 
 
                 
@@ -180,10 +239,26 @@ class SolutionStepsGenerator:
                 logger.info(f"   - Tokens: {total_tokens} (input: {prompt_tokens}, output: {completion_tokens})")
                 logger.info(f"   - Response length: {len(content)} characters")
                 
+                self.usage_log.record(UsageRecord(
+                    "generate_solution_steps", payload["model"],
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    wall_seconds=api_call_duration,
+                    ttft_seconds=ttft_seconds
+                ))
+                
+                self.response_cache.put(cache_key, {
+                    "content": content,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": total_tokens
+                })
+                
                 return {
                     "success": True,
                     "content": content,
                     "api_call_duration": api_call_duration,
+                    "ttft_seconds": ttft_seconds,
                     "prompt_tokens": prompt_tokens,
                     "completion_tokens": completion_tokens,
                     "total_tokens": total_tokens
@@ -199,6 +274,25 @@ class SolutionStepsGenerator:
         except requests.exceptions.RequestException as e:
             error_msg = f"Gemini API request failed: {str(e)}"
             logger.error(f"Error: {error_msg}")
+            if start_time is not None:
+                self.usage_log.record(UsageRecord(
+                    "generate_solution_steps", "google/gemini-2.5-pro",
+                    wall_seconds=time.time() - start_time,
+                    success=False
+                ))
+            return {
+                "success": False,
+                "error": error_msg
+            }
+        except StreamError as e:
+            error_msg = f"Gemini API stream failed: {str(e)}"
+            logger.error(f"Error: {error_msg}")
+            self.usage_log.record(UsageRecord(
+                "generate_solution_steps", payload["model"],
+                wall_seconds=time.time() - start_time,
+                ttft_seconds=e.completion.ttft_seconds if e.completion else None,
+                success=False
+            ))
             return {
                 "success": False,
                 "error": error_msg
@@ -211,6 +305,64 @@ class SolutionStepsGenerator:
                 "error": error_msg
             }
     
+    def stream_gemini_response(self, url: str, headers: dict, payload: dict, start_time: float, on_step=None) -> dict:
+        """
+        Make the API call with a streamed response, handing every solution step to on_step as
+        soon as its closing brace arrives.
+        
+        Returns:
+            dict: The response in the layout of a non-streamed response, plus "wall_seconds"
+                  and "ttft_seconds"
+        """
+        extractor = JsonStepExtractor(parse=parse_json_document)
+        
+        def on_text(text: str):
+            for step in extractor.feed(text):
+                logger.info(f"✓ Step '{step['value'].get('step_id', step['index'])}' of "
+                            f"{step['owner'] or 'document ' + str(step['document'] + 1)} complete after "
+                            f"{time.time() - start_time:.1f}s")
+                if on_step is not None:
+                    on_step(step)
+        
+        with requests.post(url, headers=headers, json={**payload, **stream_options()}, stream=True) as response:
+            response.raise_for_status()
+            completion = read_sse_completion(response, on_text, start_time)
+        
+        logger.info(f"   - First token after {completion.ttft_seconds:.2f} seconds, "
+                    f"{len(extractor.items)} steps extracted while streaming")
+        return {
+            "choices": [{"message": {"content": completion.content}, "finish_reason": completion.finish_reason}],
+            "usage": completion.usage,
+            "wall_seconds": completion.wall_seconds,
+            "ttft_seconds": completion.ttft_seconds
+        }
+    
+    def start_tts_prefetch(self):
+        """
+        Prefetcher narrating finished steps into the TTS audio cache while the response is
+        still streaming, or None when it cannot help (no ElevenLabs key, or TTS_CACHE_BYPASS
+        is set so Step 2 would not read the audio).
+        
+        Returns:
+            tuple: (TTSPrefetcher or None, on_step callback or None)
+        """
+        elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
+        if not elevenlabs_api_key or tts_cache_bypass_requested():
+            logger.info("TTS prefetch disabled (no ELEVENLABS_API_KEY or TTS_CACHE_BYPASS is set)")
+            return None, None
+        
+        prefetcher = TTSPrefetcher(elevenlabs_api_key)
+        
+        def on_step(step: dict):
+            # Step 2 narrates the verbose (tts_output) solution: the second document of the
+            # older two-block formats
+            if step["owner"] == "tts_output" or (step["owner"] is None and step["document"] == 1):
+                queued = prefetcher.submit_step(step["value"])
+                if queued:
+                    logger.info(f"🔊 Narrating {queued} sentences of step '{step['value'].get('step_id')}' ahead of Step 2")
+        
+        return prefetcher, on_step
+    
     def extract_question_number(self, question_image_path: str):
         """
         Extract question number from question image filename.
@@ -241,6 +393,13 @@ class SolutionStepsGenerator:
         """
         Extract both JSON outputs from the API response content.
         
+        One pass of JsonDocumentExtractor finds the JSON objects of the response (inside
+        ```json fences, or bare) and escapes the LaTeX backslashes of their strings. The
+        objects are then read in the layouts of the prompt versions:
+        - one object with "visual_output" and "tts_output" (current prompt)
+        - two objects, e.g. "### **OUTPUT 1:" and "### **OUTPUT 2:" blocks: standard, verbose
+        - one object with nested "solution_steps" objects, or a single solution
+        
         Args:
             content (str): Raw API response content
             
@@ -248,158 +407,34 @@ class SolutionStepsGenerator:
             tuple: (standard_json, verbose_json) or (None, None) if not found
         """
         try:
-            # Strategy 1: Handle new format with single JSON containing visual_output and tts_output
-            logger.info("Checking for new format with visual_output and tts_output...")
-            code_blocks = re.findall(r'```json\s*(.*?)```', content, re.DOTALL)
-            
-            if len(code_blocks) == 1:
-                logger.info("✓ Found single JSON block with visual_output and tts_output")
-                try:
-                    json_content = code_blocks[0].strip()
-                    cleaned_json = self._clean_json_content(json_content)
-                    main_json_obj = json.loads(cleaned_json)
-                    
-                    # Check for the new format with visual_output and tts_output
-                    if "visual_output" in main_json_obj and "tts_output" in main_json_obj:
-                        logger.info("✓ Found visual_output and tts_output structure")
-                        standard_json = main_json_obj["visual_output"]
-                        verbose_json = main_json_obj["tts_output"]
-                        return standard_json, verbose_json
-                    
-                    # Fallback to old nested JSON objects logic
-                    standard_json, verbose_json = self._extract_nested_json_objects(main_json_obj)
-                    
-                    if standard_json and verbose_json:
-                        logger.info("✓ Successfully extracted nested JSON objects")
-                        return standard_json, verbose_json
-                    else:
-                        logger.warning("Could not find nested JSON objects, falling back to single object processing")
-                        # Fallback to creating standard and verbose from single object
-                        standard_json = self._create_standard_json(main_json_obj)
-                        verbose_json = self._create_verbose_json(main_json_obj)
-                        return standard_json, verbose_json
-                    
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to parse JSON block: {e}")
-                    # Try with raw content as fallback
-                    try:
-                        raw_json = code_blocks[0].strip().replace('\\', '\\\\')
-                        main_json_obj = json.loads(raw_json)
-                        
-                        # Check for the new format with visual_output and tts_output
-                        if "visual_output" in main_json_obj and "tts_output" in main_json_obj:
-                            logger.info("✓ Found visual_output and tts_output structure (raw fallback)")
-                            standard_json = main_json_obj["visual_output"]
-                            verbose_json = main_json_obj["tts_output"]
-                            return standard_json, verbose_json
-                        
-                        standard_json, verbose_json = self._extract_nested_json_objects(main_json_obj)
-                        
-                        if standard_json and verbose_json:
-                            logger.info("✓ Successfully extracted nested JSON objects (raw fallback)")
-                            return standard_json, verbose_json
-                        else:
-                            logger.warning("Could not find nested JSON objects in raw fallback")
-                            
-                    except json.JSONDecodeError as e2:
-                        logger.error(f"Failed to parse JSON block even with fallback: {e2}")
-            
-            # Strategy 2: Split by markdown headers to isolate each JSON block (for v2 format)
-            sections = re.split(r'### \*\*OUTPUT \d+:', content)
-            
-            if len(sections) >= 3:  # We expect at least 3 sections (empty, OUTPUT 1, OUTPUT 2)
-                logger.info(f"✓ Found {len(sections)-1} output sections (v2 format)")
-                
-                json_objects = []
-                
-                # Process each section (skip the first empty section)
-                for i, section in enumerate(sections[1:], 1):
-                    logger.info(f"Processing OUTPUT {i} section...")
-                    
-                    # Find JSON code block in this section
-                    json_match = re.search(r'```json\s*(.*?)```', section, re.DOTALL)
-                    
-                    if json_match:
-                        json_content = json_match.group(1).strip()
-                        
-                        # Apply comprehensive JSON cleaning
-                        cleaned_json = self._clean_json_content(json_content)
-                        
-                        try:
-                            json_obj = json.loads(cleaned_json)
-                            json_objects.append(json_obj)
-                            logger.info(f"✓ Successfully parsed JSON from OUTPUT {i}")
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Failed to parse JSON from OUTPUT {i}: {e}")
-                            # Try with raw content as fallback
-                            try:
-                                raw_json = json_content.replace('\\', '\\\\')
-                                json_obj = json.loads(raw_json)
-                                json_objects.append(json_obj)
-                                logger.info(f"✓ Successfully parsed JSON from OUTPUT {i} (raw fallback)")
-                            except json.JSONDecodeError as e2:
-                                logger.error(f"Failed to parse JSON from OUTPUT {i} even with fallback: {e2}")
-                                continue
-                
-                if len(json_objects) >= 2:
-                    logger.info(f"✓ Successfully extracted {len(json_objects)} JSON objects using section-based approach")
-                    return json_objects[0], json_objects[1]
-            
-            # Strategy 3: Multiple code blocks (fallback for v2 format)
-            if len(code_blocks) >= 2:
-                logger.info(f"Found {len(code_blocks)} code blocks, processing as v2 format...")
-                json_objects = []
-                for i, block in enumerate(code_blocks):
-                    try:
-                        cleaned_json = self._clean_json_content(block.strip())
-                        json_obj = json.loads(cleaned_json)
-                        json_objects.append(json_obj)
-                        logger.info(f"✓ Successfully parsed JSON block {i+1}")
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Failed to parse JSON block {i+1}: {e}")
-                        continue
-                
-                if len(json_objects) >= 2:
-                    logger.info(f"✓ Successfully extracted {len(json_objects)} JSON objects using code block approach")
-                    return json_objects[0], json_objects[1]
-            
-            # Strategy 4: Last resort - find raw JSON objects
-            logger.info("Using last resort raw JSON extraction...")
-            json_objects = []
-            brace_count = 0
-            start_pos = -1
-            
-            for i, char in enumerate(content):
-                if char == '{':
-                    if brace_count == 0:
-                        start_pos = i
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0 and start_pos != -1:
-                        json_str = content[start_pos:i+1]
-                        try:
-                            json_obj = json.loads(json_str)
-                            json_objects.append(json_obj)
-                        except json.JSONDecodeError:
-                            pass
-                        start_pos = -1
+            extractor = JsonDocumentExtractor()
+            extractor.feed(content)
+            extractor.finish()
+            json_objects = extractor.documents
+            for error in extractor.errors:
+                logger.warning(f"Skipped invalid JSON at offset {error['offset']}: {error['error']}")
+            logger.info(f"✓ Found {len(json_objects)} JSON objects "
+                        f"({extractor.repaired} LaTeX backslashes escaped)")
+            
+            for main_json_obj in json_objects:
+                if "visual_output" in main_json_obj and "tts_output" in main_json_obj:
+                    logger.info("✓ Found visual_output and tts_output structure")
+                    return main_json_obj["visual_output"], main_json_obj["tts_output"]
             
             if len(json_objects) >= 2:
-                logger.info(f"✓ Successfully extracted {len(json_objects)} JSON objects using raw extraction")
+                logger.info(f"✓ Using the first two of {len(json_objects)} JSON objects as standard and verbose")
                 return json_objects[0], json_objects[1]
-            elif len(json_objects) == 1:
-                logger.info("✓ Found single JSON object using raw extraction")
+            
+            if len(json_objects) == 1:
                 standard_json, verbose_json = self._extract_nested_json_objects(json_objects[0])
                 if standard_json and verbose_json:
+                    logger.info("✓ Successfully extracted nested JSON objects")
                     return standard_json, verbose_json
-                else:
-                    # Fallback to creating standard and verbose from single object
-                    standard_json = self._create_standard_json(json_objects[0])
-                    verbose_json = self._create_verbose_json(json_objects[0])
-                    return standard_json, verbose_json
+                # Fallback to creating standard and verbose from single object
+                logger.warning("Could not find nested JSON objects, falling back to single object processing")
+                return self._create_standard_json(json_objects[0]), self._create_verbose_json(json_objects[0])
             
-            logger.error(f"All extraction strategies failed. Expected JSON objects, found {len(json_objects)}")
+            logger.error("No JSON object found in the response")
             return None, None
                 
         except Exception as e:
@@ -513,58 +548,6 @@ class SolutionStepsGenerator:
         
         return verbose_json
     
-    def _clean_json_content(self, json_content: str) -> str:
-        """
-        Clean JSON content by fixing common escape sequence issues.
-        
-        Args:
-            json_content (str): Raw JSON content
-            
-        Returns:
-            str: Cleaned JSON content
-        """
-        # Step 1: Check if content is already JSON-escaped (has double backslashes)
-        if '\\\\' in json_content:
-            # Content is already JSON-escaped, don't add more escaping
-            logger.info("Content appears to be already JSON-escaped, skipping additional escaping")
-            return json_content
-        
-        # Step 2: Fix LaTeX backslash sequences (only for raw content)
-        latex_patterns = [
-            ('\\text{', '\\\\text{'),
-            ('\\triangle', '\\\\triangle'),
-            ('\\angle', '\\\\angle'),
-            ('\\cong', '\\\\cong'),
-            ('\\implies', '\\\\implies'),
-            ('\\frac', '\\\\frac'),
-            ('\\times', '\\\\times'),
-            ('\\circ', '\\\\circ'),
-            ('\\therefore', '\\\\therefore'),
-            ('\\text{ cm}', '\\\\text{ cm}'),
-            ('\\text{ cm}^2', '\\\\text{ cm}^2'),
-            ('\\text{ is isosceles}', '\\\\text{ is isosceles}'),
-            ('\\text{ (Given)}', '\\\\text{ (Given)}'),
-            ('\\text{ (Common side)}', '\\\\text{ (Common side)}'),
-            ('\\text{ (RHS Congruence)}', '\\\\text{ (RHS Congruence)}'),
-            ('\\text{Area(ABCED)}', '\\\\text{Area(ABCED)}'),
-            ('\\text{Area}(', '\\\\text{Area}('),
-            ('\\text{In }', '\\\\text{In }'),
-            ('\\text{Key Method 1:', '\\\\text{Key Method 1:'),
-            ('\\text{Key Method 2:', '\\\\text{Key Method 2:'),
-            ('\\text{Key Method 3:', '\\\\text{Key Method 3:'),
-        ]
-        
-        cleaned = json_content
-        for pattern, replacement in latex_patterns:
-            cleaned = cleaned.replace(pattern, replacement)
-        
-        # Step 3: Handle any remaining problematic backslashes
-        # Only escape backslashes that are not already escaped
-        import re
-        cleaned = re.sub(r'(?<!\\)\\(?!\\)', r'\\\\', cleaned)
-        
-        return cleaned
-    
     def generate_intelligent_filename(self, input_path: str, question_image_path: str = None):
         """
         Generate an intelligent filename based on input files.
@@ -611,12 +594,11 @@ class SolutionStepsGenerator:
             bool: True if successful, False otherwise
         """
         try:
-            # Use the specific absolute path for math_solution_pipeline
-            output_dir = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline"
-            os.makedirs(output_dir, exist_ok=True)
+            # Use the run's math_solution_pipeline directory
+            os.makedirs(self.context.solution_dir, exist_ok=True)
             
             # Use fixed filename
-            output_filename = os.path.join(output_dir, "math_solution_raw.txt")
+            output_filename = self.context.solution_raw_file
             
             # Save as .txt file (always overwrite)
             with open(output_filename, 'w', encoding='utf-8') as f:
@@ -641,13 +623,12 @@ class SolutionStepsGenerator:
             bool: True if successful, False otherwise
         """
         try:
-            # Use the specific absolute path for math_solution_pipeline
-            output_dir = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline"
-            os.makedirs(output_dir, exist_ok=True)
+            # Use the run's math_solution_pipeline directory
+            os.makedirs(self.context.solution_dir, exist_ok=True)
             
             # Use fixed filenames (always overwrite)
-            standard_filename = os.path.join(output_dir, "math_solution_standard.json")
-            verbose_filename = os.path.join(output_dir, "math_solution_verbose.json")
+            standard_filename = self.context.solution_standard_file
+            verbose_filename = self.context.solution_verbose_file
             
             # Save standard JSON
             with open(standard_filename, 'w', encoding='utf-8') as f:
@@ -734,8 +715,17 @@ class SolutionStepsGenerator:
             logger.info(f"📁 Adding question image: {question_image_path}")
             image_paths.append(question_image_path)
             
-            # Make API call
-            api_result = self.make_gemini_api_call(image_paths)
+            # Make API call (when streaming, finished steps are narrated while the rest arrives)
+            prefetcher, on_step = self.start_tts_prefetch() if self.stream else (None, None)
+            try:
+                api_result = self.make_gemini_api_call(image_paths, on_step)
+            finally:
+                if prefetcher is not None:
+                    # Step 2 must not request the same sentences again while they are in flight
+                    self.prefetch_summary = prefetcher.close()
+                    logger.info(f"🔊 TTS prefetch: {self.prefetch_summary['generated']} sentences narrated, "
+                                f"{self.prefetch_summary['cached']} already cached, "
+                                f"{self.prefetch_summary['failed']} failed")
             
             if not api_result["success"]:
                 logger.error(f"❌ API call failed: {api_result['error']}")
@@ -758,11 +748,16 @@ class SolutionStepsGenerator:
                 logger.error("❌ Failed to save parsed JSON files")
                 return False
             
+            # Keep the results in memory for callers running this step in-process
+            self.last_api_result = api_result
+            self.standard_json = standard_json
+            self.verbose_json = verbose_json
+            
             logger.info("✅ Solution steps generation completed successfully!")
             logger.info(f"📁 Generated files:")
-            logger.info(f"   - Raw TXT: /Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline/math_solution_raw.txt")
-            logger.info(f"   - Standard JSON: /Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline/math_solution_standard.json")
-            logger.info(f"   - Verbose JSON: /Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline/math_solution_verbose.json")
+            logger.info(f"   - Raw TXT: {self.context.solution_raw_file}")
+            logger.info(f"   - Standard JSON: {self.context.solution_standard_file}")
+            logger.info(f"   - Verbose JSON: {self.context.solution_verbose_file}")
             
             return True
             
@@ -773,12 +768,64 @@ class SolutionStepsGenerator:
             # Clean up temporary files
             self.cleanup_temp_files(temp_files)
 
+def run_stage(context: RunContext, use_cache: bool = True, stream: bool = False) -> StageResult:
+    """
+    Run Step 1 (solution steps generation) in the calling process.
+    
+    Args:
+        context (RunContext): Run whose question image is analysed and whose
+                              math_solution_pipeline directory receives the outputs
+        use_cache (bool): Whether cached LLM responses may be used
+        stream (bool): Stream the response and narrate each finished step of the verbose
+                       solution into the TTS audio cache before the response is complete
+        
+    Returns:
+        StageResult: Paths and parsed content of the standard and verbose JSON, plus Gemini token usage
+    """
+    question_image_path = context.question_image
+    if not question_image_path or not os.path.exists(question_image_path):
+        return StageResult.failure(f"Question image file not found: {question_image_path}")
+    
+    try:
+        generator = SolutionStepsGenerator(use_cache=use_cache, context=context, stream=stream)
+    except Exception as e:
+        return StageResult.failure(f"Failed to initialize generator: {e}")
+    
+    if not generator.generate_solution_steps(str(context.symbols_pdf), question_image_path):
+        return StageResult.failure("Solution steps generation failed")
+    
+    api_result = generator.last_api_result
+    return StageResult(
+        True,
+        outputs={
+            "raw": str(context.solution_raw_file),
+            "standard_json": str(context.solution_standard_file),
+            "verbose_json": str(context.solution_verbose_file)
+        },
+        data={
+            "standard_json": generator.standard_json,
+            "verbose_json": generator.verbose_json,
+            "tts_prefetch": generator.prefetch_summary
+        },
+        token_usage={
+            "gemini": {
+                "prompt_tokens": api_result.get("prompt_tokens", 0),
+                "completion_tokens": api_result.get("completion_tokens", 0),
+                "total_tokens": api_result.get("total_tokens", 0)
+            }
+        }
+    )
+
 def main():
     """Main function to run the solution steps generation from command line."""
     
     # Set up command line argument parser
     parser = argparse.ArgumentParser(description="Generate solution steps from PDF and question image")
     parser.add_argument("--question-image", help="Path to the question image file (required)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses and call the API")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the response and narrate finished steps into the TTS cache while the rest is generated")
+    RunContext.add_argument(parser)
     
     args = parser.parse_args()
     
@@ -791,34 +838,20 @@ def main():
             print("❌ No question image path provided. Exiting.")
             sys.exit(1)
     
-    # Fixed PDF path
-    input_path = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Math_Solution/symbols.pdf"
-    
-    # Verify question image exists
-    if not os.path.exists(question_image_path):
-        print(f"❌ Question image file not found: {question_image_path}")
-        sys.exit(1)
-    
-    # Initialize the generator
-    try:
-        generator = SolutionStepsGenerator()
-        logger.info("✅ Solution Steps Generator initialized successfully")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize generator: {e}")
-        sys.exit(1)
+    context = RunContext(args.run_dir, question_image_path)
     
     # Generate solution steps
     logger.info("🎬 Starting solution steps generation...")
-    logger.info(f"📁 PDF file: {input_path}")
+    logger.info(f"📁 PDF file: {context.symbols_pdf}")
     logger.info(f"📁 Question image: {question_image_path}")
     
-    success = generator.generate_solution_steps(input_path, question_image_path)
+    result = run_stage(context, use_cache=not args.no_cache, stream=args.stream)
     
-    if success:
+    if result.success:
         logger.info("✅ Solution steps generation completed successfully!")
         logger.info("📁 Generated files are ready for use")
     else:
-        logger.error("❌ Solution steps generation failed!")
+        logger.error(f"❌ Solution steps generation failed: {result.error}")
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -1,53 +1,92 @@
+import io
 import json
+import shutil
+import subprocess
 import asyncio
 import aiohttp
 import os
+import argparse
 from pydub import AudioSegment
 from pydub.utils import mediainfo # Can be useful for debugging if needed
 from dotenv import load_dotenv
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import time
 from typing import List, Tuple, Optional, Dict, Any
 
-# --- Configuration ---
-# Load environment variables from .env file.
-# Adjust the path based on where your .env file is relative to this script.
-# If this script is in 'Geometry_v2/', and .env is also in 'Geometry_v2/', use Path(__file__).resolve().parent
-# If .env is one level up from 'Geometry_v2/', use Path(__file__).resolve().parent.parent
-try:
-    dotenv_path = Path(".env") # Load .env from current directory
-except NameError:
-    # Fallback if __file__ is not available
-    dotenv_path = Path(".env")
-
-print(f"Loading .env from: {dotenv_path}")
-print(f"File exists: {dotenv_path.exists()}")
-load_dotenv(dotenv_path)
-print(f"After loading, ELEVENLABS_API_KEY: {os.environ.get('ELEVENLABS_API_KEY', 'NOT FOUND')[:10] + '...' if os.environ.get('ELEVENLABS_API_KEY') else 'NOT FOUND'}")
-
-ELEVEN_LABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
-if ELEVEN_LABS_API_KEY:
-    print(f"Loaded ELEVENLABS_API_KEY: {ELEVEN_LABS_API_KEY[:4]}...{'*' * (len(ELEVEN_LABS_API_KEY)-8)}...{ELEVEN_LABS_API_KEY[-4:]}")
-else:
-    print("ELEVENLABS_API_KEY not found! Please set it in your .env file.")
-    exit(1) # Exit if API key is not found
+from run_context import RunContext, StageResult
+from tts_cache import TTSAudioCache
+from mp3_probe import Mp3FrameCounter, mp3_duration_seconds
+from tts_rate_limiter import AdaptiveConcurrencyLimiter, RetryPolicy, is_retryable_status, parse_retry_after
+from add_geometric_elements import (GeometricTimingSchemaError, validate_merge_inputs,
+                                    merge_and_write_geometric_timing, print_merge_summary)
 
+# --- Configuration ---
 VOICE_ID = "Fahco4VZzobUeiPqni1S" # Example Voice ID. Replace with your preferred voice ID.
 MODEL_ID = "eleven_multilingual_v2" 
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75
+}
 
-# Define paths using Pathlib for better cross-OS compatibility
-BASE_DIR = Path("/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline")
+# Text-to-speech API base URL; point ELEVENLABS_BASE_URL at tts_stub_server.py to run offline
+DEFAULT_ELEVENLABS_BASE_URL = "https://api.elevenlabs.io"
 
-INPUT_JSON_FILE = BASE_DIR / "math_solution_pipeline/math_solution_verbose.json"  # Input file path
-OUTPUT_JSON_FILE = BASE_DIR / "deconstruct_parallel_symbols.json"  # Updated output JSON file path
-GEOMETRIC_TIMING_OUTPUT_FILE = BASE_DIR / "geometric_elements_with_timing.json"  # Geometric timing output
-INDIVIDUAL_AUDIO_DIR = BASE_DIR / "Audio"  # Updated individual audio directory
-SCENE_AUDIO_DIR = BASE_DIR / "Scene"  # Updated scene audio directory
+# Input and output paths (math_solution_verbose.json, Audio/, Scene/, timing JSON files)
+# come from the run directory, see run_context.py
 
 TIME_GAP_BETWEEN_SENTENCES = 0.01 # The small gap in seconds between sentences
 
-# Maximum concurrent requests to prevent overwhelming the API
+# Concurrent requests at the start; the limit then adapts between the minimum and maximum
+# (raised while latency is healthy, halved on 429/5xx, see tts_rate_limiter.py)
 MAX_CONCURRENT_REQUESTS = 5
+MIN_CONCURRENT_REQUESTS = 1
+MAX_ADAPTIVE_CONCURRENT_REQUESTS = 12
+# A successful request slower than this lowers the limit
+REQUEST_LATENCY_TARGET_SECONDS = 10.0
+# Attempts per sentence (first request plus retries with jittered exponential backoff)
+MAX_REQUEST_ATTEMPTS = 5
+
+# Streaming mode (--stream): chunk size read from the streaming endpoint
+STREAM_CHUNK_BYTES = 16 * 1024
+
+# Worker threads for blocking reads off the event loop (cache lookups, MP3 duration probes)
+DECODE_WORKERS = max(2, min(8, os.cpu_count() or 2))
+# Worker threads writing sentence files and cache entries behind the requests
+WRITE_BEHIND_WORKERS = 2
+
+# Scene audio stitching: "pcm" copies the decoded sentences into one preallocated buffer,
+# "ffmpeg" concatenates the sentence MP3 files in one ffmpeg process without decoding in Python
+STITCH_ENGINES = ("pcm", "ffmpeg")
+# Worker threads exporting scene audio (each export runs its own ffmpeg encoder)
+EXPORT_WORKERS = max(1, min(8, os.cpu_count() or 1))
+
+def elevenlabs_base_url() -> str:
+    """Base URL of the text-to-speech API (ELEVENLABS_BASE_URL, default: the ElevenLabs API)."""
+    return (os.environ.get("ELEVENLABS_BASE_URL") or DEFAULT_ELEVENLABS_BASE_URL).rstrip("/")
+
+def tts_cache_key(sentence_text: str) -> str:
+    """TTS audio cache key of a sentence with the current voice, model and API."""
+    base_url = elevenlabs_base_url()
+    endpoint = base_url if base_url != DEFAULT_ELEVENLABS_BASE_URL else None
+    return TTSAudioCache.make_key(sentence_text, VOICE_ID, MODEL_ID, VOICE_SETTINGS, endpoint)
+
+def load_elevenlabs_api_key() -> Optional[str]:
+    """
+    Load ELEVENLABS_API_KEY from the .env file in the current directory or the environment.
+    Called when the stage runs (not at import) so importing this module has no side effects.
+    """
+    dotenv_path = Path(".env") # Load .env from current directory
+    print(f"Loading .env from: {dotenv_path}")
+    print(f"File exists: {dotenv_path.exists()}")
+    load_dotenv(dotenv_path)
+
+    api_key = os.environ.get("ELEVENLABS_API_KEY")
+    if api_key:
+        print(f"Loaded ELEVENLABS_API_KEY: {api_key[:4]}...{'*' * (len(api_key)-8)}...{api_key[-4:]}")
+    else:
+        print("ELEVENLABS_API_KEY not found! Please set it in your .env file.")
+    return api_key
 
 # --- Helper Classes for Managing Audio Generation Tasks ---
 
@@ -59,18 +98,138 @@ class AudioTask:
         self.sentence_index = sentence_index
         self.output_filepath = output_filepath
         self.duration_seconds = 0.0
+        self.audio_bytes = None
         self.audio_segment = None
         self.success = False
+        self.cached = False
+        self.source_filepath = None  # Sentence file of a previous run this task's audio was taken from
+        self.status = None  # HTTP status of the last attempt (None for a connection error)
+        self.retry_after = None
+        self.attempts = 0
+    
+    def copy_audio_from(self, other: "AudioTask"):
+        """Take the audio of another task narrating the same text."""
+        if other.audio_bytes is None:
+            # Streamed audio only exists as the other task's sentence file
+            self.source_filepath = other.output_filepath
+        self.audio_bytes = other.audio_bytes
+        self.audio_segment = other.audio_segment
+        self.duration_seconds = other.duration_seconds
+        self.success = other.success
+        self.cached = other.cached
+    
+    def load_audio_segment(self) -> AudioSegment:
+        """
+        Decode the sentence audio. Durations come from the MP3 frame headers (mp3_probe.py),
+        so audio is only decoded here, when PCM stitching needs it; streamed audio is read
+        back from its sentence file.
+        """
+        if self.audio_segment is None:
+            if self.audio_bytes is None:
+                self.audio_segment = AudioSegment.from_file(str(self.source_filepath or self.output_filepath), format="mp3")
+            else:
+                self.audio_segment, _ = decode_audio_bytes(self.audio_bytes)
+        return self.audio_segment
+
+def decode_audio_bytes(audio_content: bytes) -> Tuple[AudioSegment, float]:
+    """
+    Decode MP3 bytes in memory.
+    
+    Returns:
+        (AudioSegment, duration in seconds rounded to 10 ms)
+    """
+    audio_segment = AudioSegment.from_file(io.BytesIO(audio_content), format="mp3")
+    return audio_segment, round(len(audio_segment) / 1000.0, 2)
+
+def write_file(path: Path, content: bytes):
+    """Write bytes to a file (run on a write-behind thread)."""
+    with open(path, 'wb') as f:
+        f.write(content)
+
+class AudioWorkers:
+    """
+    Thread pools that keep blocking work off the asyncio event loop: cache lookups and
+    MP3 duration probes, plus write-behind persistence of sentence files and cache entries.
+    """
+    def __init__(self, write_sentence_files: bool = True, decode_workers: int = DECODE_WORKERS,
+                 write_workers: int = WRITE_BEHIND_WORKERS):
+        self.write_sentence_files = write_sentence_files
+        self.decode_executor = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="tts-decode")
+        self.write_executor = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="tts-write")
+        self.pending_writes = []
+    
+    async def run_blocking(self, func, *args):
+        """Run a blocking call on the worker pool and wait for it without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self.decode_executor, func, *args)
+    
+    def write_behind(self, func, *args):
+        """Schedule a blocking write; flush() waits for all scheduled writes."""
+        self.pending_writes.append(asyncio.get_running_loop().run_in_executor(self.write_executor, func, *args))
+    
+    def persist_sentence(self, task: AudioTask):
+        """Schedule writing the sentence MP3 to the task's output file, if sentence files are kept."""
+        if not self.write_sentence_files:
+            return
+        if task.audio_bytes is not None:
+            self.write_behind(write_file, task.output_filepath, task.audio_bytes)
+        elif task.source_filepath is not None and task.source_filepath != task.output_filepath:
+            self.write_behind(shutil.copyfile, task.source_filepath, task.output_filepath)
+    
+    async def write_in_order(self, func, *args):
+        """Run a blocking write on the write pool and wait for it (keeps one stream's writes in order)."""
+        return await asyncio.get_running_loop().run_in_executor(self.write_executor, func, *args)
+    
+    async def flush(self):
+        """Wait for every scheduled write; failed writes are reported but do not fail their task."""
+        results = await asyncio.gather(*self.pending_writes, return_exceptions=True)
+        self.pending_writes = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Warning: Write-behind failed: {result}")
+    
+    def shutdown(self):
+        self.decode_executor.shutdown(wait=True)
+        self.write_executor.shutdown(wait=True)
 
 # --- Async Helper Function for Eleven Labs API ---
 
-async def generate_audio_async(session: aiohttp.ClientSession, task: AudioTask) -> AudioTask:
+async def receive_audio_stream(response: aiohttp.ClientResponse, task: AudioTask, workers: AudioWorkers):
+    """
+    Write a streamed MP3 response to the sentence file chunk by chunk while counting its
+    MPEG frames, so the duration is known the moment the stream ends and no full buffer
+    of the response is ever held. The file only replaces the sentence file once complete.
+    """
+    counter = Mp3FrameCounter()
+    partial_filepath = task.output_filepath.with_suffix(".part")
+    partial_file = await workers.write_in_order(open, partial_filepath, 'wb')
+    try:
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+            counter.feed(chunk)
+            await workers.write_in_order(partial_file.write, chunk)
+    finally:
+        await workers.write_in_order(partial_file.close)
+    
+    if not counter.frames:
+        partial_filepath.unlink(missing_ok=True)
+        raise ValueError("stream contained no MP3 frames")
+    os.replace(partial_filepath, task.output_filepath)
+    task.audio_bytes = None
+    task.duration_seconds = round(counter.duration_seconds, 2)
+
+async def generate_audio_async(session: aiohttp.ClientSession, task: AudioTask, api_key: str,
+                               base_url: str = DEFAULT_ELEVENLABS_BASE_URL,
+                               stream_workers: Optional[AudioWorkers] = None) -> AudioTask:
     """
     Asynchronously calls the Eleven Labs API to generate audio for a sentence.
+    Only the encoded response is kept (task.audio_bytes); it is measured off the event loop.
     
     Args:
         session: The aiohttp ClientSession for making requests
         task: AudioTask object containing the details for audio generation
+        api_key: Eleven Labs API key
+        base_url: Base URL of the text-to-speech API
+        stream_workers: If given, use the streaming endpoint and write the audio to the
+                        sentence file as it arrives (on these workers' write pool)
         
     Returns:
         The same AudioTask object with results populated
@@ -78,98 +237,426 @@ async def generate_audio_async(session: aiohttp.ClientSession, task: AudioTask)
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
-        "xi-api-key": ELEVEN_LABS_API_KEY
+        "xi-api-key": api_key
     }
 
     data = {
         "text": task.sentence_text,
         "model_id": MODEL_ID,
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75
-        }
+        "voice_settings": VOICE_SETTINGS
     }
 
+    task.status = None
+    task.retry_after = None
     try:
         api_start_time = time.time()
         async with session.post(
-            f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}", 
+            f"{base_url}/v1/text-to-speech/{VOICE_ID}{'/stream' if stream_workers else ''}", 
             headers=headers, 
             json=data
         ) as response:
             api_end_time = time.time()
             print(f"API call for '{task.step_id}_{task.sentence_index}' took {api_end_time - api_start_time:.2f} seconds")
             
-            if response.status == 200:
-                # Save the audio file
-                audio_content = await response.read()
-                with open(task.output_filepath, 'wb') as f:
-                    f.write(audio_content)
-
-                # Measure audio duration and get AudioSegment object
-                task.audio_segment = AudioSegment.from_file(str(task.output_filepath), format="mp3")
-                task.duration_seconds = round(len(task.audio_segment) / 1000.0, 2)
+            task.status = response.status
+            task.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status == 200 and stream_workers is not None:
+                await receive_audio_stream(response, task, stream_workers)
+                task.success = True
+            elif response.status == 200:
+                task.audio_bytes = await response.read()
                 task.success = True
-
-                print(f"Generated '{task.output_filepath.name}' (Duration: {task.duration_seconds:.2f}s) for: '{task.sentence_text[:50]}...'")
             else:
                 print(f"API Error {response.status} for '{task.sentence_text[:50]}...': {await response.text()}")
                 task.success = False
 
     except Exception as e:
         print(f"Error processing '{task.sentence_text[:50]}...': {e}")
+        # A dropped connection or broken stream is worth retrying
+        task.status = None
+        task.success = False
+
+    return task
+
+def load_cached_audio(task: AudioTask, cache: TTSAudioCache) -> bool:
+    """
+    Answer a task from the TTS audio cache: takes the cached MP3 bytes and the stored
+    duration, without an API call or a decode. Blocking (disk read), run it on a worker thread.
+    Returns True on a cache hit.
+    """
+    cached = cache.get(tts_cache_key(task.sentence_text))
+    if cached is None:
+        return False
+    
+    task.audio_bytes, task.duration_seconds = cached
+    task.success = True
+    task.cached = True
+    return True
+
+async def finish_generated_audio(task: AudioTask, workers: AudioWorkers, cache: Optional[TTSAudioCache]):
+    """
+    Measure a fresh API response from its MP3 frame headers (no decode) on the worker pool,
+    then schedule the sentence file and the cache entry as write-behind. Streamed responses
+    are already measured and on disk, so only their cache entry is written.
+    """
+    if task.audio_bytes is None:
+        if cache is not None:
+            workers.write_behind(cache.put_file, tts_cache_key(task.sentence_text), task.output_filepath,
+                                 task.duration_seconds, task.sentence_text)
+        print(f"Streamed '{task.output_filepath.name}' (Duration: {task.duration_seconds:.2f}s) for: '{task.sentence_text[:50]}...'")
+        return
+    
+    duration = await workers.run_blocking(mp3_duration_seconds, task.audio_bytes)
+    if duration <= 0:
+        print(f"Error: Response for '{task.sentence_text[:50]}...' contains no MP3 audio frames")
         task.success = False
+        return
+    task.duration_seconds = round(duration, 2)
+    
+    workers.persist_sentence(task)
+    if cache is not None:
+        workers.write_behind(cache.put, tts_cache_key(task.sentence_text), task.audio_bytes, task.duration_seconds, task.sentence_text)
+    
+    print(f"Generated '{task.output_filepath.name}' (Duration: {task.duration_seconds:.2f}s) for: '{task.sentence_text[:50]}...'")
 
+async def request_audio_with_retries(session: aiohttp.ClientSession, task: AudioTask, api_key: str,
+                                     limiter: AdaptiveConcurrencyLimiter, retry_policy: RetryPolicy,
+                                     base_url: str = DEFAULT_ELEVENLABS_BASE_URL,
+                                     stream_workers: Optional[AudioWorkers] = None) -> AudioTask:
+    """
+    Request the audio of a sentence through the adaptive limiter, retrying 429, 5xx and
+    connection errors with jittered exponential backoff (at least Retry-After).
+    """
+    for attempt in range(retry_policy.max_attempts):
+        await limiter.acquire()
+        request_start_time = time.time()
+        try:
+            task.attempts += 1
+            await generate_audio_async(session, task, api_key, base_url, stream_workers)
+        finally:
+            await limiter.release(task.status, time.time() - request_start_time, task.retry_after)
+        
+        if task.success or not is_retryable_status(task.status) or attempt == retry_policy.max_attempts - 1:
+            break
+        
+        delay = retry_policy.delay(attempt, task.retry_after)
+        limiter.retries += 1
+        print(f"Retrying '{task.step_id}_{task.sentence_index}' in {delay:.1f}s "
+              f"(attempt {attempt + 2}/{retry_policy.max_attempts}, status {task.status or 'connection error'})")
+        await asyncio.sleep(delay)
+    
     return task
 
-async def generate_all_audio_async(tasks: List[AudioTask]) -> List[AudioTask]:
+async def generate_all_audio_async(tasks: List[AudioTask], api_key: str,
+                                   cache: Optional[TTSAudioCache] = None,
+                                   write_sentence_files: bool = True,
+                                   limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                                   retry_policy: Optional[RetryPolicy] = None,
+                                   streaming: bool = False) -> List[AudioTask]:
     """
-    Generate audio for all tasks concurrently with a semaphore to limit concurrent requests.
+    Generate audio for all tasks concurrently, with the number of requests in flight set
+    by an adaptive limiter and failed requests retried with backoff.
+    Each distinct text is requested once; tasks repeating a text get a copy of its audio.
+    Tasks that already have audio (reused from the previous run) are only written to their
+    sentence file. Tasks found in the TTS audio cache never take a request slot. Responses are measured
+    from their frame headers on a thread pool after their request slot is released, and sentence files
+    and cache entries are written behind; all writes are finished when this returns.
     
     Args:
         tasks: List of AudioTask objects to process
+        api_key: Eleven Labs API key
+        cache: TTS audio cache to look up and fill (None to always call the API)
+        write_sentence_files: Whether to keep each sentence's MP3 in the Audio/ directory
+        limiter: Adaptive concurrency limiter (its report() holds the request statistics)
+        retry_policy: Retry schedule for failed requests
+        streaming: Use the streaming endpoint and write each response to its sentence file
+                   as it arrives (sentence files are then always kept)
         
     Returns:
         List of completed AudioTask objects
     """
-    # Create a semaphore to limit concurrent requests
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = limiter or AdaptiveConcurrencyLimiter(
+        MAX_CONCURRENT_REQUESTS, MIN_CONCURRENT_REQUESTS, MAX_ADAPTIVE_CONCURRENT_REQUESTS,
+        REQUEST_LATENCY_TARGET_SECONDS
+    )
+    retry_policy = retry_policy or RetryPolicy(MAX_REQUEST_ATTEMPTS)
+    workers = AudioWorkers(write_sentence_files or streaming)
+    base_url = elevenlabs_base_url()
+    if base_url != DEFAULT_ELEVENLABS_BASE_URL:
+        print(f"Using text-to-speech API at {base_url}")
     
     async def bounded_generate_audio(session: aiohttp.ClientSession, task: AudioTask) -> AudioTask:
-        async with semaphore:
-            return await generate_audio_async(session, task)
+        if cache is not None and await workers.run_blocking(load_cached_audio, task, cache):
+            workers.persist_sentence(task)
+            return task
+        await request_audio_with_retries(session, task, api_key, limiter, retry_policy, base_url,
+                                         workers if streaming else None)
+        if task.success:
+            await finish_generated_audio(task, workers, cache)
+        return task
+    
+    # One request per distinct text; repeated sentences copy the audio of the first one
+    unique_tasks = {}
+    duplicate_tasks = []
+    for task in tasks:
+        if task.success:
+            continue
+        first_task = unique_tasks.setdefault(task.sentence_text, task)
+        if first_task is not task:
+            duplicate_tasks.append((task, first_task))
+    if duplicate_tasks:
+        print(f"Deduplicated {len(duplicate_tasks)} repeated sentences ({len(unique_tasks)} distinct texts to generate)")
     
     # Create aiohttp session with appropriate timeout
     timeout = aiohttp.ClientTimeout(total=300)  # 5 minute timeout per request
     async with aiohttp.ClientSession(timeout=timeout) as session:
-        # Execute all tasks concurrently
-        completed_tasks = await asyncio.gather(
-            *[bounded_generate_audio(session, task) for task in tasks],
-            return_exceptions=True
-        )
+        try:
+            # Reused audio only needs its sentence file when it moved to another file name
+            for task in tasks:
+                if task.success and task.source_filepath != task.output_filepath:
+                    workers.persist_sentence(task)
+            
+            # Execute all tasks concurrently
+            unique_list = list(unique_tasks.values())
+            completed_tasks = await asyncio.gather(
+                *[bounded_generate_audio(session, task) for task in unique_list],
+                return_exceptions=True
+            )
+            
+            # Handle any exceptions that occurred
+            for task, result in zip(unique_list, completed_tasks):
+                if isinstance(result, Exception):
+                    print(f"Task '{task.step_id}_{task.sentence_index}' failed with exception: {result}")
+                    task.success = False
+            
+            for task, first_task in duplicate_tasks:
+                task.copy_audio_from(first_task)
+                if task.success:
+                    workers.persist_sentence(task)
+            
+            await workers.flush()
+        finally:
+            workers.shutdown()
         
-        # Handle any exceptions that occurred
-        results = []
-        for i, result in enumerate(completed_tasks):
-            if isinstance(result, Exception):
-                print(f"Task {i} failed with exception: {result}")
-                tasks[i].success = False
-                results.append(tasks[i])
-            else:
-                results.append(result)
+        return tasks
+
+def print_request_report(limiter: AdaptiveConcurrencyLimiter):
+    """Print the request statistics and latency histogram of the ElevenLabs requests."""
+    report = limiter.report()
+    if not report["requests"]:
+        return
+    latency = report["latency"]
+    print(f"ElevenLabs requests: {report['requests']} ({report['retries']} retries), statuses: {report['status_counts']}")
+    history = [str(limit) for limit in report["limit_history"]]
+    if len(history) > 12:
+        history = history[:6] + ["..."] + history[-5:]
+    print(f"Concurrency limit: {' -> '.join(history)} "
+          f"(peak in flight: {report['peak_in_flight']})")
+    print(f"Request latency: p50 {latency['p50_seconds']:.2f}s, p95 {latency['p95_seconds']:.2f}s, "
+          f"max {latency['max_seconds']:.2f}s")
+    for line in limiter.histogram.format():
+        print(f"   {line}")
+
+# --- Scene Audio Stitching ---
+
+def stitch_segments_pcm(segments: List[AudioSegment], gap_seconds: float) -> AudioSegment:
+    """
+    Stitch sentence audio into one scene in linear time.
+    All segments are converted to a common PCM format and copied into a single
+    preallocated buffer; the gaps between sentences are left as zeroed (silent) samples.
+    
+    Args:
+        segments: Decoded sentence audio in narration order
+        gap_seconds: Silence between consecutive sentences
         
-        return results
+    Returns:
+        AudioSegment of the whole scene
+    """
+    frame_rate = max(segment.frame_rate for segment in segments)
+    channels = max(segment.channels for segment in segments)
+    sample_width = max(segment.sample_width for segment in segments)
+    segments = [
+        segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+        for segment in segments
+    ]
+    
+    frame_bytes = channels * sample_width
+    gap_bytes = int(round(gap_seconds * frame_rate)) * frame_bytes
+    total_bytes = sum(len(segment.raw_data) for segment in segments) + gap_bytes * (len(segments) - 1)
+    
+    buffer = bytearray(total_bytes)
+    if sample_width == 1:
+        # 8-bit PCM is unsigned: silence is the midpoint, not zero
+        buffer[:] = b"\x80" * total_bytes
+    view = memoryview(buffer)
+    offset = 0
+    for segment in segments:
+        data = segment.raw_data
+        view[offset:offset + len(data)] = data
+        offset += len(data) + gap_bytes
+    
+    return AudioSegment(data=bytes(buffer), sample_width=sample_width, frame_rate=frame_rate, channels=channels)
+
+def stitch_files_ffmpeg(sentence_files: List[Path], gap_seconds: float, output_filepath: Path) -> bool:
+    """
+    Stitch sentence MP3 files into one scene MP3 with a single ffmpeg concat filter graph,
+    inserting gap_seconds of silence between sentences. Nothing is decoded in Python.
+    Returns True if ffmpeg succeeded.
+    """
+    input_args = []
+    filters = []
+    concat_inputs = []
+    for i, sentence_file in enumerate(sentence_files):
+        input_args += ['-i', str(sentence_file)]
+        filters.append(f"[{i}:a:0]aformat=sample_fmts=s16:sample_rates=44100:channel_layouts=mono[s{i}]")
+        concat_inputs.append(f"[s{i}]")
+        if i < len(sentence_files) - 1 and gap_seconds > 0:
+            filters.append(f"anullsrc=r=44100:cl=mono,atrim=duration={gap_seconds:g}[g{i}]")
+            concat_inputs.append(f"[g{i}]")
+    filters.append(f"{''.join(concat_inputs)}concat=n={len(concat_inputs)}:v=0:a=1[out]")
+    
+    cmd = [
+        'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+        *input_args,
+        '-filter_complex', ";".join(filters),
+        '-map', '[out]',
+        '-c:a', 'libmp3lame', '-q:a', '2',
+        str(output_filepath)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"ffmpeg stitching failed for '{output_filepath.name}': {result.stderr.strip()}")
+    return result.returncode == 0
+
+def stitch_scene_audio(scene_tasks: List[AudioTask], output_filepath: Path, stitch_engine: str = "pcm") -> float:
+    """
+    Stitch the sentence audio of one scene and export it as MP3.
+    
+    Args:
+        scene_tasks: Successful sentence tasks of the scene in narration order
+        output_filepath: Scene MP3 to write
+        stitch_engine: "pcm" or "ffmpeg" (see STITCH_ENGINES); ffmpeg needs the sentence
+                       files on disk and falls back to pcm without them or on failure
+        
+    Returns:
+        Duration of the stitched scene in seconds
+    """
+    sentence_files = [task.output_filepath for task in scene_tasks]
+    if (stitch_engine == "ffmpeg" and shutil.which('ffmpeg')
+            and all(path.exists() for path in sentence_files)):
+        if stitch_files_ffmpeg(sentence_files, TIME_GAP_BETWEEN_SENTENCES, output_filepath):
+            # Measured from the encoded scene file's Xing/Info header, without decoding it
+            return mp3_duration_seconds(output_filepath)
+        print(f"Falling back to PCM stitching for '{output_filepath.name}'")
+    
+    scene_combined_audio = stitch_segments_pcm([task.load_audio_segment() for task in scene_tasks],
+                                               TIME_GAP_BETWEEN_SENTENCES)
+    scene_combined_audio.export(str(output_filepath), format="mp3")
+    return len(scene_combined_audio) / 1000.0
+
+# --- Incremental Regeneration ---
+
+def current_audio_settings() -> Dict[str, Any]:
+    """Settings that change the generated audio; audio of a previous run is only reused if they match."""
+    return {
+        "voice_id": VOICE_ID,
+        "model_id": MODEL_ID,
+        "voice_settings": VOICE_SETTINGS,
+        "sentence_gap_seconds": TIME_GAP_BETWEEN_SENTENCES,
+        "base_url": elevenlabs_base_url()
+    }
+
+def get_sentence_text(sentence_entry: Any) -> Optional[str]:
+    """Text of a sentence entry (a string or a dict with "text"), None for anything else."""
+    if isinstance(sentence_entry, dict) and "text" in sentence_entry:
+        return sentence_entry["text"]
+    if isinstance(sentence_entry, str):
+        return sentence_entry
+    return None
+
+def load_previous_audio(context: RunContext) -> Tuple[Dict[str, dict], Dict[str, Tuple[Path, float]]]:
+    """
+    Read the previous run's deconstruct_parallel_symbols.json of this run directory.
+    
+    Returns:
+        (reusable scenes, reusable sentences):
+        - step_id -> previous step, for scenes whose every sentence had audio and whose scene file still exists
+        - sentence text -> (sentence file, duration) for sentences whose file still exists
+        Both are empty if there is no previous run or it used other voice settings.
+    """
+    try:
+        with open(context.audio_manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        with open(context.audio_timing_file, 'r', encoding='utf-8') as f:
+            previous_data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}, {}
+    
+    if manifest.get("audio_settings") != current_audio_settings():
+        print("Previous audio was generated with other voice settings; regenerating everything.")
+        return {}, {}
+    
+    complete_scenes = set(manifest.get("complete_scenes", []))
+    previous_scenes = {}
+    previous_sentences = {}
+    for step in previous_data.get("solution_steps", []):
+        for sentence in step.get("sentences", []):
+            audio_file = sentence.get("audio_file_individual")
+            if isinstance(sentence, dict) and audio_file and Path(audio_file).exists():
+                previous_sentences.setdefault(sentence["text"], (Path(audio_file), sentence["duration_seconds"]))
+        
+        scene_file = step.get("audio_file_scene")
+        if step.get("step_id") in complete_scenes and scene_file and Path(scene_file).exists():
+            previous_scenes[step["step_id"]] = step
+    
+    return previous_scenes, previous_sentences
+
+def is_unchanged_scene(step: dict, previous_step: Optional[dict]) -> bool:
+    """True if a scene narrates exactly the same sentences as in the previous run."""
+    if previous_step is None or not isinstance(step.get("sentences"), list):
+        return False
+    texts = [get_sentence_text(entry) for entry in step["sentences"]]
+    previous_texts = [sentence.get("text") for sentence in previous_step.get("sentences", [])]
+    return texts == previous_texts
+
+def save_audio_manifest(context: RunContext, complete_scenes: List[str]):
+    """Record the voice settings and the fully narrated scenes for the next incremental run."""
+    manifest = {
+        "audio_settings": current_audio_settings(),
+        "complete_scenes": complete_scenes
+    }
+    try:
+        with open(context.audio_manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    except Exception as e:
+        print(f"Warning: Could not save audio manifest: {e}")
 
 # --- Main Processing Logic ---
 
-def process_solution_steps_with_audio(json_data: dict) -> dict:
+def process_solution_steps_with_audio(json_data: dict, context: RunContext, api_key: str,
+                                      cache: Optional[TTSAudioCache] = None,
+                                      write_sentence_files: bool = True, stitch_engine: str = "pcm",
+                                      limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                                      reuse_previous: bool = True, streaming: bool = False) -> dict:
     """
     Processes the solution steps, generating audio for each sentence in parallel,
     calculating durations, and assigning timestamps relative to the scene's start,
     and stitching scene audio.
+    
+    Compared with the previous run in the same run directory, only new or changed
+    sentences are generated and only scenes whose sentences changed are stitched again;
+    unchanged scenes keep their timing data and scene file.
 
     Args:
         json_data: The parsed JSON data from the input file.
+        context: Run whose Audio/ and Scene/ directories receive the audio files
+        api_key: Eleven Labs API key
+        cache: TTS audio cache for sentences narrated in earlier runs
+        write_sentence_files: Whether to keep each sentence's MP3 in the Audio/ directory
+        stitch_engine: How scene audio is stitched, "pcm" or "ffmpeg" (see STITCH_ENGINES)
+        limiter: Adaptive concurrency limiter for the ElevenLabs requests
+        reuse_previous: Whether to reuse the audio of the previous run in this run directory
+        streaming: Receive the audio from the streaming endpoint chunk by chunk
 
     Returns:
         A new dictionary with updated step and sentence information.
@@ -177,8 +664,14 @@ def process_solution_steps_with_audio(json_data: dict) -> dict:
     processed_data = json_data.copy()
 
     # Ensure output directories exist
-    INDIVIDUAL_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
-    SCENE_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+    context.audio_dir.mkdir(parents=True, exist_ok=True)
+    context.scene_audio_dir.mkdir(parents=True, exist_ok=True)
+
+    # Audio of the previous run that is still valid
+    previous_scenes, previous_sentences = load_previous_audio(context) if reuse_previous else ({}, {})
+    unchanged_scenes = {}  # Maps step_id to the previous step of scenes with identical sentences
+    # Until this run finishes, the files on disk no longer match the previous timing data
+    context.audio_manifest_file.unlink(missing_ok=True)
 
     # Collect all audio generation tasks
     all_tasks = []
@@ -187,6 +680,10 @@ def process_solution_steps_with_audio(json_data: dict) -> dict:
     for step in processed_data.get("solution_steps", []):
         step_id = step["step_id"]
         
+        if is_unchanged_scene(step, previous_scenes.get(step_id)):
+            unchanged_scenes[step_id] = previous_scenes[step_id]
+            continue
+        
         if "sentences" in step and isinstance(step["sentences"], list):
             for i, sentence_entry in enumerate(step["sentences"]):
                 # Extract the sentence text
@@ -199,26 +696,65 @@ def process_solution_steps_with_audio(json_data: dict) -> dict:
                     continue
 
                 # Create audio task
-                output_filepath = INDIVIDUAL_AUDIO_DIR / f"{step_id}_{i}.mp3"
+                output_filepath = context.audio_dir / f"{step_id}_{i}.mp3"
                 task = AudioTask(sentence_text, step_id, i, output_filepath)
                 all_tasks.append(task)
                 task_mapping[(step_id, i)] = task
 
+    # Changed scenes still reuse the audio of every sentence narrated in the previous run.
+    # All of it is read before any new sentence file is written, since files may be renamed.
+    reused_sentences = 0
+    for task in all_tasks:
+        previous = previous_sentences.get(task.sentence_text)
+        if previous is None:
+            continue
+        try:
+            with open(previous[0], 'rb') as f:
+                task.audio_bytes = f.read()
+        except OSError:
+            continue
+        task.source_filepath = previous[0]
+        task.duration_seconds = previous[1]
+        task.success = True
+        reused_sentences += 1
+    if reuse_previous and (unchanged_scenes or reused_sentences):
+        print(f"Incremental run: {len(unchanged_scenes)} unchanged scenes kept, "
+              f"{reused_sentences} sentences reused from the previous run")
+
     # Generate all audio files concurrently
     print(f"Starting parallel generation of {len(all_tasks)} audio files...")
     generation_start_time = time.time()
     
     # Run the async audio generation
-    completed_tasks = asyncio.run(generate_all_audio_async(all_tasks))
+    completed_tasks = asyncio.run(generate_all_audio_async(all_tasks, api_key, cache, write_sentence_files, limiter,
+                                                           streaming=streaming))
     
     generation_end_time = time.time()
     print(f"Parallel audio generation completed in {generation_end_time - generation_start_time:.2f} seconds")
+    if limiter is not None:
+        print_request_report(limiter)
+    failed_tasks = [task for task in all_tasks if not task.success]
+    if failed_tasks:
+        print(f"Warning: {len(failed_tasks)} sentences failed after retries; their durations are estimated "
+              f"and the scene audio will be out of sync with the timing data")
+    if cache is not None:
+        cache_hits = sum(1 for task in all_tasks if task.cached)
+        print(f"TTS cache: {cache_hits} of {len(all_tasks)} sentences served from '{cache.cache_dir}'")
+        cache.evict()
 
     # Process results and build the final data structure
+    stitch_jobs = []  # (step, successful sentence tasks, timestamped sentences) per scene
     for step in processed_data.get("solution_steps", []):
         step_id = step["step_id"]
         
-        individual_sentence_segments_for_scene = []
+        if step_id in unchanged_scenes:
+            previous_step = unchanged_scenes[step_id]
+            step["sentences"] = previous_step["sentences"]
+            step["audio_file_scene"] = previous_step["audio_file_scene"]
+            step["duration_scene_seconds"] = previous_step["duration_scene_seconds"]
+            continue
+        
+        scene_tasks = []
         timestamped_sentences_in_step = []
         
         # Initialize time tracker for the current scene
@@ -247,10 +783,10 @@ def process_solution_steps_with_audio(json_data: dict) -> dict:
                 audio_filename = None
                 duration = 0.0
 
-                if task.success and task.audio_segment:
-                    audio_filename = str(task.output_filepath)
+                if task.success:
+                    audio_filename = str(task.output_filepath) if write_sentence_files else None
                     duration = task.duration_seconds
-                    individual_sentence_segments_for_scene.append(task.audio_segment)
+                    scene_tasks.append(task)
                 else:
                     print(f"Warning: Audio generation failed for sentence '{sentence_text[:50]}...', using simulated duration.")
                     duration = max(0.75, len(sentence_text) * 0.15)  # Fallback heuristic
@@ -270,24 +806,34 @@ def process_solution_steps_with_audio(json_data: dict) -> dict:
             
             step["sentences"] = timestamped_sentences_in_step
 
-        # --- Stitching Logic for the current Scene (Step) ---
-        scene_combined_audio = AudioSegment.empty()
-        scene_audio_filepath = None
-
-        if individual_sentence_segments_for_scene:
-            for i, segment in enumerate(individual_sentence_segments_for_scene):
-                scene_combined_audio += segment
-                # Add silence between sentences, but not after the very last one in the scene
-                if i < len(individual_sentence_segments_for_scene) - 1:
-                    silence = AudioSegment.silent(duration=TIME_GAP_BETWEEN_SENTENCES * 1000)
-                    scene_combined_audio += silence
-            
-            scene_audio_filepath = SCENE_AUDIO_DIR / f"{step_id}_scene.mp3"
+        stitch_jobs.append((step, scene_tasks, timestamped_sentences_in_step))
+
+    # --- Stitching Logic: every scene is stitched and exported in parallel ---
+    stitching_start_time = time.time()
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="scene-export") as executor:
+        futures = {}
+        for step, scene_tasks, _ in stitch_jobs:
+            if scene_tasks:
+                scene_audio_filepath = context.scene_audio_dir / f"{step['step_id']}_scene.mp3"
+                futures[step["step_id"]] = (
+                    scene_audio_filepath,
+                    executor.submit(stitch_scene_audio, scene_tasks, scene_audio_filepath, stitch_engine)
+                )
+
+        for step, scene_tasks, timestamped_sentences_in_step in stitch_jobs:
+            step_id = step["step_id"]
+            if not scene_tasks:
+                print(f"No individual audio segments to stitch for scene '{step_id}'.")
+                step["audio_file_scene"] = "N/A (No audio generated for scene)"
+                step["duration_scene_seconds"] = 0.0
+                continue
+
+            scene_audio_filepath, future = futures[step_id]
             try:
-                scene_combined_audio.export(str(scene_audio_filepath), format="mp3")
+                scene_duration = future.result()
                 print(f"Stitched scene audio for '{step_id}' to '{scene_audio_filepath}'")
                 step["audio_file_scene"] = str(scene_audio_filepath)
-                step["duration_scene_seconds"] = round(len(scene_combined_audio) / 1000.0, 2)
+                step["duration_scene_seconds"] = round(scene_duration, 2)
                 
                 # Sanity check: Last sentence's end_time should match scene duration
                 if timestamped_sentences_in_step and abs(timestamped_sentences_in_step[-1]["end_time_seconds"] - step["duration_scene_seconds"]) > 0.01:
@@ -298,75 +844,242 @@ def process_solution_steps_with_audio(json_data: dict) -> dict:
                 print(f"Error stitching audio for scene '{step_id}': {e}")
                 step["audio_file_scene"] = "ERROR: Stitching failed"
                 step["duration_scene_seconds"] = 0.0
-        else:
-            print(f"No individual audio segments to stitch for scene '{step_id}'.")
-            step["audio_file_scene"] = "N/A (No audio generated for scene)"
-            step["duration_scene_seconds"] = 0.0
+
+    print(f"Scene audio stitched and exported in {time.time() - stitching_start_time:.2f} seconds ({stitch_engine})")
+
+    # Scenes whose every sentence has audio can be kept as they are by the next run
+    complete_scenes = list(unchanged_scenes)
+    for step, scene_tasks, timestamped_sentences_in_step in stitch_jobs:
+        if (scene_tasks and len(scene_tasks) == len(timestamped_sentences_in_step)
+                and step.get("duration_scene_seconds", 0.0) > 0):
+            complete_scenes.append(step["step_id"])
+    save_audio_manifest(context, complete_scenes)
 
     return processed_data
 
+# --- Prefetch during Step 1 ---
+
+class TTSPrefetcher:
+    """
+    Narrates the sentences of finished solution steps into the TTS audio cache while Step 1
+    is still streaming the rest of the solution (generate_solution_steps.py --stream), so
+    Step 2 answers them from the cache instead of waiting for ElevenLabs.
+    Only the cache is filled: no sentence files or timing data are written.
+    """
+    def __init__(self, api_key: str, cache: Optional[TTSAudioCache] = None):
+        self.api_key = api_key
+        self.cache = cache or TTSAudioCache()
+        self.tasks = []
+        self._submitted = set()
+        # One step at a time, each with the adaptive request limiter of a normal Step 2 run
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-prefetch")
+        self._futures = []
 
+    def submit_step(self, step: dict) -> int:
+        """
+        Queue the sentences of a finished step (sentences already queued are skipped).
 
+        Returns:
+            int: Number of sentences queued
+        """
+        step_id = str(step.get("step_id", "step"))
+        tasks = []
+        sentences = step.get("sentences") if isinstance(step.get("sentences"), list) else []
+        for i, sentence_entry in enumerate(sentences):
+            sentence_text = get_sentence_text(sentence_entry)
+            if not sentence_text or sentence_text in self._submitted:
+                continue
+            self._submitted.add(sentence_text)
+            # The output path is never written: sentence files are not kept
+            tasks.append(AudioTask(sentence_text, step_id, i, Path(f"{step_id}_{i}.mp3")))
+        if tasks:
+            self.tasks.extend(tasks)
+            self._futures.append(self._executor.submit(self._generate, tasks))
+        return len(tasks)
 
+    def _generate(self, tasks: List[AudioTask]):
+        asyncio.run(generate_all_audio_async(tasks, self.api_key, self.cache, write_sentence_files=False))
 
-# --- Main execution ---
-if __name__ == "__main__":
+    def close(self) -> Dict[str, int]:
+        """
+        Wait for the queued sentences (Step 2 must not request them again while they are in flight).
+
+        Returns:
+            dict: Number of sentences queued, narrated, found in the cache and failed
+        """
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Warning: TTS prefetch failed: {e}")
+        self._executor.shutdown()
+        self.cache.evict()
+        return {
+            "sentences": len(self.tasks),
+            "generated": sum(1 for task in self.tasks if task.success and not task.cached),
+            "cached": sum(1 for task in self.tasks if task.cached),
+            "failed": sum(1 for task in self.tasks if not task.success)
+        }
+
+
+
+
+
+# --- Stage entry point ---
+
+def run_stage(context: RunContext, use_cache: bool = True, write_sentence_files: bool = True,
+              stitch_engine: str = "pcm", streaming: bool = False,
+              standard_solution: Optional[dict] = None) -> StageResult:
+    """
+    Run Step 2 (narration audio and timing data) in the calling process.
+
+    Args:
+        context: Run whose math_solution_verbose.json is narrated; audio, Scene audio
+                 and timing JSON files are written to its run directory
+        use_cache: Reuse the audio of the previous run and answer unchanged sentences from the
+                   TTS audio cache (fresh audio is stored either way)
+        write_sentence_files: Keep each sentence's MP3 in Audio/ (scene audio in Scene/ is always written)
+        stitch_engine: "pcm" (preallocated buffer) or "ffmpeg" (concat of the sentence files)
+        streaming: Use the streaming TTS endpoint, writing audio to disk as it arrives
+        standard_solution: math_solution_standard.json content if the caller already has it
+                           (read from the run directory otherwise)
+
+    Returns:
+        StageResult with the timing JSON paths, audio directories and the timing data
+    """
     total_start_time = time.time()
-    if not ELEVEN_LABS_API_KEY:
-        print("Please set the ELEVENLABS_API_KEY environment variable. Exiting.")
-        exit(1)
 
-    if not INPUT_JSON_FILE.exists():
-        print(f"Error: The input file '{INPUT_JSON_FILE}' was not found. Please ensure it exists.")
-        exit(1)
+    api_key = load_elevenlabs_api_key()
+    if not api_key:
+        return StageResult.failure("ELEVENLABS_API_KEY environment variable not set")
+
+    input_json_file = context.solution_verbose_file
+    if not input_json_file.exists():
+        print(f"Error: The input file '{input_json_file}' was not found. Please ensure it exists.")
+        return StageResult.failure(f"Input file not found: {input_json_file}")
 
     try:
-        with open(INPUT_JSON_FILE, 'r', encoding='utf-8') as f:
+        with open(input_json_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
     except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from '{INPUT_JSON_FILE}'. Please check file format for errors.")
-        exit(1)
+        print(f"Error: Could not decode JSON from '{input_json_file}'. Please check file format for errors.")
+        return StageResult.failure(f"Could not decode JSON from {input_json_file}")
     except Exception as e:
         print(f"An unexpected error occurred while reading the file: {e}")
-        exit(1)
+        return StageResult.failure(f"Could not read {input_json_file}: {e}")
+
+    # The geometric elements are merged after narration; check both solutions before paying for any audio
+    try:
+        if standard_solution is None:
+            with open(context.solution_standard_file, 'r', encoding='utf-8') as f:
+                standard_solution = json.load(f)
+        validate_merge_inputs(data, standard_solution)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error: Could not read '{context.solution_standard_file}': {e}")
+        return StageResult.failure(f"Could not read {context.solution_standard_file}: {e}")
+    except GeometricTimingSchemaError as e:
+        print(f"❌ Malformed solution steps, {len(e.problems)} problems:")
+        for problem in e.problems:
+            print(f"   • {problem}")
+        return StageResult.failure(f"Malformed solution steps: {e}")
 
     # Process the data and generate audio
-    processed_data_with_audio = process_solution_steps_with_audio(data)
+    tts_cache = TTSAudioCache(bypass=not use_cache)
+    limiter = AdaptiveConcurrencyLimiter(
+        MAX_CONCURRENT_REQUESTS, MIN_CONCURRENT_REQUESTS, MAX_ADAPTIVE_CONCURRENT_REQUESTS,
+        REQUEST_LATENCY_TARGET_SECONDS
+    )
+    processed_data_with_audio = process_solution_steps_with_audio(data, context, api_key, tts_cache,
+                                                                  write_sentence_files, stitch_engine, limiter,
+                                                                  reuse_previous=use_cache, streaming=streaming)
+    
+    # Cache hit/miss counters and request statistics for the run summary
+    tts_cache_stats = tts_cache.stats()
+    tts_request_stats = limiter.report()
+    for stats_file, stats in ((context.tts_cache_stats_file, tts_cache_stats),
+                              (context.tts_request_stats_file, tts_request_stats)):
+        try:
+            with open(stats_file, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2)
+        except Exception as e:
+            print(f"Warning: Could not save {stats_file.name}: {e}")
 
     # Save the output to a new JSON file
     try:
-        with open(OUTPUT_JSON_FILE, 'w', encoding='utf-8') as f:
+        with open(context.audio_timing_file, 'w', encoding='utf-8') as f:
             json.dump(processed_data_with_audio, f, indent=2)
-        print(f"\n✅ Audio processing complete. Output JSON saved to '{OUTPUT_JSON_FILE}'.")
-        print(f"Individual sentence audio files are in '{INDIVIDUAL_AUDIO_DIR}'.")
-        print(f"Stitched scene audio files are in '{SCENE_AUDIO_DIR}'.")
+        print(f"\n✅ Audio processing complete. Output JSON saved to '{context.audio_timing_file}'.")
+        print(f"Individual sentence audio files are in '{context.audio_dir}'.")
+        print(f"Stitched scene audio files are in '{context.scene_audio_dir}'.")
     except Exception as e:
         print(f"Error saving output to file: {e}")
-    
+        return StageResult.failure(f"Could not save {context.audio_timing_file}: {e}")
+
     # --- Geometric Timing Processing ---
     print(f"\n🎬 Starting geometric timing processing...")
     geometric_timing_start_time = time.time()
-    
-    # Import and run the add_geometric_elements script
+
+    # Merge the in-memory timing data with the standard solution and write the result once
+    geometric_timing = None
+    geometric_error = None
     try:
-        import add_geometric_elements
-        geometric_result = add_geometric_elements.add_geometric_elements_to_timing()
-        
-        geometric_timing_end_time = time.time()
-        
-        if geometric_result:
-            print(f"✅ Geometric timing processing completed in {geometric_timing_end_time - geometric_timing_start_time:.2f} seconds")
-            print(f"📁 Geometric timing output saved to: '{GEOMETRIC_TIMING_OUTPUT_FILE}'")
-        else:
-            print(f"❌ Geometric timing processing failed")
-    except Exception as e:
+        geometric_timing = merge_and_write_geometric_timing(context, processed_data_with_audio, standard_solution)
+        print(f"✅ Geometric timing processing completed in {time.time() - geometric_timing_start_time:.2f} seconds")
+        print(f"📁 Geometric timing output saved to: '{context.geometric_timing_file}'")
+        print_merge_summary(geometric_timing)
+    except (GeometricTimingSchemaError, OSError) as e:
         print(f"❌ Error running geometric timing processing: {e}")
-        geometric_result = False
-    
+        geometric_error = str(e)
+
     total_end_time = time.time()
     print(f"\n🎉 Total script execution time: {total_end_time - total_start_time:.2f} seconds")
     print(f"📊 Generated files:")
-    print(f"   • Audio timing: {OUTPUT_JSON_FILE}")
-    print(f"   • Geometric timing: {GEOMETRIC_TIMING_OUTPUT_FILE}")
-    print(f"   • Individual audio: {INDIVIDUAL_AUDIO_DIR}")
-    print(f"   • Scene audio: {SCENE_AUDIO_DIR}")
\ No newline at end of file
+    print(f"   • Audio timing: {context.audio_timing_file}")
+    print(f"   • Geometric timing: {context.geometric_timing_file}")
+    print(f"   • Individual audio: {context.audio_dir}")
+    print(f"   • Scene audio: {context.scene_audio_dir}")
+    print(f"🗄️  TTS cache: {tts_cache_stats['hits']} hits, {tts_cache_stats['misses']} misses")
+
+    if geometric_timing is None:
+        return StageResult.failure(f"Geometric timing processing failed: {geometric_error}")
+
+    return StageResult(
+        True,
+        outputs={
+            "audio_timing_json": str(context.audio_timing_file),
+            "geometric_timing_json": str(context.geometric_timing_file),
+            "audio_dir": str(context.audio_dir),
+            "scene_audio_dir": str(context.scene_audio_dir)
+        },
+        data={"audio_timing": processed_data_with_audio, "geometric_timing": geometric_timing,
+              "tts_cache": tts_cache_stats, "tts_requests": tts_request_stats}
+    )
+
+# --- Main execution ---
+def main():
+    """Generate the narration audio and timing data from the command line."""
+    parser = argparse.ArgumentParser(description="Generate narration audio and timing data for the solution steps")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached sentence audio and call ElevenLabs again")
+    parser.add_argument("--no-sentence-files", action="store_true",
+                        help="Do not keep each sentence's MP3 in Audio/ (only the stitched scene audio)")
+    parser.add_argument("--tts-base-url",
+                        help="Text-to-speech API base URL, e.g. a local tts_stub_server.py (default: $ELEVENLABS_BASE_URL or ElevenLabs)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Use the streaming TTS endpoint and write each sentence's audio as it arrives")
+    parser.add_argument("--stitch-engine", choices=STITCH_ENGINES, default="pcm",
+                        help="Stitch scene audio in one PCM buffer (default) or with ffmpeg concat of the sentence files")
+    RunContext.add_argument(parser)
+    args = parser.parse_args()
+
+    if args.tts_base_url:
+        os.environ["ELEVENLABS_BASE_URL"] = args.tts_base_url
+
+    result = run_stage(RunContext(args.run_dir), use_cache=not args.no_cache,
+                       write_sentence_files=not args.no_sentence_files, stitch_engine=args.stitch_engine,
+                       streaming=args.stream)
+    if not result.success:
+        print(f"❌ {result.error}")
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ import base64
 import json
 import time
 import argparse
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 from openai import OpenAI
 from pathlib import Path
@@ -12,6 +12,19 @@ import sys
 
 # Import prompts from local pipeline_prompts.py
 from pipeline_prompts import Geometry_Blueprint_v2
+from llm_cache import LLMResponseCache
+from run_context import RunContext, StageResult
+from usage_records import UsageLog, UsageRecord
+from figure_builder import CoordinateModelError, build_figure_file
+from stream_extractors import (PythonBlockExtractor, StreamError, check_block_syntax, read_openai_completion,
+                               read_sse_completion, stream_options)
+
+STAGE_NAME = "integrated_geometry_pipeline"
+# How figure.py is produced from the blueprint:
+# - builder: locally from the coordinate model (coordinates.json), no LLM call
+# - llm: by Claude from coordinates.txt
+# - auto: builder, falling back to the LLM when the blueprint tables cannot be parsed
+FIGURE_MODES = ("auto", "builder", "llm")
 
 def encode_image_to_base64(image_path: str) -> str:
 
@@ -19,21 +32,39 @@ def encode_image_to_base64(image_path: str) -> str:
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
+def write_blueprint_file(output_dir: str, blueprint_text: str) -> str:
+    """Save the blueprint to coordinates.txt and return the file path."""
+    coordinates_file = os.path.join(output_dir, "coordinates.txt")
+    with open(coordinates_file, "w", encoding="utf-8") as f:
+        f.write("=== GEOMETRIC BLUEPRINT - COORDINATES ===\n\n")
+        f.write(blueprint_text)
+    return coordinates_file
+
 def make_gemini_blueprint_call(
     api_key: str,
     image_path: str,
-    output_dir: str
+    output_dir: str,
+    response_cache: Optional[LLMResponseCache] = None,
+    solution_steps_path: Optional[str] = None,
+    usage_log: Optional[UsageLog] = None,
+    stream: bool = False
 ) -> Dict[str, Any]:
     """
     Step 1: Make Gemini API call to generate geometric blueprint.
     This call now includes the solution steps JSON for better context.
+    If a response cache is given, an identical earlier request is answered from it.
+    The solution steps JSON defaults to the one in the current run directory.
+    If a usage log is given, the call's token usage and latency are recorded in it.
+    With stream, the response is streamed and its time to first token recorded.
     """
     
     # Encode the image
-    base64_image = encode_image_to_base64(image_path)
+    with open(image_path, "rb") as image_file:
+        image_bytes = image_file.read()
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
     
-    # Load solution steps JSON from Full_Pipeline
-    solution_steps_path = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline/math_solution_standard.json"
+    # Load solution steps JSON from the run directory
+    solution_steps_path = solution_steps_path or RunContext().solution_standard_file
     try:
         with open(solution_steps_path, "r", encoding="utf-8") as f:
             solution_steps_json = json.load(f)
@@ -44,6 +75,7 @@ def make_gemini_blueprint_call(
     
     # Use Geometry_Blueprint prompt from pipeline_prompts.py
     prompt_text = Geometry_Blueprint_v2
+    full_prompt = f"{prompt_text}\n\nSolution steps JSON:\n{json.dumps(solution_steps_json, indent=2)}"
 
     # Prepare the API request payload with solution steps included
     payload = {
@@ -54,7 +86,7 @@ def make_gemini_blueprint_call(
                 "content": [
                     {
                         "type": "text",
-                        "text": f"{prompt_text}\n\nSolution steps JSON:\n{json.dumps(solution_steps_json, indent=2)}"
+                        "text": full_prompt
                     },
                     {
                         "type": "image_url",
@@ -69,6 +101,34 @@ def make_gemini_blueprint_call(
         "temperature": 0.1
     }
     
+    # Return the cached blueprint if this exact request was made before
+    cache_key = None
+    if response_cache is not None:
+        cache_key = response_cache.make_key(
+            model=payload["model"],
+            prompt_parts=[full_prompt],
+            images=[image_bytes],
+            temperature=payload["temperature"],
+            max_tokens=payload["max_tokens"]
+        )
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Using cached geometric blueprint (saved {cached['total_tokens']} tokens)")
+            if usage_log is not None:
+                usage_log.record(UsageRecord(STAGE_NAME, payload["model"], cached=True, call="blueprint"))
+            coordinates_file = write_blueprint_file(output_dir, cached["content"])
+            print(f"✓ Geometric blueprint saved to: {coordinates_file}")
+            return {
+                "success": True,
+                "blueprint": cached["content"],
+                "coordinates_file": coordinates_file,
+                "api_call_duration": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cache_hit": True
+            }
+    
     # API endpoint
     url = "https://openrouter.ai/api/v1/chat/completions"
     
@@ -80,21 +140,32 @@ def make_gemini_blueprint_call(
         "X-Title": "Geometry Blueprint Generator"
     }
     
+    start_time = None
     try:
         # Start timing the API call
         start_time = time.time()
         
         # Make the API call
         print("Step 1: Making Gemini API call to generate geometric blueprint...")
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        # End timing
-        end_time = time.time()
-        api_call_duration = end_time - start_time
-        
-        # Parse the response
-        response_data = response.json()
+        if stream:
+            with requests.post(url, headers=headers, json={**payload, **stream_options()}, stream=True) as response:
+                response.raise_for_status()
+                streamed = read_sse_completion(response, start_time=start_time)
+            api_call_duration = streamed.wall_seconds
+            ttft_seconds = streamed.ttft_seconds
+            print(f"✓ First blueprint token after {ttft_seconds:.2f} seconds")
+            response_data = {"choices": [{"message": {"content": streamed.content}}], "usage": streamed.usage}
+        else:
+            response = requests.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            
+            # End timing (the response is not streamed, so the first token arrives with the rest)
+            end_time = time.time()
+            api_call_duration = end_time - start_time
+            ttft_seconds = api_call_duration
+            
+            # Parse the response
+            response_data = response.json()
         
         # Extract token usage information
         usage = response_data.get("usage", {})
@@ -107,13 +178,28 @@ def make_gemini_blueprint_call(
             blueprint_text = response_data["choices"][0]["message"]["content"]
             
             # Save the blueprint to coordinates.txt
-            coordinates_file = os.path.join(output_dir, "coordinates.txt")
-            with open(coordinates_file, "w", encoding="utf-8") as f:
-                f.write("=== GEOMETRIC BLUEPRINT - COORDINATES ===\n\n")
-                f.write(blueprint_text)
+            coordinates_file = write_blueprint_file(output_dir, blueprint_text)
             
             print(f"✓ Geometric blueprint saved to: {coordinates_file}")
             
+            if usage_log is not None:
+                usage_log.record(UsageRecord(
+                    STAGE_NAME, payload["model"],
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    wall_seconds=api_call_duration,
+                    ttft_seconds=ttft_seconds,
+                    call="blueprint"
+                ))
+            
+            if response_cache is not None:
+                response_cache.put(cache_key, {
+                    "content": blueprint_text,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": total_tokens
+                })
+            
             return {
                 "success": True,
                 "blueprint": blueprint_text,
@@ -134,6 +220,28 @@ def make_gemini_blueprint_call(
     except requests.exceptions.RequestException as e:
         error_msg = f"Gemini API request failed: {str(e)}"
         print(f"Error: {error_msg}")
+        if usage_log is not None and start_time is not None:
+            usage_log.record(UsageRecord(
+                STAGE_NAME, payload["model"],
+                wall_seconds=time.time() - start_time,
+                success=False,
+                call="blueprint"
+            ))
+        return {
+            "success": False,
+            "error": error_msg
+        }
+    except StreamError as e:
+        error_msg = f"Gemini API stream failed: {str(e)}"
+        print(f"Error: {error_msg}")
+        if usage_log is not None:
+            usage_log.record(UsageRecord(
+                STAGE_NAME, payload["model"],
+                wall_seconds=time.time() - start_time,
+                ttft_seconds=e.completion.ttft_seconds if e.completion else None,
+                success=False,
+                call="blueprint"
+            ))
         return {
             "success": False,
             "error": error_msg
@@ -165,11 +273,19 @@ def make_manim_code_call(
     api_key: str,
     image_path: str,
     coordinates_file: str,
-    output_dir: str
+    output_dir: str,
+    response_cache: Optional[LLMResponseCache] = None,
+    solution_steps_path: Optional[str] = None,
+    usage_log: Optional[UsageLog] = None,
+    stream: bool = False
 ) -> Dict[str, Any]:
     """
     Step 2: Make Claude API call to generate Manim code using the blueprint.
     This call uses the FRESH blueprint from Step 1, not any previous iteration.
+    If a response cache is given, an identical earlier request is answered from it.
+    The solution steps JSON defaults to the one in the current run directory.
+    If a usage log is given, the call's token usage and latency are recorded in it.
+    With stream, the response is streamed and each scene class is syntax-checked as soon as it is complete.
     """
     
     try:
@@ -187,8 +303,8 @@ def make_manim_code_call(
         print(f"Error reading coordinates file: {e}")
         return {"success": False, "error": f"Failed to read coordinates file: {e}"}
     
-    # Load solution steps JSON from Full_Pipeline
-    solution_steps_path = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline/math_solution_standard.json"
+    # Load solution steps JSON from the run directory
+    solution_steps_path = solution_steps_path or RunContext().solution_standard_file
     try:
         with open(solution_steps_path, "r", encoding="utf-8") as f:
             solution_steps_json = json.load(f)
@@ -209,40 +325,119 @@ def make_manim_code_call(
         prepare_image_for_api(image_path)
     ]
     
-    # Initialize OpenAI client for OpenRouter
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key
-    )
+    model = "anthropic/claude-sonnet-4"
+    max_tokens = 8000
+    temperature = 0.2
     
-    try:
-        # Start timing the API call
-        start_time = time.time()
-        
-        # Make the API call
-        print("Step 2: Making Claude API call to generate Manim code...")
-        completion = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://yoursite.com",
-                "X-Title": "Manim Code Generator",
-            },
-            model="anthropic/claude-sonnet-4",
-            messages=[
-                {
-                    "role": "user",
-                    "content": message_content
-                }
-            ],
-            max_tokens=8000,
-            temperature=0.2
+    cache_key = None
+    cached = None
+    if response_cache is not None:
+        with open(image_path, "rb") as img_file:
+            image_bytes = img_file.read()
+        cache_key = response_cache.make_key(
+            model=model,
+            prompt_parts=[part["text"] for part in message_content if part["type"] == "text"],
+            images=[image_bytes],
+            temperature=temperature,
+            max_tokens=max_tokens
         )
-        
-        # End timing
-        end_time = time.time()
-        api_call_duration = end_time - start_time
-        
-        # Extract the generated Manim code
-        manim_code = completion.choices[0].message.content
+        cached = response_cache.get(cache_key)
+    
+    start_time = None
+    api_call_duration = None
+    try:
+        if cached is not None:
+            # Reuse the Manim code from an identical earlier request
+            print(f"⚡ Using cached Manim code (saved {cached['total_tokens']} tokens)")
+            manim_code = cached["content"]
+            api_call_duration = 0.0
+            prompt_tokens = completion_tokens = total_tokens = 0
+            if usage_log is not None:
+                usage_log.record(UsageRecord(STAGE_NAME, model, cached=True, call="figure_code"))
+        else:
+            # Initialize OpenAI client for OpenRouter
+            client = OpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=api_key
+            )
+            
+            # Start timing the API call
+            start_time = time.time()
+            
+            # Make the API call
+            print("Step 2: Making Claude API call to generate Manim code...")
+            completion = client.chat.completions.create(
+                extra_headers={
+                    "HTTP-Referer": "https://yoursite.com",
+                    "X-Title": "Manim Code Generator",
+                },
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": message_content
+                    }
+                ],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **(stream_options() if stream else {})
+            )
+            
+            if stream:
+                extractor = PythonBlockExtractor()
+                
+                def check_blocks(blocks):
+                    for block in blocks:
+                        if block["kind"] != "class":
+                            continue
+                        error = check_block_syntax(block["source"])
+                        elapsed = time.time() - start_time
+                        if error:
+                            print(f"⚠️ {block['name']} complete after {elapsed:.1f}s with a syntax error ({error})")
+                        else:
+                            print(f"✓ {block['name']} complete after {elapsed:.1f}s, syntax OK")
+                
+                streamed = read_openai_completion(completion, lambda text: check_blocks(extractor.feed(text)), start_time)
+                check_blocks(extractor.finish())
+                api_call_duration = streamed.wall_seconds
+                ttft_seconds = streamed.ttft_seconds
+                manim_code = streamed.content
+                usage = streamed.usage
+                prompt_tokens = usage.get('prompt_tokens', 0)
+                completion_tokens = usage.get('completion_tokens', 0)
+                total_tokens = usage.get('total_tokens', 0)
+            else:
+                # End timing (the response is not streamed, so the first token arrives with the rest)
+                end_time = time.time()
+                api_call_duration = end_time - start_time
+                ttft_seconds = api_call_duration
+                
+                # Extract the generated Manim code
+                manim_code = completion.choices[0].message.content
+                
+                # Extract token usage information
+                usage = getattr(completion, 'usage', None)
+                prompt_tokens = getattr(usage, 'prompt_tokens', 0) if usage else 0
+                completion_tokens = getattr(usage, 'completion_tokens', 0) if usage else 0
+                total_tokens = getattr(usage, 'total_tokens', 0) if usage else 0
+            
+            if usage_log is not None:
+                usage_log.record(UsageRecord(
+                    STAGE_NAME, model,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    wall_seconds=api_call_duration,
+                    ttft_seconds=ttft_seconds,
+                    call="figure_code"
+                ))
+            
+            if response_cache is not None:
+                response_cache.put(cache_key, {
+                    "content": manim_code,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": total_tokens
+                })
         
         # Extract only Python code from the response (remove markdown and analysis text)
         import re
@@ -278,15 +473,10 @@ def make_manim_code_call(
         
         print(f"✓ Manim code saved to: {output_path}")
         
-        # Extract token usage information
-        usage = getattr(completion, 'usage', None)
-        prompt_tokens = getattr(usage, 'prompt_tokens', 0) if usage else 0
-        completion_tokens = getattr(usage, 'completion_tokens', 0) if usage else 0
-        total_tokens = getattr(usage, 'total_tokens', 0) if usage else 0
-        
         return {
             "success": True,
             "manim_code": manim_code,
+            "figure_code": extracted_code,
             "output_file": output_path,
             "api_call_duration": api_call_duration,
             "prompt_tokens": prompt_tokens,
@@ -297,28 +487,40 @@ def make_manim_code_call(
     except Exception as e:
         error_msg = f"Claude API call failed: {str(e)}"
         print(f"Error: {error_msg}")
+        if usage_log is not None and start_time is not None and api_call_duration is None:
+            usage_log.record(UsageRecord(
+                STAGE_NAME, model,
+                wall_seconds=time.time() - start_time,
+                success=False,
+                call="figure_code"
+            ))
         return {
             "success": False,
             "error": error_msg
         }
 
-def main():
-    """Main function to execute the integrated pipeline."""
-    
-    # Set up command line argument parser
-    parser = argparse.ArgumentParser(description="Generate geometric blueprint and Manim code from question image")
-    parser.add_argument("--question-image", help="Path to the question image file (required)")
-    
-    args = parser.parse_args()
+def run_stage(context: RunContext, use_cache: bool = True, figure_mode: str = "auto", stream: bool = False) -> StageResult:
+    """
+    Run Step 3 (geometric blueprint and figure code) in the calling process.
     
-    # Get question image path from command line or prompt user
-    image_path = args.question_image
-    if not image_path:
-        print("❌ Question image path is required!")
-        image_path = input("Please enter the path to your question image: ").strip()
-        if not image_path:
-            print("❌ No question image path provided. Exiting.")
-            sys.exit(1)
+    Args:
+        context (RunContext): Run whose question image and solution steps JSON are used;
+                              coordinates.txt, coordinates.json and figure.py are written to its run directory
+        use_cache (bool): Whether cached LLM responses may be used
+        figure_mode (str): One of FIGURE_MODES; how figure.py is produced from the blueprint
+        stream (bool): Stream the LLM responses (scene classes of LLM figure code are syntax-checked as they complete)
+        
+    Returns:
+        StageResult: Paths and content of the blueprint, coordinate model and Manim code, plus Gemini
+                     and Claude token usage (no Claude tokens when the figure builder is used)
+    """
+    if figure_mode not in FIGURE_MODES:
+        return StageResult.failure(f"Unknown figure mode: {figure_mode}")
+
+    image_path = context.question_image
+    if not image_path or not os.path.exists(image_path):
+        print(f"❌ Question image file not found: {image_path}")
+        return StageResult.failure(f"Question image file not found: {image_path}")
     
     # Load environment variables from .env file in current directory
     load_dotenv('.env')
@@ -328,16 +530,10 @@ def main():
     if not OPENROUTER_API_KEY:
         print("Error: OPENROUTER_API_KEY environment variable not set")
         print("Checked .env file in current directory")
-        sys.exit(1)
+        return StageResult.failure("OPENROUTER_API_KEY environment variable not set")
     
     # Output directory
-    output_dir = "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline"
-    
-    # Verify image file exists
-    if not os.path.exists(image_path):
-        print(f"❌ Question image file not found: {image_path}")
-        sys.exit(1)
-    
+    output_dir = str(context.run_dir)
     if not os.path.exists(output_dir):
         print(f"Creating output directory: {output_dir}")
         os.makedirs(output_dir, exist_ok=True)
@@ -346,40 +542,83 @@ def main():
     print(f"📁 Question image: {image_path}")
     print("🔄 Starting FRESH pipeline run with solution steps context\n")
     
+    # Shared on-disk cache of LLM responses and usage log for both calls
+    response_cache = LLMResponseCache(bypass=not use_cache)
+    usage_log = UsageLog(context.usage_log_file)
+    
     # Step 1: Generate geometric blueprint with Gemini
     print("🔄 Step 1: Generating geometric blueprint...")
     gemini_result = make_gemini_blueprint_call(
         api_key=OPENROUTER_API_KEY,
         image_path=image_path,
-        output_dir=output_dir
+        output_dir=output_dir,
+        response_cache=response_cache,
+        solution_steps_path=str(context.solution_standard_file),
+        usage_log=usage_log,
+        stream=stream
     )
     
     if not gemini_result["success"]:
         print(f"❌ Step 1 failed: {gemini_result['error']}")
-        return
+        return StageResult.failure(f"Geometric blueprint failed: {gemini_result['error']}")
     
     print(f"✅ Step 1 completed successfully!")
     print(f"   - Duration: {gemini_result['api_call_duration']:.2f} seconds")
     print(f"   - Tokens: {gemini_result['total_tokens']} (input: {gemini_result['prompt_tokens']}, output: {gemini_result['completion_tokens']})")
     print(f"   - Blueprint saved to: {gemini_result['coordinates_file']}\n")
     
-    # Step 2: Generate Manim code with Claude
-    print("🔄 Step 2: Generating Manim code...")
-    claude_result = make_manim_code_call(
-        api_key=OPENROUTER_API_KEY,
-        image_path=image_path,
-        coordinates_file=gemini_result['coordinates_file'],
-        output_dir=output_dir
-    )
-    
-    if not claude_result["success"]:
-        print(f"❌ Step 2 failed: {claude_result['error']}")
-        return
-    
-    print(f"✅ Step 2 completed successfully!")
-    print(f"   - Duration: {claude_result['api_call_duration']:.2f} seconds")
-    print(f"   - Tokens: {claude_result['total_tokens']} (input: {claude_result['prompt_tokens']}, output: {claude_result['completion_tokens']})")
-    print(f"   - Manim code saved to: {claude_result['output_file']}\n")
+    # Step 2: Build the figure code locally from the coordinate model, or generate it with Claude
+    built_figure = None
+    # coordinates.json only exists when this run's figure was built from it
+    context.coordinates_json_file.unlink(missing_ok=True)
+    if figure_mode != "llm":
+        print("🔄 Step 2: Building Manim code from the coordinate model...")
+        try:
+            built_figure = build_figure_file(gemini_result['blueprint'], context)
+        except CoordinateModelError as e:
+            print(f"⚠️ Could not build a coordinate model from the blueprint: {e}")
+            if figure_mode == "builder":
+                return StageResult.failure(f"Coordinate model failed: {e}")
+            print("   Falling back to the LLM for the figure code")
+        except OSError as e:
+            print(f"❌ Step 2 failed: {e}")
+            return StageResult.failure(f"Figure builder failed: {e}")
+
+    if built_figure is not None:
+        claude_result = {
+            "figure_code": built_figure["figure_code"],
+            "output_file": built_figure["output_file"],
+            "api_call_duration": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0
+        }
+        subparts = built_figure["coordinate_model"]["subparts"]
+        print(f"✅ Step 2 completed without an LLM call!")
+        print(f"   - Subparts: {', '.join(subpart['id'] for subpart in subparts)}")
+        print(f"   - Coordinate model saved to: {context.coordinates_json_file}")
+        print(f"   - Manim code saved to: {claude_result['output_file']}\n")
+    else:
+        print("🔄 Step 2: Generating Manim code...")
+        claude_result = make_manim_code_call(
+            api_key=OPENROUTER_API_KEY,
+            image_path=image_path,
+            coordinates_file=gemini_result['coordinates_file'],
+            output_dir=output_dir,
+            response_cache=response_cache,
+            solution_steps_path=str(context.solution_standard_file),
+            usage_log=usage_log,
+            stream=stream
+        )
+        
+        if not claude_result["success"]:
+            print(f"❌ Step 2 failed: {claude_result['error']}")
+            return StageResult.failure(f"Manim figure code failed: {claude_result['error']}")
+        
+        print(f"✅ Step 2 completed successfully!")
+        print(f"   - Duration: {claude_result['api_call_duration']:.2f} seconds")
+        print(f"   - Tokens: {claude_result['total_tokens']} (input: {claude_result['prompt_tokens']}, output: {claude_result['completion_tokens']})")
+        print(f"   - Manim code saved to: {claude_result['output_file']}\n")
     
     # Summary
     total_duration = gemini_result['api_call_duration'] + claude_result['api_call_duration']
@@ -393,11 +632,68 @@ def main():
     print(f"   - Claude Tokens: {claude_result['total_tokens']}")
     print(f"\n📁 Generated Files:")
     print(f"   - Geometric Blueprint: {gemini_result['coordinates_file']}")
+    if built_figure is not None:
+        print(f"   - Coordinate Model: {context.coordinates_json_file}")
     print(f"   - Manim Code: {claude_result['output_file']}")
     print(f"\n🎯 Next Steps:")
     print(f"   - Review the geometric blueprint in coordinates.txt")
     print(f"   - Run the Manim code: manim -pql figure.py")
     print(f"   - Each run is independent - no feedback loop!")
+    
+    return StageResult(
+        True,
+        outputs={
+            "coordinates": gemini_result['coordinates_file'],
+            "figure": claude_result['output_file']
+        },
+        data={
+            "blueprint": gemini_result['blueprint'],
+            "figure_code": claude_result['figure_code'],
+            "coordinate_model": built_figure["coordinate_model"] if built_figure is not None else None
+        },
+        token_usage={
+            "gemini": {
+                "prompt_tokens": gemini_result['prompt_tokens'],
+                "completion_tokens": gemini_result['completion_tokens'],
+                "total_tokens": gemini_result['total_tokens']
+            },
+            "claude": {
+                "prompt_tokens": claude_result['prompt_tokens'],
+                "completion_tokens": claude_result['completion_tokens'],
+                "total_tokens": claude_result['total_tokens']
+            }
+        }
+    )
+
+def main():
+    """Main function to execute the integrated pipeline."""
+    
+    # Set up command line argument parser
+    parser = argparse.ArgumentParser(description="Generate geometric blueprint and Manim code from question image")
+    parser.add_argument("--question-image", help="Path to the question image file (required)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses and call the API")
+    parser.add_argument("--figure-mode", choices=FIGURE_MODES, default="auto",
+                        help="Build figure.py from the blueprint tables (builder), with the LLM (llm), "
+                             "or with the builder and the LLM as fallback (auto, default)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the LLM responses and check each scene class of LLM figure code as it completes")
+    RunContext.add_argument(parser)
+    
+    args = parser.parse_args()
+    
+    # Get question image path from command line or prompt user
+    image_path = args.question_image
+    if not image_path:
+        print("❌ Question image path is required!")
+        image_path = input("Please enter the path to your question image: ").strip()
+        if not image_path:
+            print("❌ No question image path provided. Exiting.")
+            sys.exit(1)
+    
+    result = run_stage(RunContext(args.run_dir, image_path), use_cache=not args.no_cache,
+                       figure_mode=args.figure_mode, stream=args.stream)
+    if not result.success:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache
+Content-addressed on-disk cache for the LLM calls made by the generation stages
+(generate_solution_steps.py, integrated_geometry_pipeline.py and video_claude.py).
+
+Each entry is keyed by a SHA-256 hash of the model, the prompt text, the image bytes,
+the temperature and max_tokens. Rerunning a stage with unchanged inputs is then
+answered from disk instead of repeating the API call.
+
+Eviction:
+- Entries older than the maximum age are discarded
+- When the cache grows beyond the maximum size, the least recently used entries are removed
+
+An entry's age is the modification time of its file, which is written once by put(); a hit
+only moves the file's access time, which orders the entries for the size-based eviction.
+
+Environment variables:
+- LLM_CACHE_DIR: cache directory (default: .llm_cache next to this script)
+- LLM_CACHE_MAX_BYTES: maximum total cache size in bytes (default: 200 MB)
+- LLM_CACHE_MAX_AGE_DAYS: maximum entry age in days (default: 30)
+- LLM_CACHE_BYPASS: set to 1 to ignore cached responses (fresh responses are still stored)
+
+Usage: python llm_cache.py [--stats] [--clear]
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".llm_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+def bypass_requested() -> bool:
+    """Return True if the LLM_CACHE_BYPASS environment variable is set."""
+    return os.environ.get("LLM_CACHE_BYPASS", "").strip().lower() in ("1", "true", "yes")
+
+class LLMResponseCache:
+    """On-disk cache of LLM responses keyed by a hash of the request."""
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, max_bytes: Optional[int] = None,
+                 max_age_days: Optional[float] = None, bypass: bool = False):
+        self.cache_dir = Path(cache_dir or os.environ.get("LLM_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = os.environ.get("LLM_CACHE_MAX_BYTES") or DEFAULT_MAX_BYTES
+        if max_age_days is None:
+            max_age_days = os.environ.get("LLM_CACHE_MAX_AGE_DAYS") or DEFAULT_MAX_AGE_DAYS
+        self.max_bytes = int(max_bytes)
+        self.max_age_seconds = float(max_age_days) * 86400
+        self.bypass = bypass or bypass_requested()
+        self.hits = 0
+        self.misses = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, prompt_parts: List[str], images: Optional[List[bytes]] = None,
+                 temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                 **extra: Any) -> str:
+        """
+        Build the cache key for a request.
+
+        Args:
+            model (str): Model identifier sent to the API
+            prompt_parts (list): Text parts of the prompt, in order
+            images (list): Raw bytes of every image sent with the prompt, in order
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum completion tokens
+            **extra: Any other request options that change the response
+
+        Returns:
+            str: Hex SHA-256 digest identifying the request
+        """
+        hasher = hashlib.sha256()
+        header = {
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "extra": extra
+        }
+        hasher.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+
+        # Length-prefix every part so that different splits of the same text hash differently
+        for part in prompt_parts:
+            encoded = part.encode("utf-8")
+            hasher.update(b"text:%d:" % len(encoded))
+            hasher.update(encoded)
+        for image_bytes in images or []:
+            hasher.update(b"image:%d:" % len(image_bytes))
+            hasher.update(hashlib.sha256(image_bytes).digest())
+
+        return hasher.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _is_expired(self, stat: os.stat_result, now: float) -> bool:
+        return now - stat.st_mtime > self.max_age_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Returns:
+            dict: The stored response, or None on a miss (or when bypassing the cache)
+        """
+        if self.bypass:
+            self.misses += 1
+            return None
+
+        entry_path = self._entry_path(key)
+        try:
+            stat = entry_path.stat()
+            if self._is_expired(stat, time.time()):
+                self._remove(entry_path)
+                self.misses += 1
+                return None
+            with open(entry_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        # Mark the entry as used for the size-based eviction; its modification time stays
+        # the time it was written, so the age rule is unaffected
+        try:
+            os.utime(entry_path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+
+        self.hits += 1
+        return entry["response"]
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Store a response and evict old entries if the cache is over its limits."""
+        entry = {
+            "key": key,
+            "created_at": time.time(),
+            "response": response
+        }
+
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._entry_path(key))
+        except Exception:
+            self._remove(Path(temp_path))
+            raise
+
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove entries that are too old, then least recently used entries until
+        the cache fits within its size limit.
+
+        Returns:
+            int: Number of entries removed
+        """
+        now = time.time()
+        entries = []
+        removed = 0
+
+        for entry_path in self.cache_dir.glob("*.json"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            if self._is_expired(stat, now):
+                self._remove(entry_path)
+                removed += 1
+            else:
+                entries.append((stat.st_atime, stat.st_size, entry_path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(entry_path)
+            total_bytes -= size
+            removed += 1
+
+        return removed
+
+    def clear(self) -> int:
+        """Remove every cached entry. Returns the number of entries removed."""
+        removed = 0
+        for entry_path in self.cache_dir.glob("*.json"):
+            self._remove(entry_path)
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries and total size of the cache."""
+        sizes = [entry_path.stat().st_size for entry_path in self.cache_dir.glob("*.json")]
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": len(sizes),
+            "total_bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+            "max_age_days": self.max_age_seconds / 86400,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+def main():
+    """Inspect or clear the LLM response cache from the command line."""
+    parser = argparse.ArgumentParser(description="Inspect or clear the LLM response cache")
+    parser.add_argument("--stats", action="store_true", help="Show cache size and entry count")
+    parser.add_argument("--clear", action="store_true", help="Remove all cached responses")
+
+    args = parser.parse_args()
+
+    cache = LLMResponseCache()
+
+    if args.clear:
+        removed = cache.clear()
+        print(f"🧹 Removed {removed} cached responses from {cache.cache_dir}")
+
+    stats = cache.stats()
+    print(f"📁 Cache directory: {stats['cache_dir']}")
+    print(f"📊 Entries: {stats['entries']} ({stats['total_bytes'] / (1024 * 1024):.2f} MB of {stats['max_bytes'] / (1024 * 1024):.0f} MB)")
+    print(f"⏳ Maximum entry age: {stats['max_age_days']:.0f} days")
+
+if __name__ == "__main__":
+    main()
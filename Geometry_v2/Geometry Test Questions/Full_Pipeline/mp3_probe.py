@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+MP3 Probe
+Measures the duration of MP3 audio by walking its MPEG frame headers, without decoding.
+
+Mp3FrameCounter is fed the audio in arbitrary chunks (for example as a streamed TTS
+response arrives) and knows the duration the moment the last chunk has been fed;
+it only ever holds the few bytes of a header split across two chunks.
+
+probe_mp3() measures a file from the Xing/Info or VBRI header in its first frame when
+there is one (a few kilobytes read, however long the file), and walks the frame headers
+otherwise. The first frame holding such a header is not audio and is not counted; the
+encoder delay and padding of a LAME tag are subtracted, so durations match what a
+gapless decoder (ffmpeg, pydub) returns.
+
+Supported: MPEG-1, MPEG-2 and MPEG-2.5, Layers I-III, with or without a leading ID3v2
+tag. Bytes that do not form a valid frame header (trailing ID3v1 tags, garbage) are
+skipped until the next frame.
+
+Usage: python mp3_probe.py FILE [FILE ...]
+"""
+
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Bitrates in kbps by [MPEG-1?][layer] and bitrate index (index 0 is free format, 15 is invalid)
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+# Sample rates by version bits (3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5) and sample rate index
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000]
+}
+
+HEADER_BYTES = 4
+ID3V2_HEADER_BYTES = 10
+# Encoders writing a LAME-style tag (with encoder delay and padding) after the Xing/Info header
+LAME_TAG_ENCODERS = (b"LAME", b"Lavf", b"Lavc")
+LAME_TAG_BYTES = 24
+# The Fraunhofer VBRI header sits at a fixed offset after the frame header
+VBRI_OFFSET = 36
+
+def parse_frame_header(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse a 4-byte MPEG audio frame header.
+
+    Returns:
+        (frame length in bytes, samples in the frame, sample rate), or None if the
+        bytes are not a valid (non free-format) frame header
+    """
+    if len(header) < HEADER_BYTES or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    if layer == 2 or mpeg1:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+
+def parse_info_frame(frame: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Read the Xing/Info or VBRI header of the first frame of an MP3 file.
+
+    Returns:
+        dict with "tag" (Xing, Info or VBRI), "frames" (audio frames in the file, None if not
+        recorded), "encoder_delay" and "encoder_padding" (samples), or None if the frame is audio
+    """
+    version = (frame[1] >> 3) & 0x03
+    mono = (frame[3] >> 6) == 0x03
+    side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    offset = HEADER_BYTES + side_info + (0 if frame[1] & 0x01 else 2)
+
+    tag = frame[offset:offset + 4]
+    if tag in (b"Xing", b"Info"):
+        flags = int.from_bytes(frame[offset + 4:offset + 8], "big")
+        position = offset + 8
+        frames = None
+        if flags & 0x01:
+            frames = int.from_bytes(frame[position:position + 4], "big")
+            position += 4
+        # Optional byte count, seek table and quality indicator
+        position += (4 if flags & 0x02 else 0) + (100 if flags & 0x04 else 0) + (4 if flags & 0x08 else 0)
+
+        delay = padding = 0
+        lame_tag = frame[position:position + LAME_TAG_BYTES]
+        if len(lame_tag) == LAME_TAG_BYTES and lame_tag[:4] in LAME_TAG_ENCODERS:
+            # 12 bits of encoder delay and 12 bits of padding, 21 bytes into the LAME tag
+            delay = lame_tag[21] << 4 | lame_tag[22] >> 4
+            padding = (lame_tag[22] & 0x0F) << 8 | lame_tag[23]
+        return {"tag": tag.decode("ascii"), "frames": frames, "encoder_delay": delay, "encoder_padding": padding}
+
+    if frame[VBRI_OFFSET:VBRI_OFFSET + 4] == b"VBRI" and len(frame) >= VBRI_OFFSET + 18:
+        frames = int.from_bytes(frame[VBRI_OFFSET + 14:VBRI_OFFSET + 18], "big")
+        return {"tag": "VBRI", "frames": frames, "encoder_delay": 0, "encoder_padding": 0}
+    return None
+
+def id3v2_tag_length(header: bytes) -> int:
+    """Total length of an ID3v2 tag starting with this 10-byte header (0 if it is not one)."""
+    if len(header) < ID3V2_HEADER_BYTES or header[:3] != b"ID3":
+        return 0
+    size = (header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | (header[9] & 0x7F)
+    footer = ID3V2_HEADER_BYTES if header[5] & 0x10 else 0
+    return ID3V2_HEADER_BYTES + size + footer
+
+class Mp3FrameCounter:
+    """Incremental MP3 duration measurement: feed() chunks, then read duration_seconds."""
+
+    def __init__(self):
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = None
+        self.samples_per_frame = None
+        self.bytes_fed = 0
+        # From the Xing/Info or VBRI header, if the stream has one
+        self.info_tag = None
+        self.header_frames = None
+        self.encoder_delay = 0
+        self.encoder_padding = 0
+        self._pending = b""
+        self._skip = 0
+        self._at_start = True
+        self._first_frame_checked = False
+
+    def feed(self, chunk: bytes):
+        """Consume the next chunk of the MP3 stream."""
+        self.bytes_fed += len(chunk)
+        data = self._pending + bytes(chunk) if self._pending else bytes(chunk)
+        position = 0
+        end = len(data)
+
+        while True:
+            if self._skip:
+                step = min(self._skip, end - position)
+                position += step
+                self._skip -= step
+                if self._skip:
+                    break
+
+            if self._at_start:
+                # An ID3v2 tag may only precede the first frame (any real frame is longer than its header)
+                if end - position < ID3V2_HEADER_BYTES:
+                    break
+                self._at_start = False
+                tag_length = id3v2_tag_length(data[position:position + ID3V2_HEADER_BYTES])
+                if tag_length:
+                    self._skip = tag_length
+                    continue
+
+            if end - position < HEADER_BYTES:
+                break
+            frame = parse_frame_header(data[position:position + HEADER_BYTES])
+            if frame is None:
+                position += 1
+                continue
+            frame_length, frame_samples, sample_rate = frame
+
+            if not self._first_frame_checked:
+                # The first frame may be a Xing/Info or VBRI header instead of audio
+                if end - position < frame_length:
+                    break
+                self._first_frame_checked = True
+                self.sample_rate = sample_rate
+                self.samples_per_frame = frame_samples
+                info = parse_info_frame(data[position:position + frame_length])
+                if info:
+                    self.info_tag = info["tag"]
+                    self.header_frames = info["frames"]
+                    self.encoder_delay = info["encoder_delay"]
+                    self.encoder_padding = info["encoder_padding"]
+                    self._skip = frame_length
+                    continue
+
+            self.frames += 1
+            self.samples += frame_samples
+            self.sample_rate = self.sample_rate or sample_rate
+            self._skip = frame_length
+
+        self._pending = data[position:]
+
+    def _gapless_seconds(self, samples: int) -> float:
+        if not self.sample_rate:
+            return 0.0
+        return max(0, samples - self.encoder_delay - self.encoder_padding) / self.sample_rate
+
+    @property
+    def duration_seconds(self) -> float:
+        """Duration of the frames fed so far (without the encoder delay and padding)."""
+        return self._gapless_seconds(self.samples)
+
+    @property
+    def header_duration_seconds(self) -> Optional[float]:
+        """Duration of the whole stream according to its Xing/Info or VBRI header, if it records one."""
+        if not self.header_frames or not self.samples_per_frame:
+            return None
+        return self._gapless_seconds(self.header_frames * self.samples_per_frame)
+
+def probe_mp3(source: Union[str, Path, bytes], chunk_bytes: int = 16 * 1024) -> Dict[str, Any]:
+    """
+    Measure an MP3 file or MP3 bytes without decoding.
+
+    A file with a Xing/Info or VBRI frame count is measured from that header alone;
+    otherwise (and for bytes, which are already in memory) every frame header is walked.
+
+    Returns:
+        dict with "duration_seconds", "sample_rate", "frames", "method" ("header" or "frames"),
+        "tag" (Xing, Info, VBRI or None), "encoder_delay" and "encoder_padding"
+    """
+    counter = Mp3FrameCounter()
+    method = "frames"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        counter.feed(bytes(source))
+    else:
+        with open(source, "rb") as f:
+            # Seek over a leading ID3v2 tag (embedded cover art can be large) instead of reading it
+            tag_length = id3v2_tag_length(f.read(ID3V2_HEADER_BYTES))
+            f.seek(tag_length)
+            for chunk in iter(lambda: f.read(chunk_bytes), b""):
+                counter.feed(chunk)
+                if counter.header_duration_seconds is not None:
+                    method = "header"
+                    break
+
+    if method == "header":
+        duration, frames = counter.header_duration_seconds, counter.header_frames
+    else:
+        duration, frames = counter.duration_seconds, counter.frames
+    return {
+        "duration_seconds": duration,
+        "sample_rate": counter.sample_rate,
+        "frames": frames,
+        "method": method,
+        "tag": counter.info_tag,
+        "encoder_delay": counter.encoder_delay,
+        "encoder_padding": counter.encoder_padding
+    }
+
+def mp3_duration_seconds(source: Union[str, Path, bytes]) -> float:
+    """Duration of an MP3 file or of MP3 bytes, without decoding (0.0 if it holds no MP3 frames)."""
+    return probe_mp3(source)["duration_seconds"]
+
+def main():
+    """Print the duration of MP3 files from the command line."""
+    parser = argparse.ArgumentParser(description="Measure MP3 durations without decoding")
+    parser.add_argument("files", nargs="+", help="MP3 files to measure")
+
+    args = parser.parse_args()
+
+    for path in args.files:
+        info = probe_mp3(path)
+        source = f"{info['tag']} header" if info["method"] == "header" else f"{info['frames']} frames"
+        print(f"🎵 {path}: {info['duration_seconds']:.3f}s ({source})")
+
+if __name__ == "__main__":
+    main()
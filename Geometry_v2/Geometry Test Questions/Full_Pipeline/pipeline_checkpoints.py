@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Pipeline Checkpoints
+Per-run checkpoint manifest used by terminal_pipeline.py to resume interrupted runs.
+
+For every completed step the manifest records a SHA-256 hash of each input file
+(including the step's script) and each output file or directory, together with the
+options that change what the step produces (e.g. --figure-mode). On a resumed run
+a step is skipped when all of its inputs still hash to the recorded values, it runs
+with the recorded options and all of its outputs are still present and unchanged.
+A step whose upstream step was rerun sees new input hashes and therefore runs again.
+
+A step's code is more than its script: script_modules() lists the pipeline modules the
+script imports, directly or through other modules, so that editing e.g. the figure
+builder invalidates the step that uses it. Optional outputs (files a step only writes
+in some modes, like coordinates.json) are hashed too, but may be missing.
+
+Manifests are stored as JSON in checkpoints/<question-image-stem>.json.
+"""
+
+import os
+import ast
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+def hash_path(path: Union[str, Path]) -> Optional[str]:
+    """
+    Hash a file, or every file below a directory.
+
+    Args:
+        path: File or directory to hash
+
+    Returns:
+        str: Hex SHA-256 digest, or None if the path does not exist
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    hasher = hashlib.sha256()
+    if path.is_dir():
+        # Hash relative names together with contents so renames are detected too
+        for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+            hasher.update(str(file_path.relative_to(path)).encode("utf-8"))
+            hasher.update(hash_path(file_path).encode("ascii"))
+        return hasher.hexdigest()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def script_modules(script: Union[str, Path]) -> List[str]:
+    """
+    Modules of the script's directory that a script imports, directly or through each other.
+
+    Args:
+        script: Path of a pipeline script
+
+    Returns:
+        list: Paths of the imported modules, sorted; the script itself is not included
+    """
+    script = Path(script)
+    found = set()
+    pending = [script]
+    while pending:
+        path = pending.pop()
+        try:
+            tree = ast.parse(path.read_text(encoding="utf-8"))
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            continue
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names.append(node.module)
+        for name in names:
+            module = script.parent / f"{name.split('.')[0]}.py"
+            if module.exists() and module != script and str(module) not in found:
+                found.add(str(module))
+                pending.append(module)
+    return sorted(found)
+
+class CheckpointManifest:
+    """Record of the inputs and outputs of each completed step of one pipeline run."""
+
+    def __init__(self, manifest_path: Union[str, Path], question_image: str):
+        self.manifest_path = Path(manifest_path)
+        self.question_image = question_image
+        self._lock = threading.Lock()
+        self.data = self.load()
+
+    def load(self) -> Dict[str, Any]:
+        """Load the manifest from disk, or start an empty one."""
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+        return {"question_image": self.question_image, "steps": {}}
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run never leaves it half written."""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.manifest_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(temp_path, self.manifest_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def is_up_to_date(self, step_name: str, inputs: List[str], outputs: List[str],
+                      options: Optional[Dict[str, Any]] = None, optional_outputs: Optional[List[str]] = None) -> bool:
+        """
+        Check whether a step can be skipped.
+
+        Args:
+            step_name (str): Name of the step
+            inputs (list): Input files of the step, including its script and modules
+            outputs (list): Output files or directories of the step
+            options (dict): Options of the step that change its outputs
+            optional_outputs (list): Outputs the step does not always write
+
+        Returns:
+            bool: True if the step completed before with identical inputs and options
+                  and its outputs are unchanged
+        """
+        with self._lock:
+            record = self.data["steps"].get(step_name)
+        if not record or record.get("status") != "completed":
+            return False
+
+        all_outputs = outputs + (optional_outputs or [])
+        if sorted(record.get("inputs", {})) != sorted(inputs) or sorted(record.get("outputs", {})) != sorted(all_outputs):
+            return False
+        if record.get("options", {}) != (options or {}):
+            return False
+
+        for path in inputs:
+            if hash_path(path) != record["inputs"][path]:
+                return False
+        for path in all_outputs:
+            output_hash = hash_path(path)
+            if output_hash != record["outputs"][path] or (output_hash is None and path in outputs):
+                return False
+
+        return True
+
+    def record_step(self, step_name: str, inputs: List[str], outputs: List[str], duration: float,
+                    options: Optional[Dict[str, Any]] = None, optional_outputs: Optional[List[str]] = None):
+        """Record a completed step with the hashes of its inputs and outputs and its options."""
+        record = {
+            "status": "completed",
+            "completed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_seconds": round(duration, 2),
+            "inputs": {path: hash_path(path) for path in inputs},
+            "options": dict(options or {}),
+            "outputs": {path: hash_path(path) for path in outputs + (optional_outputs or [])}
+        }
+        with self._lock:
+            self.data["steps"][step_name] = record
+            self.save()
+
+    def record_failure(self, step_name: str, duration: float):
+        """Mark a step as failed so that a resumed run executes it again."""
+        with self._lock:
+            self.data["steps"][step_name] = {
+                "status": "failed",
+                "failed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "duration_seconds": round(duration, 2)
+            }
+            self.save()
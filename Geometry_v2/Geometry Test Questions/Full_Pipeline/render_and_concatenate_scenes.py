@@ -4,12 +4,16 @@ Render and Concatenate All Scenes Script
 
 This script automatically:
 1. Reads all scene class names from all_scenes.py in the order they appear
-2. Renders each scene sequentially using Manim with -ql quality (480p15)
-3. Concatenates all rendered videos using MoviePy with synchronized audio
+2. Renders the scenes in parallel (one Manim process per scene, --jobs at a time)
+   using Manim with -ql quality (480p15)
+3. Concatenates all rendered videos with synchronized audio in a single ffmpeg
+   filter graph (speed adjustment with setpts, scene audio muxing and the black
+   pauses between scenes), so no frame passes through Python; MoviePy is still
+   available with --concat-engine moviepy
 4. Saves the final video as final_geometry_video.mp4 with proper audio-video sync
 5. Opens the final video in default media player for preview
 
-Usage: python render_and_concatenate_scenes.py
+Usage: python render_and_concatenate_scenes.py [--jobs N] [--concat-engine ffmpeg|moviepy]
 """
 
 import subprocess
@@ -17,8 +21,16 @@ import sys
 import os
 import re
 import ast
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple, Optional
+
+from run_context import RunContext, StageResult
+from scene_duration_checker import MIN_SPEED_FACTOR, MAX_SPEED_FACTOR
+from mp3_probe import mp3_duration_seconds
 
 # MoviePy imports for video processing
 try:
@@ -29,17 +41,44 @@ except ImportError as e:
     MOVIEPY_AVAILABLE = False
     print(f"⚠️  MoviePy not found. Install with: pip install moviepy. Error: {e}")
 
+# Output format of each Manim quality flag: (width, height, fps)
+QUALITY_FORMATS = {
+    "ql": (854, 480, 15),
+    "qm": (1280, 720, 30),
+    "qh": (1920, 1080, 60)
+}
+
+# Black pause between scenes (slightly softer black: #0C0C0C)
+PAUSE_SECONDS = 2.0
+PAUSE_COLOR = "0x0C0C0C"
+AUDIO_SAMPLE_RATE = 44100
+
+CONCAT_ENGINES = ("ffmpeg", "moviepy")
+
 class SceneRenderer:
-    def __init__(self, scenes_file: str = "all_scenes.py", quality: str = "ql"):
-        self.scenes_file = scenes_file
+    def __init__(self, scenes_file: Optional[str] = None, quality: str = "ql", jobs: Optional[int] = None,
+                 context: Optional[RunContext] = None, concat_engine: str = "ffmpeg"):
+        # All inputs and outputs live in the run directory (see run_context.py)
+        self.context = context or RunContext()
+        self.scenes_file = str(scenes_file or self.context.scenes_file)
         self.current_quality = quality
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.concat_engine = concat_engine
         self.script_dir = Path(__file__).parent
-        self.media_dir = self.script_dir / "media"
-        self.scene_dir = self.script_dir / "Scene"
-        self.output_video = self.script_dir / "final_geometry_video.mp4"
+        self.run_dir = self.context.run_dir
+        self.media_dir = self.context.media_dir
+        self.jobs_media_dir = self.media_dir / "jobs"
+        self.scene_dir = self.context.scene_audio_dir
+        self.output_video = self.context.final_video
+        # Generated scene code imports functions.py from the script directory
+        self.render_env = self.context.subprocess_env()
         
-        # Ensure we're in the correct directory
-        os.chdir(self.script_dir)
+        # Parallel render state: each scene renders into its own media directory
+        # so concurrent Manim processes never write into the same files
+        self.scene_media_dirs = {}
+        self._active_processes = {}
+        self._process_lock = threading.Lock()
+        self._cancel_event = threading.Event()
         
     def extract_scene_classes(self) -> List[str]:
         """
@@ -70,35 +109,56 @@ class SceneRenderer:
         except Exception as e:
             raise Exception(f"Error reading scene file: {e}")
     
-    def render_scene(self, scene_name: str, quality: str = "ql") -> Tuple[str, bool]:
+    def render_scene(self, scene_name: str, quality: str = "ql", media_dir: Optional[Path] = None) -> Tuple[str, bool]:
         """
         Render a single scene using Manim with specified quality.
         Quality options: ql (480p15), qm (720p30), qh (1080p60)
+        If media_dir is given, Manim writes all of its output (videos, Tex, partial files) there.
         Returns (scene_name, success_status).
         """
+        if self._cancel_event.is_set():
+            print(f"⏹️  Skipping {scene_name}: render cancelled after an earlier failure")
+            return scene_name, False
+        
         print(f"🎬 Starting render for {scene_name} with quality: {quality}...")
         
         try:
             # Run manim command with specified quality and disable caching to prevent conflicts
-            cmd = [
-                'manim', f'-q{quality}', '--disable_caching', self.scenes_file, scene_name
-            ]
+            cmd = ['manim', f'-q{quality}', '--disable_caching']
+            if media_dir is not None:
+                cmd += ['--media_dir', str(media_dir)]
+            cmd += [self.scenes_file, scene_name]
             
             print(f"   Running: {' '.join(cmd)}")
             
-            result = subprocess.run(
+            process = subprocess.Popen(
                 cmd,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                cwd=self.script_dir
+                cwd=self.run_dir,
+                env=self.render_env
             )
+            with self._process_lock:
+                self._active_processes[scene_name] = process
+                # A failure elsewhere may have cancelled the run while this process was starting
+                if self._cancel_event.is_set():
+                    process.terminate()
+            try:
+                _, stderr = process.communicate()
+            finally:
+                with self._process_lock:
+                    self._active_processes.pop(scene_name, None)
             
-            if result.returncode == 0:
+            if process.returncode == 0:
                 print(f"✅ Successfully rendered {scene_name}")
                 return scene_name, True
+            elif self._cancel_event.is_set():
+                print(f"⏹️  Cancelled render for {scene_name}")
+                return scene_name, False
             else:
                 print(f"❌ Failed to render {scene_name}")
-                print(f"   Error output: {result.stderr}")
+                print(f"   Error output: {stderr}")
                 return scene_name, False
                 
         except FileNotFoundError:
@@ -108,6 +168,54 @@ class SceneRenderer:
             print(f"❌ Error rendering {scene_name}: {e}")
             return scene_name, False
     
+    def cancel_active_renders(self):
+        """Stop scheduling new renders and terminate every Manim process still running."""
+        with self._process_lock:
+            self._cancel_event.set()
+            for scene_name, process in self._active_processes.items():
+                if process.poll() is None:
+                    print(f"   ⏹️  Terminating render of {scene_name}")
+                    process.terminate()
+    
+    def prepare_scene_media_dir(self, scene_name: str) -> Path:
+        """
+        Create a private media directory for one scene's render job.
+        The shared Tex cache is hard-linked in so already compiled LaTeX is reused,
+        while anything the job writes stays inside its own directory.
+        """
+        scene_media_dir = self.jobs_media_dir / scene_name
+        if scene_media_dir.exists():
+            shutil.rmtree(scene_media_dir)
+        scene_media_dir.mkdir(parents=True)
+        
+        shared_tex_dir = self.media_dir / "Tex"
+        if shared_tex_dir.exists():
+            def link_or_copy(src, dst):
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+            shutil.copytree(shared_tex_dir, scene_media_dir / "Tex", copy_function=link_or_copy)
+        
+        return scene_media_dir
+    
+    def collect_tex_cache(self):
+        """Copy LaTeX compiled by the parallel jobs back into the shared Tex cache (runs after all jobs finish)."""
+        shared_tex_dir = self.media_dir / "Tex"
+        shared_tex_dir.mkdir(parents=True, exist_ok=True)
+        collected = 0
+        for scene_media_dir in self.scene_media_dirs.values():
+            job_tex_dir = scene_media_dir / "Tex"
+            if not job_tex_dir.exists():
+                continue
+            for tex_file in job_tex_dir.iterdir():
+                target = shared_tex_dir / tex_file.name
+                if tex_file.is_file() and not target.exists():
+                    shutil.copy2(tex_file, target)
+                    collected += 1
+        if collected:
+            print(f"🗂️  Added {collected} newly compiled Tex files to the shared cache")
+    
     def render_scenes_sequentially(self, scene_names: List[str], quality: str = "ql") -> List[Tuple[str, bool]]:
         """
         Render multiple scenes sequentially (one after another).
@@ -140,6 +248,54 @@ class SceneRenderer:
         
         return results
     
+    def render_scenes_in_parallel(self, scene_names: List[str], quality: str = "ql", jobs: Optional[int] = None) -> List[Tuple[str, bool]]:
+        """
+        Render multiple scenes concurrently, running up to `jobs` Manim processes at once.
+        Quality options: ql (480p15), qm (720p30), qh (1080p60)
+        Returns list of (scene_name, success_status) tuples in file order.
+        Stops the entire process if any scene fails: queued scenes are skipped and
+        running Manim processes are terminated.
+        """
+        jobs = max(1, min(jobs or self.jobs, len(scene_names)))
+        print(f"\n🎬 Rendering {len(scene_names)} scenes with {jobs} parallel jobs at quality: {quality}...")
+        print("-" * 40)
+        
+        self._cancel_event.clear()
+        for scene_name in scene_names:
+            self.scene_media_dirs[scene_name] = self.prepare_scene_media_dir(scene_name)
+        
+        results = {}
+        
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(self.render_scene, scene_name, quality, self.scene_media_dirs[scene_name]): scene_name
+                for scene_name in scene_names
+            }
+            
+            for future in as_completed(futures):
+                scene_name = futures[future]
+                if future.cancelled():
+                    continue
+                
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ Exception in {scene_name}: {e}")
+                    result = (scene_name, False)
+                results[scene_name] = result
+                
+                # Fail fast: cancel everything else as soon as one scene fails
+                if not result[1] and not self._cancel_event.is_set():
+                    print(f"❌ Scene {scene_name} failed. Stopping all renders...")
+                    for pending in futures:
+                        pending.cancel()
+                    self.cancel_active_renders()
+        
+        self.collect_tex_cache()
+        
+        # Return partial results in file order, will be handled in main loop
+        return [results[scene_name] for scene_name in scene_names if scene_name in results]
+    
     def find_rendered_video(self, scene_name: str) -> str:
         """
         Find the rendered video file for a scene.
@@ -158,11 +314,15 @@ class SceneRenderer:
         # Get the quality directory name
         quality_dir = quality_map.get(self.current_quality, "480p15")
         
+        # Scenes rendered in parallel live in their own job media directory
+        media_dir = self.scene_media_dirs.get(scene_name, self.media_dir)
+        
+        scenes_module = Path(self.scenes_file).stem
         video_patterns = [
-            self.media_dir / "videos" / self.scenes_file.replace('.py', '') / quality_dir / f"{scene_name}.mp4",
-            self.media_dir / "videos" / self.scenes_file.replace('.py', '') / "480p15" / f"{scene_name}.mp4",
-            self.media_dir / "videos" / self.scenes_file.replace('.py', '') / "720p30" / f"{scene_name}.mp4",
-            self.media_dir / "videos" / self.scenes_file.replace('.py', '') / "1080p60" / f"{scene_name}.mp4",
+            media_dir / "videos" / scenes_module / quality_dir / f"{scene_name}.mp4",
+            media_dir / "videos" / scenes_module / "480p15" / f"{scene_name}.mp4",
+            media_dir / "videos" / scenes_module / "720p30" / f"{scene_name}.mp4",
+            media_dir / "videos" / scenes_module / "1080p60" / f"{scene_name}.mp4",
         ]
         
         for pattern in video_patterns:
@@ -170,7 +330,7 @@ class SceneRenderer:
                 return str(pattern)
         
         # If not found with standard patterns, search recursively
-        for video_file in self.media_dir.rglob(f"{scene_name}.mp4"):
+        for video_file in media_dir.rglob(f"{scene_name}.mp4"):
             return str(video_file)
         
         raise FileNotFoundError(f"Rendered video not found for {scene_name}")
@@ -204,12 +364,23 @@ class SceneRenderer:
             print(f"⚠️  Audio file not found: {audio_path}")
             return None
     
+    def audio_duration(self, audio_path: str) -> float:
+        """
+        Duration of a scene audio file. MP3s are measured from their Xing/Info header or
+        frame headers (mp3_probe.py), without decoding and without starting ffprobe.
+        """
+        if audio_path.lower().endswith(".mp3"):
+            duration = mp3_duration_seconds(audio_path)
+            if duration > 0:
+                return duration
+        return self.probe_media(audio_path)["duration"]
+    
     def create_concat_list(self, video_files: List[str]) -> str:
         """
         Create a temporary file list for ffmpeg concatenation.
         Returns the path to the temporary file list.
         """
-        concat_list_path = self.script_dir / "concat_list.txt"
+        concat_list_path = self.run_dir / "concat_list.txt"
         
         with open(concat_list_path, 'w') as f:
             for video_file in video_files:
@@ -220,7 +391,7 @@ class SceneRenderer:
         print(f"📝 Created concat list: {concat_list_path}")
         return str(concat_list_path)
     
-    def create_black_screen_pause(self, duration: float = 2.0) -> VideoFileClip:
+    def create_black_screen_pause(self, duration: float = 2.0) -> "VideoFileClip":
         """
         Create a black screen pause clip with specified duration.
         Returns a VideoFileClip with black screen and no audio.
@@ -263,30 +434,31 @@ class SceneRenderer:
                 if audio_path:
                     print(f"      🎵 Found audio: {os.path.basename(audio_path)}")
                     audio_clip = AudioFileClip(audio_path)
+                    audio_duration = self.audio_duration(audio_path)
                     
                     # Synchronize video with audio duration by adjusting video playback speed
-                    if audio_clip.duration != video_clip.duration:
+                    if audio_duration != video_clip.duration:
                         # Calculate speed factor to match audio duration
-                        speed_factor = video_clip.duration / audio_clip.duration
+                        speed_factor = video_clip.duration / audio_duration
                         
-                        # Check speed limits (max 1.5x, min 0.75x)
-                        if speed_factor > 1.5:
-                            print(f"      ❌ Video speed adjustment too extreme: {speed_factor:.3f}x (max: 1.5x)")
-                            print(f"         Video: {video_clip.duration:.2f}s, Audio: {audio_clip.duration:.2f}s")
+                        # Check speed limits (see scene_duration_checker.py, which checks them before rendering)
+                        if speed_factor > MAX_SPEED_FACTOR:
+                            print(f"      ❌ Video speed adjustment too extreme: {speed_factor:.3f}x (max: {MAX_SPEED_FACTOR}x)")
+                            print(f"         Video: {video_clip.duration:.2f}s, Audio: {audio_duration:.2f}s")
                             print(f"         Stopping process due to excessive speed adjustment required.")
                             return False
-                        elif speed_factor < 0.75:
-                            print(f"      ❌ Video speed adjustment too extreme: {speed_factor:.3f}x (min: 0.75x)")
-                            print(f"         Video: {video_clip.duration:.2f}s, Audio: {audio_clip.duration:.2f}s")
+                        elif speed_factor < MIN_SPEED_FACTOR:
+                            print(f"      ❌ Video speed adjustment too extreme: {speed_factor:.3f}x (min: {MIN_SPEED_FACTOR}x)")
+                            print(f"         Video: {video_clip.duration:.2f}s, Audio: {audio_duration:.2f}s")
                             print(f"         Stopping process due to excessive speed adjustment required.")
                             return False
                         
-                        if video_clip.duration > audio_clip.duration:
-                            print(f"      ⏱️  Speeding up video: {video_clip.duration:.2f}s → {audio_clip.duration:.2f}s (speed: {speed_factor:.3f}x)")
+                        if video_clip.duration > audio_duration:
+                            print(f"      ⏱️  Speeding up video: {video_clip.duration:.2f}s → {audio_duration:.2f}s (speed: {speed_factor:.3f}x)")
                             # Speed up video to match audio duration
                             video_clip = video_clip.with_speed_scaled(speed_factor)
                         else:
-                            print(f"      ⏱️  Slowing down video: {video_clip.duration:.2f}s → {audio_clip.duration:.2f}s (speed: {speed_factor:.3f}x)")
+                            print(f"      ⏱️  Slowing down video: {video_clip.duration:.2f}s → {audio_duration:.2f}s (speed: {speed_factor:.3f}x)")
                             # Slow down video to match audio duration
                             video_clip = video_clip.with_speed_scaled(speed_factor)
                     else:
@@ -343,6 +515,192 @@ class SceneRenderer:
             print(f"❌ Error concatenating videos with MoviePy: {e}")
             return False
     
+    def probe_media(self, media_path: str) -> Dict:
+        """
+        Read duration, frame size, frame rate and audio presence of a media file with ffprobe.
+        Returns a dict with duration, width, height, fps and has_audio (missing values are None).
+        """
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error',
+                '-show_entries', 'format=duration:stream=codec_type,width,height,r_frame_rate',
+                '-of', 'json', media_path
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        data = json.loads(result.stdout)
+        
+        info = {
+            "duration": float(data.get("format", {}).get("duration", 0.0)),
+            "width": None,
+            "height": None,
+            "fps": None,
+            "has_audio": False
+        }
+        for stream in data.get("streams", []):
+            if stream.get("codec_type") == "video" and info["width"] is None:
+                info["width"] = stream.get("width")
+                info["height"] = stream.get("height")
+                numerator, _, denominator = stream.get("r_frame_rate", "0/1").partition("/")
+                if float(denominator or 1) > 0 and float(numerator) > 0:
+                    info["fps"] = float(numerator) / float(denominator or 1)
+            elif stream.get("codec_type") == "audio":
+                info["has_audio"] = True
+        return info
+    
+    def plan_concat_segments(self, scene_names: List[str], video_files: List[str]) -> Optional[List[Dict]]:
+        """
+        Work out the speed factor and target duration of every scene from probed durations,
+        applying the same speed limits as the MoviePy path.
+        Returns one dict per scene, or None if a scene would need too extreme a speed change.
+        """
+        segments = []
+        for i, (scene_name, video_path) in enumerate(zip(scene_names, video_files)):
+            print(f"   📹 Probing scene {i+1}/{len(scene_names)}: {scene_name}")
+            video_info = self.probe_media(video_path)
+            segment = {
+                "scene": scene_name,
+                "video": video_path,
+                "audio": None,
+                "video_has_audio": video_info["has_audio"],
+                "speed": 1.0,
+                "duration": video_info["duration"]
+            }
+            
+            audio_path = self.find_audio_file(scene_name)
+            if audio_path:
+                print(f"      🎵 Found audio: {os.path.basename(audio_path)}")
+                audio_duration = self.audio_duration(audio_path)
+                speed_factor = video_info["duration"] / audio_duration if audio_duration > 0 else 1.0
+                
+                if speed_factor > MAX_SPEED_FACTOR or speed_factor < MIN_SPEED_FACTOR:
+                    limit = f"max: {MAX_SPEED_FACTOR}x" if speed_factor > MAX_SPEED_FACTOR else f"min: {MIN_SPEED_FACTOR}x"
+                    print(f"      ❌ Video speed adjustment too extreme: {speed_factor:.3f}x ({limit})")
+                    print(f"         Video: {video_info['duration']:.2f}s, Audio: {audio_duration:.2f}s")
+                    print(f"         Stopping process due to excessive speed adjustment required.")
+                    return None
+                
+                print(f"      ⏱️  Video {video_info['duration']:.2f}s → audio {audio_duration:.2f}s (speed: {speed_factor:.3f}x)")
+                segment.update({"audio": audio_path, "speed": speed_factor, "duration": audio_duration})
+            else:
+                print(f"      ⚠️  No audio file found for {scene_name}")
+            
+            segments.append(segment)
+        return segments
+    
+    def build_concat_filter_graph(self, segments: List[Dict], width: int, height: int,
+                                  fps: float) -> Tuple[List[str], str]:
+        """
+        Build the ffmpeg input arguments and filter graph that speed-adjust every scene,
+        attach its audio, insert the black pauses and concatenate everything.
+        Returns (input arguments, filter_complex string) with outputs [outv] and [outa].
+        """
+        input_args = []
+        filters = []
+        concat_inputs = []
+        input_index = 0
+        
+        for i, segment in enumerate(segments):
+            duration = f"{segment['duration']:.3f}"
+            
+            input_args += ['-i', segment["video"]]
+            video_index = input_index
+            input_index += 1
+            
+            # Speed change (setpts), then normalize size/rate so every segment can be concatenated
+            filters.append(
+                f"[{video_index}:v:0]setpts=(PTS-STARTPTS)/{segment['speed']:.6f},fps={fps:g},"
+                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color={PAUSE_COLOR},"
+                f"setsar=1,format=yuv420p,tpad=stop_mode=clone:stop_duration=1,"
+                f"trim=duration={duration},setpts=PTS-STARTPTS[v{i}]"
+            )
+            
+            # Scene audio replaces the video's own audio; without it, keep the video's audio or use silence
+            if segment["audio"]:
+                input_args += ['-i', segment["audio"]]
+                audio_source = f"[{input_index}:a:0]"
+                input_index += 1
+            elif segment["video_has_audio"]:
+                audio_source = f"[{video_index}:a:0]"
+            else:
+                audio_source = f"anullsrc=r={AUDIO_SAMPLE_RATE}:cl=stereo,"
+            filters.append(
+                f"{audio_source}aformat=sample_rates={AUDIO_SAMPLE_RATE}:channel_layouts=stereo,"
+                f"apad,atrim=duration={duration},asetpts=PTS-STARTPTS[a{i}]"
+            )
+            concat_inputs.append(f"[v{i}][a{i}]")
+            
+            # Black pause after each scene except the last one
+            if i < len(segments) - 1:
+                filters.append(
+                    f"color=c={PAUSE_COLOR}:s={width}x{height}:r={fps:g}:d={PAUSE_SECONDS:g},"
+                    f"setsar=1,format=yuv420p[gv{i}]"
+                )
+                filters.append(
+                    f"anullsrc=r={AUDIO_SAMPLE_RATE}:cl=stereo,atrim=duration={PAUSE_SECONDS:g},"
+                    f"asetpts=PTS-STARTPTS[ga{i}]"
+                )
+                concat_inputs.append(f"[gv{i}][ga{i}]")
+        
+        filters.append(f"{''.join(concat_inputs)}concat=n={len(concat_inputs)}:v=1:a=1[outv][outa]")
+        return input_args, ";".join(filters)
+    
+    def concatenate_videos_with_ffmpeg_filter(self, scene_names: List[str], video_files: List[str]) -> bool:
+        """
+        Concatenate videos with synchronized audio in a single ffmpeg process.
+        Speed adjustment, audio muxing and the black pauses all happen in one filter
+        graph, so frames never pass through Python and memory use does not grow with
+        the video length. Returns True if successful, False otherwise.
+        """
+        print(f"🎬 Concatenating videos with an ffmpeg filter graph...")
+        
+        if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+            print("❌ ffmpeg/ffprobe not found. Please install FFmpeg.")
+            return False
+        
+        try:
+            segments = self.plan_concat_segments(scene_names, video_files)
+            if segments is None:
+                return False
+            
+            # Output format: the rendered scenes' own format, or the quality preset's
+            first_video = self.probe_media(video_files[0])
+            default_width, default_height, default_fps = QUALITY_FORMATS.get(self.current_quality, QUALITY_FORMATS["ql"])
+            width = first_video["width"] or default_width
+            height = first_video["height"] or default_height
+            fps = first_video["fps"] or default_fps
+            
+            input_args, filter_graph = self.build_concat_filter_graph(segments, width, height, fps)
+            
+            cmd = [
+                'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                *input_args,
+                '-filter_complex', filter_graph,
+                '-map', '[outv]', '-map', '[outa]',
+                '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac',
+                '-movflags', '+faststart',
+                str(self.output_video)
+            ]
+            
+            print(f"⏸️  Adding {PAUSE_SECONDS:g}-second black screen pauses between scenes...")
+            print(f"💾 Writing final video: {self.output_video}")
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.run_dir)
+            
+            if result.returncode == 0:
+                print(f"✅ Successfully created final video: {self.output_video}")
+                return True
+            print(f"❌ ffmpeg filter graph concatenation failed")
+            print(f"   Error output: {result.stderr}")
+            return False
+            
+        except Exception as e:
+            print(f"❌ Error concatenating videos with ffmpeg: {e}")
+            return False
+    
     def concatenate_videos_with_ffmpeg(self, video_files: List[str]) -> bool:
         """
         Fallback: Concatenate videos using ffmpeg (original method).
@@ -381,7 +739,7 @@ class SceneRenderer:
                 cmd,
                 capture_output=True,
                 text=True,
-                cwd=self.script_dir
+                cwd=self.run_dir
             )
             
             # Clean up temp file
@@ -435,15 +793,21 @@ class SceneRenderer:
     def run(self):
         """Main execution function."""
         print("🚀 Starting scene rendering and concatenation pipeline...")
-        print("📹 Reading scene classes from all_scenes.py, rendering sequentially, concatenating in file order")
+        if self.jobs > 1:
+            print(f"📹 Reading scene classes from all_scenes.py, rendering with {self.jobs} parallel jobs, concatenating in file order")
+        else:
+            print("📹 Reading scene classes from all_scenes.py, rendering sequentially, concatenating in file order")
         print("=" * 60)
         
         try:
             # Step 1: Extract scene classes from all_scenes.py in order
             scene_classes = self.extract_scene_classes()
             
-            # Step 2: Render scenes sequentially
-            render_results = self.render_scenes_sequentially(scene_classes, self.current_quality)
+            # Step 2: Render scenes (in parallel unless a single job was requested)
+            if self.jobs > 1 and len(scene_classes) > 1:
+                render_results = self.render_scenes_in_parallel(scene_classes, self.current_quality, self.jobs)
+            else:
+                render_results = self.render_scenes_sequentially(scene_classes, self.current_quality)
             
             # Step 3: Check if all scenes rendered successfully
             print(f"\n📹 Checking render results...")
@@ -482,22 +846,28 @@ class SceneRenderer:
                 print("❌ No videos were successfully rendered. Stopping execution.")
                 return False
             
-            # Step 4: Concatenate videos (try MoviePy first, fallback to ffmpeg)
+            # Step 4: Concatenate videos with synchronized audio (ffmpeg filter graph or MoviePy),
+            # falling back to a plain ffmpeg stream copy without audio sync
             print(f"\n🎬 Concatenating {len(rendered_videos)} videos...")
-            print("🎵 Attempting MoviePy with audio synchronization...")
             print("-" * 40)
             
-            # Try MoviePy first for audio synchronization
-            if MOVIEPY_AVAILABLE:
-                if self.concatenate_videos_with_moviepy(scene_classes, rendered_videos):
-                    print("✅ MoviePy concatenation successful!")
-                else:
-                    print("⚠️  MoviePy failed, trying ffmpeg fallback...")
-                    if not self.concatenate_videos_with_ffmpeg(rendered_videos):
-                        print("❌ Both MoviePy and ffmpeg failed to concatenate videos.")
-                        return False
+            if self.concat_engine == "ffmpeg":
+                print("🎵 Using the ffmpeg filter graph with audio synchronization...")
+                synced = self.concatenate_videos_with_ffmpeg_filter(scene_classes, rendered_videos)
+                engine_name = "ffmpeg filter graph"
+            elif MOVIEPY_AVAILABLE:
+                print("🎵 Attempting MoviePy with audio synchronization...")
+                synced = self.concatenate_videos_with_moviepy(scene_classes, rendered_videos)
+                engine_name = "MoviePy"
             else:
                 print("⚠️  MoviePy not available, using ffmpeg...")
+                synced = False
+                engine_name = "MoviePy"
+            
+            if synced:
+                print(f"✅ {engine_name} concatenation successful!")
+            else:
+                print(f"⚠️  {engine_name} concatenation failed, trying ffmpeg stream copy fallback...")
                 if not self.concatenate_videos_with_ffmpeg(rendered_videos):
                     print("❌ Failed to concatenate videos with ffmpeg.")
                     return False
@@ -520,8 +890,8 @@ class SceneRenderer:
                 "qh": "1080p60 (High Quality)"
             }
             print(f"🎬 Individual scenes: -q{self.current_quality} ({quality_info.get(self.current_quality, 'Unknown Quality')})")
-            if MOVIEPY_AVAILABLE:
-                print(f"🎬 Final video: MoviePy concatenation with synchronized audio")
+            if synced:
+                print(f"🎬 Final video: {engine_name} concatenation with synchronized audio")
             else:
                 print(f"🎬 Final video: ffmpeg concatenation (no audio sync)")
             print("=" * 60)
@@ -532,6 +902,25 @@ class SceneRenderer:
             print(f"\n❌ Pipeline failed with error: {e}")
             return False
 
+def run_stage(context: RunContext, quality: str = "ql", jobs: Optional[int] = None,
+              concat_engine: str = "ffmpeg") -> StageResult:
+    """
+    Run Step 5 (rendering and concatenation) in the calling process.
+    
+    Args:
+        context (RunContext): Run whose all_scenes.py is rendered
+        quality (str): Manim quality flag (ql, qm or qh)
+        jobs (int): Number of scenes rendered in parallel (default: number of CPU cores)
+        concat_engine (str): "ffmpeg" (filter graph) or "moviepy" for the final concatenation
+        
+    Returns:
+        StageResult: Path of the final video
+    """
+    renderer = SceneRenderer(quality=quality, jobs=jobs, context=context, concat_engine=concat_engine)
+    if not renderer.run():
+        return StageResult.failure("Scene rendering or concatenation failed")
+    return StageResult(True, outputs={"final_video": str(renderer.output_video)})
+
 def main():
     """Main function."""
     import argparse
@@ -550,6 +939,8 @@ Examples:
   python render_and_concatenate_scenes.py
   python render_and_concatenate_scenes.py --quality qm
   python render_and_concatenate_scenes.py --quality qh
+  python render_and_concatenate_scenes.py --jobs 1   # render one scene at a time
+  python render_and_concatenate_scenes.py --concat-engine moviepy
         """
     )
     
@@ -560,12 +951,31 @@ Examples:
         help="Video quality (default: ql)"
     )
     
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of scenes to render in parallel (default: number of CPU cores)"
+    )
+    
+    parser.add_argument(
+        "--concat-engine",
+        choices=CONCAT_ENGINES,
+        default="ffmpeg",
+        help="Concatenate with a single ffmpeg filter graph (default) or with MoviePy"
+    )
+    
+    RunContext.add_argument(parser)
+    
     args = parser.parse_args()
     
-    renderer = SceneRenderer(quality=args.quality)
-    success = renderer.run()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    
+    result = run_stage(RunContext(args.run_dir), quality=args.quality, jobs=args.jobs,
+                       concat_engine=args.concat_engine)
     
-    if success:
+    if result.success:
         print("\n✅ All done! Check the final video file.")
         sys.exit(0)
     else:
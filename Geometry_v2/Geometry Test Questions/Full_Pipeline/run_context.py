@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Run Context
+Directory layout of a single pipeline run.
+
+Every stage reads its inputs and writes its outputs through a RunContext instead of
+fixed paths, so several pipelines can run side by side on one machine as long as
+each one uses its own run directory.
+
+The run directory is taken from (in order):
+1. The --run-dir command line option of each script
+2. The PIPELINE_RUN_DIR environment variable
+3. The directory containing the pipeline scripts (the original single-run layout)
+
+Shared, read-only resources (prompts, functions.py, symbols.pdf, .env) stay in the
+script directory.
+
+Each stage script also exposes run_stage(context, ...) which runs the stage inside the
+calling process and returns a StageResult, so the orchestrator can skip spawning a
+new interpreter per step (terminal_pipeline.py --in-process).
+"""
+
+import os
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+RUN_DIR_ENV = "PIPELINE_RUN_DIR"
+
+class RunContext:
+    """Input and output paths of one pipeline run."""
+
+    def __init__(self, run_dir: Optional[Union[str, Path]] = None, question_image: Optional[str] = None):
+        self.script_dir = SCRIPT_DIR
+        self.run_dir = Path(run_dir or os.environ.get(RUN_DIR_ENV) or SCRIPT_DIR).resolve()
+        self.question_image = str(Path(question_image).resolve()) if question_image else None
+
+        # Shared inputs
+        self.symbols_pdf = self.script_dir / "symbols.pdf"
+
+        # Step 1: solution steps
+        self.solution_dir = self.run_dir / "math_solution_pipeline"
+        self.solution_raw_file = self.solution_dir / "math_solution_raw.txt"
+        self.solution_standard_file = self.solution_dir / "math_solution_standard.json"
+        self.solution_verbose_file = self.solution_dir / "math_solution_verbose.json"
+
+        # Step 2: audio and timing
+        self.audio_timing_file = self.run_dir / "deconstruct_parallel_symbols.json"
+        self.geometric_timing_file = self.run_dir / "geometric_elements_with_timing.json"
+        self.audio_dir = self.run_dir / "Audio"
+        self.scene_audio_dir = self.run_dir / "Scene"
+        self.tts_cache_stats_file = self.run_dir / "tts_cache_stats.json"
+        self.tts_request_stats_file = self.run_dir / "tts_request_stats.json"
+        self.audio_manifest_file = self.run_dir / "audio_manifest.json"
+
+        # Step 3: geometric blueprint and figure
+        self.coordinates_file = self.run_dir / "coordinates.txt"
+        self.figure_file = self.run_dir / "figure.py"
+        # Structured coordinate model parsed from the blueprint (figure_builder.py)
+        self.coordinates_json_file = self.run_dir / "coordinates.json"
+
+        # Step 4: scene code
+        self.scenes_file = self.run_dir / "all_scenes.py"
+        self.scenes_metadata_file = self.run_dir / "all_scenes_metadata.json"
+        self.duration_check_file = self.run_dir / "scene_duration_check.json"
+
+        # Step 5: rendering
+        self.media_dir = self.run_dir / "media"
+        self.final_video = self.run_dir / "final_geometry_video.mp4"
+
+        # Orchestrator
+        self.checkpoint_dir = self.run_dir / "checkpoints"
+        self.token_report_file = self.run_dir / "pipeline_token_usage_report.json"
+        self.usage_log_file = self.run_dir / "usage_records.jsonl"
+
+    def create_dirs(self):
+        """Create the run directory and its output subdirectories."""
+        for directory in (self.run_dir, self.solution_dir, self.audio_dir, self.scene_audio_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def subprocess_env(self) -> Dict[str, str]:
+        """
+        Environment for child processes of this run: points them at the run directory
+        and lets generated code in the run directory import functions.py.
+        """
+        env = os.environ.copy()
+        env[RUN_DIR_ENV] = str(self.run_dir)
+        python_path = env.get("PYTHONPATH")
+        env["PYTHONPATH"] = str(self.script_dir) + (os.pathsep + python_path if python_path else "")
+        return env
+
+    @staticmethod
+    def add_argument(parser: argparse.ArgumentParser):
+        """Add the --run-dir option shared by all pipeline scripts."""
+        parser.add_argument(
+            "--run-dir",
+            help=f"Directory for this run's inputs and outputs (default: ${RUN_DIR_ENV} or the script directory)"
+        )
+
+class StageResult:
+    """Outcome of one pipeline stage run through its run_stage() function."""
+
+    def __init__(self, success: bool, outputs: Optional[Dict[str, str]] = None,
+                 data: Optional[Dict[str, Any]] = None,
+                 token_usage: Optional[Dict[str, Dict[str, int]]] = None,
+                 error: Optional[str] = None):
+        """
+        Args:
+            success (bool): Whether the stage produced all of its outputs
+            outputs (dict): Output name -> path of the files written by the stage
+            data (dict): In-memory results of the stage (parsed JSON, generated code, ...)
+            token_usage (dict): Model key ("gemini"/"claude") -> prompt/completion/total tokens
+            error (str): Error message if the stage failed
+        """
+        self.success = success
+        self.outputs = outputs or {}
+        self.data = data or {}
+        self.token_usage = token_usage or {}
+        self.error = error
+
+    @classmethod
+    def failure(cls, error: str) -> "StageResult":
+        """Build the result of a failed stage."""
+        return cls(False, error=error)
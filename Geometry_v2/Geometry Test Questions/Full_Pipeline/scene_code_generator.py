@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Scene Code Generator
+Writes all_scenes.py from geometric_elements_with_timing.json and the coordinate model
+(coordinates.json), without an LLM call.
+
+The scene code video_claude.py asks the LLM for follows a fixed pattern
+(ENHANCED_CODE_GENERATION_PROMPT_v4): one create_complete_diagram_<subpart>() function per
+subpart holding every element invisible, and one Scene class per solution step that
+auto-scales the diagram, adds the step's scene audio, shows the starting diagram and then,
+sentence by sentence, adds the Khan Academy text, reveals the sentence's geometric elements,
+indicates them and waits out the rest of the sentence's audio. This module fills in that
+pattern directly:
+
+- draw / draw_and_label: the element (and its label) is revealed with Create
+- highlight / highlight_and_label: the element (and its label) is revealed if needed, then indicated
+- measurement_label: the element's label is revealed
+
+Waits are computed here from the sentence timings (the time from a sentence's start to the
+next sentence's start, the last one ending with the scene audio), so every scene lasts as long
+as its audio. Once a step's explanation texts fill the right-hand column, add_explanation_text
+also scrolls older texts out; that time is taken from scene_duration_checker.ExplanationColumn,
+whose text heights are estimates, so such a scene matches its audio only approximately.
+
+Element ids are matched to the diagram elements built by figure_builder.py; a step that
+refers to an element the coordinate model does not have, or to an unknown animation type,
+raises SceneTemplateError and video_claude.py falls back to the LLM (see --codegen).
+
+Usage: python scene_code_generator.py [--run-dir DIR]
+"""
+
+import re
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from run_context import RunContext
+from add_geometric_elements import ProblemListError
+from scene_duration_checker import ExplanationColumn
+from figure_builder import build_element_code, element_identifier, indent_lines, is_3d_subpart, visible_opacity
+
+# Animation standards of ENHANCED_CODE_GENERATION_PROMPT_v4
+CREATE_SECONDS = 1.0
+INDICATE_SECONDS = 0.5
+INDICATE_INTERVAL_SECONDS = 2.5
+INDICATE_COLOR = "#FFFF00"
+MIN_WAIT_SECONDS = 0.1
+
+DRAW_TYPES = ("draw", "draw_and_label")
+HIGHLIGHT_TYPES = ("highlight", "highlight_and_label")
+LABEL_TYPES = ("draw_and_label", "highlight_and_label", "measurement_label")
+ANIMATION_TYPES = DRAW_TYPES + HIGHLIGHT_TYPES + ("measurement_label",)
+
+class SceneTemplateError(ProblemListError):
+    """Raised when the timing data asks for something the scene template cannot express."""
+
+    description = "unsupported scene elements"
+
+def scene_class_name(step_id: str) -> str:
+    """part_A_setup -> PartASetupScene (render_and_concatenate_scenes.py maps it back to the scene audio)."""
+    words = [word for word in re.split(r"[^A-Za-z0-9]+", step_id) if word]
+    name = "".join(word[0].upper() + word[1:] for word in words) or "Step"
+    if name[0].isdigit():
+        name = f"Step{name}"
+    return name if name.endswith("Scene") else f"{name}Scene"
+
+def tex_literal(tex: str) -> str:
+    """Python literal for LaTeX source: a raw string where possible."""
+    if '"' in tex or tex.endswith("\\") or "\n" in tex:
+        return repr(tex)
+    return f'r"{tex}"'
+
+def explanation_code(khan_academy_text: str) -> Optional[str]:
+    """Mobject for a sentence's Khan Academy text: MathTex for a single $...$ formula, Tex otherwise."""
+    text = khan_academy_text.strip()
+    if not text:
+        return None
+    formula = re.fullmatch(r"\$([^$]+)\$", text)
+    if formula:
+        return f"MathTex({tex_literal(formula.group(1).strip())})"
+    return f"Tex({tex_literal(text)})"
+
+def subpart_for_step(step_id: str, subpart_ids: List[str], previous: Optional[str]) -> str:
+    """
+    Diagram of a step: the subpart named in its step_id (part_A_setup, solving_part_b, find_angle_a),
+    else the previous step's, else the first.
+    """
+    for word in re.split(r"[^A-Za-z0-9]+", step_id.lower()):
+        if word in subpart_ids and len(word) <= 2:
+            return word
+    return previous if previous in subpart_ids else subpart_ids[0]
+
+def resolve_element(element_id: str, elements: Dict[str, str]) -> Optional[str]:
+    """
+    Diagram element for an element id of the solution, also matching
+    line_QP to line_PQ, angle_RPQ to angle_QPR, region_..._interior to region_...
+    and any circle id to the only circle of the diagram.
+    """
+    if element_id in elements:
+        return element_id
+    if element_id.endswith("_label"):
+        base = element_id[:-len("_label")]
+        for suffix in ("_measurement", "_value"):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        resolved = resolve_element(base, elements)
+        return f"{resolved}_label" if resolved and f"{resolved}_label" in elements else None
+
+    prefix, _, name = element_id.partition("_")
+    if prefix in ("line", "segment") and len(name) == 2:
+        for candidate in (f"line_{name}", f"line_{name[::-1]}"):
+            if candidate in elements:
+                return candidate
+    if prefix == "angle" and len(name) == 3:
+        candidate = f"angle_{name[::-1]}"
+        if candidate in elements:
+            return candidate
+    if prefix == "region":
+        key = element_id.lower()
+        matches = [e for e in elements if elements[e] == "region" and (key.startswith(e.lower()) or e.lower().startswith(key))]
+        if len(matches) == 1:
+            return matches[0]
+    if prefix == "circle":
+        circles = [e for e in elements if elements[e] == "circle"]
+        if len(circles) == 1:
+            return circles[0]
+    return None
+
+def build_diagram_function(subpart: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+    """
+    create_complete_diagram_<subpart>() source and the kind of each element it returns.
+
+    Returns:
+        tuple: (function source, {element_id: kind})
+    """
+    built = build_element_code(subpart)
+    indent = " " * 4
+    element_ids = [element_id for element_id, _ in built["elements"]]
+    code = [f"def create_complete_diagram_{element_identifier(subpart['id'])}():"]
+    code += indent_lines(built["statements"], indent)
+    code += [
+        "",
+        f"{indent}complete_figure = VGroup(",
+        ",\n".join(f"{indent}    {element_id}" for element_id in element_ids),
+        f"{indent})",
+        f"{indent}complete_figure.set_opacity(0)",
+        "",
+        f"{indent}return {{",
+        f"{indent}    \"complete_figure\": complete_figure,",
+        f"{indent}    \"is_3d\": {built['is_3d']},",
+        f"{indent}    \"elements\": {{",
+        ",\n".join(f"{indent}        \"{element_id}\": {element_id}" for element_id in element_ids),
+        f"{indent}    }}",
+        f"{indent}}}"
+    ]
+    return "\n".join(code), dict(built["elements"])
+
+def sentence_slots(step: Dict[str, Any]) -> List[float]:
+    """
+    Seconds of scene audio each sentence of a step covers: up to the next sentence's start,
+    the last one up to the end of the scene audio (or its own duration without timings).
+    """
+    sentences = step["sentences"]
+    slots = []
+    for i, sentence in enumerate(sentences):
+        duration = float(sentence.get("duration_seconds") or 0.0)
+        start = sentence.get("start_time_seconds")
+        if i + 1 < len(sentences):
+            end = sentences[i + 1].get("start_time_seconds")
+        else:
+            end = step.get("duration_scene_seconds")
+        slot = float(end) - float(start) if start is not None and end is not None else duration
+        slots.append(round(slot if slot > 0 else duration, 2))
+    return slots
+
+def indicate_plan(seconds_left: float, has_targets: bool) -> Tuple[int, float]:
+    """
+    Number of Indicate() calls (one every INDICATE_INTERVAL_SECONDS) that fit into the time
+    left in a sentence, and the final wait.
+    """
+    count = int(seconds_left / INDICATE_INTERVAL_SECONDS) if has_targets else 0
+    while count > 0:
+        final_wait = seconds_left - count * INDICATE_SECONDS - (count - 1) * (INDICATE_INTERVAL_SECONDS - INDICATE_SECONDS)
+        if final_wait >= MIN_WAIT_SECONDS:
+            return count, round(final_wait, 2)
+        count -= 1
+    return 0, round(max(MIN_WAIT_SECONDS, seconds_left), 2)
+
+def build_scene_class(step: Dict[str, Any], diagram_id: str, elements: Dict[str, str],
+                      is_3d: bool, audio_path: str, problems: List[str]) -> str:
+    """Scene class of one solution step; element ids the diagram does not have are added to problems."""
+    step_id = step["step_id"]
+    indent = " " * 8
+    visible = set()
+    explanation_column = ExplanationColumn()
+
+    def resolve(element_id: str) -> Optional[str]:
+        resolved = resolve_element(element_id, elements)
+        if resolved is None:
+            problems.append(f"step '{step_id}': no diagram element for '{element_id}'")
+        return resolved
+
+    def ref(element_id: str) -> str:
+        return f"elements[\"{element_id}\"]"
+
+    code = [
+        f"class {scene_class_name(step_id)}({'ThreeDScene' if is_3d else 'Scene'}):",
+        "    def construct(self):",
+        f"{indent}self.camera.background_color = \"#0C0C0C\"",
+        "",
+        f"{indent}complete_diagram = create_complete_diagram_{element_identifier(diagram_id)}()",
+        f"{indent}complete_figure = complete_diagram[\"complete_figure\"]",
+        f"{indent}elements = complete_diagram[\"elements\"]",
+        "",
+        f"{indent}auto_scale_to_left_screen(complete_figure, is_3d={is_3d})",
+        f"{indent}self.add(complete_figure)",
+        "",
+        f"{indent}try:",
+        f"{indent}    self.add_sound({audio_path!r})",
+        f"{indent}except Exception as e:",
+        f"{indent}    print(f\"Warning: Could not add audio file: {{e}}\")"
+    ]
+
+    starting = [resolve(element_id) for element_id in step.get("starting_diagram", [])]
+    starting = [element_id for element_id in starting if element_id]
+    if starting:
+        code += ["", f"{indent}# Starting diagram"]
+        for element_id in starting:
+            code.append(f"{indent}{ref(element_id)}.set_opacity({visible_opacity(elements[element_id])})")
+            visible.add(element_id)
+
+    for number, (sentence, slot) in enumerate(zip(step["sentences"], sentence_slots(step)), 1):
+        spoken = sentence.get("text", "").replace("\n", " ")
+        code += ["", f"{indent}# Sentence {number} ({slot:g} s): {spoken[:90]}{'...' if len(spoken) > 90 else ''}"]
+        seconds_left = slot
+
+        explanation = explanation_code(sentence.get("khan_academy_text") or "")
+        if explanation:
+            code.append(f"{indent}add_explanation_text(self, {explanation})")
+            seconds_left -= explanation_column.add()[0]
+
+        reveal, targets = [], []
+        for element in sentence.get("geometric_elements", []):
+            if not element or not element.get("element_id"):
+                continue
+            animation = element.get("animation_type") or "draw"
+            if animation not in ANIMATION_TYPES:
+                problems.append(f"step '{step_id}': unsupported animation type '{animation}' for '{element['element_id']}'")
+                continue
+            element_id = resolve(element["element_id"])
+            if element_id is None:
+                continue
+            shown = [] if animation == "measurement_label" and not element_id.endswith("_label") else [element_id]
+            label_id = f"{element_id}_label"
+            if animation in LABEL_TYPES and label_id in elements:
+                shown.append(label_id)
+            reveal += [e for e in shown if e not in visible and e not in reveal]
+            if animation in HIGHLIGHT_TYPES and element_id not in targets:
+                targets.append(element_id)
+
+        if reveal:
+            for element_id in reveal:
+                code.append(f"{indent}{ref(element_id)}.set_opacity({visible_opacity(elements[element_id])})")
+            visible.update(reveal)
+            code.append(f"{indent}self.play({', '.join(f'Create({ref(e)})' for e in reveal)})")
+            seconds_left -= CREATE_SECONDS
+
+        count, final_wait = indicate_plan(seconds_left, bool(targets))
+        if count:
+            indicates = ", ".join(f"Indicate({ref(e)}, color=\"{INDICATE_COLOR}\")" for e in targets)
+            code += [
+                f"{indent}for i in range({count}):",
+                f"{indent}    if i > 0:",
+                f"{indent}        self.wait({INDICATE_INTERVAL_SECONDS - INDICATE_SECONDS:g})",
+                f"{indent}    self.play({indicates}, run_time={INDICATE_SECONDS:g})"
+            ]
+        code.append(f"{indent}self.wait({final_wait:g})")
+    return "\n".join(code)
+
+def generate_scenes_code(timing_data: dict, coordinate_model: dict, scene_audio_dir=None) -> Dict[str, Any]:
+    """
+    all_scenes.py source for every solution step of the timing data.
+
+    Args:
+        timing_data: geometric_elements_with_timing.json content
+        coordinate_model: coordinates.json content (figure_builder.parse_blueprint)
+        scene_audio_dir: Directory of the <step_id>_scene.mp3 files, for steps without audio_file_scene
+
+    Returns:
+        dict: {"scenes_code": source, "scenes": [scene class names]}
+
+    Raises:
+        SceneTemplateError: If a step needs an element or animation the template cannot produce
+    """
+    subparts = {subpart["id"]: subpart for subpart in coordinate_model.get("subparts", [])}
+    steps = timing_data.get("solution_steps", [])
+    if not subparts or not steps:
+        raise SceneTemplateError(["no subparts in the coordinate model" if not subparts else "no solution steps"])
+
+    diagrams = {}
+    scenes, scene_names, problems = [], [], []
+    previous = None
+    for step in steps:
+        diagram_id = subpart_for_step(step["step_id"], list(subparts), previous)
+        previous = diagram_id
+        if diagram_id not in diagrams:
+            diagrams[diagram_id] = build_diagram_function(subparts[diagram_id])
+        audio_path = step.get("audio_file_scene") or (
+            str(scene_audio_dir / f"{step['step_id']}_scene.mp3") if scene_audio_dir else f"{step['step_id']}_scene.mp3")
+        scenes.append(build_scene_class(step, diagram_id, diagrams[diagram_id][1],
+                                        is_3d_subpart(subparts[diagram_id]), audio_path, problems))
+        scene_names.append(scene_class_name(step["step_id"]))
+
+    if problems:
+        raise SceneTemplateError(problems)
+
+    header = [
+        "#!/usr/bin/env python3",
+        "# Generated by scene_code_generator.py from geometric_elements_with_timing.json and coordinates.json",
+        "",
+        "import sys",
+        "import os",
+        "from manim import *",
+        "import numpy as np",
+        "",
+        "sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))",
+        "from functions import *",
+        ""
+    ]
+    body = [source for source, _ in diagrams.values()] + scenes
+    return {"scenes_code": "\n".join(header) + "\n" + "\n\n".join(body) + "\n", "scenes": scene_names}
+
+def write_scenes_file(context: RunContext, timing_data: Optional[dict] = None,
+                      coordinate_model: Optional[dict] = None) -> Dict[str, Any]:
+    """
+    Generate all_scenes.py (and all_scenes_metadata.json) in the run directory.
+    Inputs not passed in are read from the run directory.
+
+    Returns:
+        dict: {"scenes_code": source, "scenes": [scene class names], "output_file": path, "metadata": dict}
+
+    Raises:
+        SceneTemplateError: If the template cannot express the timing data
+        OSError, json.JSONDecodeError: If an input file cannot be read or the output cannot be written
+    """
+    start_time = time.time()
+    if timing_data is None:
+        with open(context.geometric_timing_file, "r", encoding="utf-8") as f:
+            timing_data = json.load(f)
+    if coordinate_model is None:
+        with open(context.coordinates_json_file, "r", encoding="utf-8") as f:
+            coordinate_model = json.load(f)
+
+    result = generate_scenes_code(timing_data, coordinate_model, context.scene_audio_dir)
+    compile(result["scenes_code"], str(context.scenes_file), "exec")
+    with open(context.scenes_file, "w", encoding="utf-8") as f:
+        f.write(result["scenes_code"])
+
+    metadata = {
+        "generator": "scene_code_generator",
+        "duration": time.time() - start_time,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "response_length": len(result["scenes_code"]),
+        "scenes": result["scenes"]
+    }
+    with open(context.scenes_metadata_file, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+    result["output_file"] = str(context.scenes_file)
+    result["metadata"] = metadata
+    return result
+
+def main():
+    """Generate all_scenes.py of a run from the command line."""
+    parser = argparse.ArgumentParser(description="Generate all_scenes.py from the timing data and coordinate model without an LLM call")
+    RunContext.add_argument(parser)
+
+    args = parser.parse_args()
+
+    context = RunContext(args.run_dir)
+    try:
+        result = write_scenes_file(context)
+    except SceneTemplateError as e:
+        print(f"❌ The scene template cannot express this solution ({len(e.problems)} problems):")
+        for problem in e.problems:
+            print(f"   • {problem}")
+        raise SystemExit(1)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error generating scene code: {e}")
+        raise SystemExit(1)
+
+    print(f"✅ {len(result['scenes'])} scenes saved to: {result['output_file']}")
+    for scene in result["scenes"]:
+        print(f"   • {scene}")
+
+if __name__ == "__main__":
+    main()
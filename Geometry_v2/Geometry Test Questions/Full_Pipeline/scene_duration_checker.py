@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+Scene Duration Checker
+Estimates the length of every scene in the generated all_scenes.py without rendering it.
+
+The checker walks the AST of each scene's construct() method and adds up:
+- self.play(...): its run_time, or Manim's default of 1 second
+- self.wait(...): its duration, or Manim's default of 1 second
+- add_explanation_text(self, ...): 0.5 seconds (the Write animation in functions.py), plus
+  0.3 seconds per older text it fades out and 0.4 seconds to move the rest up once the
+  right-hand column is full
+- clear_explanation_text(self, animation_time=0.5): animation_time, if any text is shown
+- scrolling_subtitle(self, text, total_duration): total_duration
+- helper methods of the scene and module functions called with the scene
+
+Simple numeric locals (num_indicates = int(8.12 / 2.5), ...) are evaluated, for loops
+over range() are unrolled and if statements are followed when their condition can be
+evaluated. Anything else is estimated conservatively and flagged as approximate.
+
+The column of explanation texts is followed through the scene with an assumed height per
+text (one line at the text's font size); the real heights are only known once Manim lays
+the texts out, so a scene whose column overflows is flagged as approximate.
+
+Each estimate is compared against the duration of the scene's audio: the scene MP3 in
+the run's Scene/ directory, measured from its frame headers (mp3_probe.py), or else
+duration_scene_seconds from geometric_elements_with_timing.json. render_and_concatenate_scenes.py can only speed a
+scene up or slow it down by MIN_SPEED_FACTOR..MAX_SPEED_FACTOR to match its audio, so a
+scene outside that range would fail after the whole render; the orchestrator checks the
+scene code right after generating it and regenerates it instead.
+
+Usage: python scene_duration_checker.py [--run-dir DIR] [--scenes-file all_scenes.py]
+"""
+
+import ast
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from run_context import RunContext
+from mp3_probe import mp3_duration_seconds
+
+# Playback speed range the renderer accepts when matching a scene video to its audio
+MIN_SPEED_FACTOR = 0.75
+MAX_SPEED_FACTOR = 1.5
+
+# Manim defaults
+DEFAULT_PLAY_SECONDS = 1.0
+DEFAULT_WAIT_SECONDS = 1.0
+
+# Built-in timings of the helpers in functions.py: name -> (seconds, timing parameter, position)
+HELPER_TIMINGS = {
+    "add_explanation_text": (0.5, None, None),
+    "clear_explanation_text": (0.5, "animation_time", 1),
+    "scrolling_subtitle": (0.0, "total_duration", 2)
+}
+
+# Right-hand explanation column of add_explanation_text: usable height, spacing, and the
+# assumed height of one text at the default font size
+EXPLANATION_COLUMN_HEIGHT = 7.0 - 2 * 0.2
+EXPLANATION_LINE_SPACING = 0.4
+EXPLANATION_TEXT_HEIGHT = 0.45
+EXPLANATION_FONT_SIZE = 36
+# Overflow animations of add_explanation_text: FadeOut per removed text, then moving the rest up
+EXPLANATION_REMOVE_SECONDS = 0.3
+EXPLANATION_REPOSITION_SECONDS = 0.4
+
+SCENE_BASES = {"Scene", "ThreeDScene"}
+MAX_LOOP_ITERATIONS = 1000
+MAX_CALL_DEPTH = 10
+
+SAFE_FUNCTIONS = {"int": int, "float": float, "max": max, "min": min, "abs": abs, "round": round}
+
+class ExplanationColumn:
+    """
+    The right-hand column of add_explanation_text in functions.py, with an assumed height per
+    text; scene_code_generator.py times its template scenes with the same model.
+    """
+
+    def __init__(self):
+        # Assumed heights of the texts shown, oldest first
+        self.heights = []
+
+    def _height_with(self, height: float) -> float:
+        heights = self.heights + [height]
+        return sum(heights) + EXPLANATION_LINE_SPACING * (len(heights) - 1)
+
+    def add(self, font_size: float = EXPLANATION_FONT_SIZE) -> Tuple[float, int]:
+        """
+        Add a text like add_explanation_text does.
+
+        Returns:
+            tuple: (seconds of its animations, number of older texts faded out to make room)
+        """
+        height = EXPLANATION_TEXT_HEIGHT * font_size / EXPLANATION_FONT_SIZE
+        seconds = HELPER_TIMINGS["add_explanation_text"][0]
+        removed = 0
+        # Like will_text_fit: drop the oldest texts until the new one fits below the rest
+        while self.heights and self._height_with(height) > EXPLANATION_COLUMN_HEIGHT:
+            self.heights.pop(0)
+            removed += 1
+        if removed:
+            seconds += removed * EXPLANATION_REMOVE_SECONDS
+            if self.heights:
+                seconds += EXPLANATION_REPOSITION_SECONDS
+        self.heights.append(height)
+        return seconds, removed
+
+    def clear(self) -> bool:
+        """Clear the column like clear_explanation_text; False if nothing was shown (no animation)."""
+        shown = bool(self.heights)
+        self.heights = []
+        return shown
+
+class UnknownValue(Exception):
+    """Raised when an expression cannot be evaluated statically."""
+
+class SceneDurationEstimator:
+    """Static duration estimate of the scenes of a Manim scenes file."""
+
+    def __init__(self, source: str):
+        self.tree = ast.parse(source)
+        self.functions = {}
+        self.classes = {}
+        for node in self.tree.body:
+            if isinstance(node, ast.FunctionDef):
+                self.functions[node.name] = node
+            elif isinstance(node, ast.ClassDef):
+                self.classes[node.name] = node
+        self.notes = []
+        self.explanation_column = ExplanationColumn()
+
+    def scene_classes(self) -> List[str]:
+        """
+        Names of the scene classes in file order, selected like the renderer does:
+        classes named *Scene that derive from Scene or ThreeDScene.
+        """
+        scenes = []
+        for name, node in self.classes.items():
+            if name.endswith("Scene") and self.find_method(name, "construct") is not None and any(
+                    isinstance(base, ast.Name) and base.id in SCENE_BASES for base in node.bases):
+                scenes.append(name)
+        return scenes
+
+    def find_method(self, class_name: str, method_name: str) -> Optional[ast.FunctionDef]:
+        """Find a method on a class or its base classes defined in the same file."""
+        node = self.classes.get(class_name)
+        if node is None:
+            return None
+        for item in node.body:
+            if isinstance(item, ast.FunctionDef) and item.name == method_name:
+                return item
+        for base in node.bases:
+            if isinstance(base, ast.Name) and base.id in self.classes:
+                method = self.find_method(base.id, method_name)
+                if method is not None:
+                    return method
+        return None
+
+    def estimate(self, scene_name: str) -> Dict[str, Any]:
+        """
+        Estimate the duration of one scene.
+
+        Returns:
+            dict: {"seconds": float, "approximate": bool, "notes": list of str}
+        """
+        self.notes = []
+        self.explanation_column = ExplanationColumn()
+        construct = self.find_method(scene_name, "construct")
+        seconds = self.run_block(construct.body, {}, scene_name, "self", 0)
+        return {
+            "seconds": round(seconds, 2),
+            "approximate": bool(self.notes),
+            "notes": sorted(set(self.notes))
+        }
+
+    def note(self, node: ast.AST, message: str):
+        self.notes.append(f"line {getattr(node, 'lineno', '?')}: {message}")
+
+    # Expression evaluation
+
+    def evaluate(self, node: ast.AST, env: Dict[str, Any]) -> Any:
+        """Evaluate a numeric expression built from constants and known locals."""
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+            return node.value
+        if isinstance(node, ast.Name) and node.id in env:
+            return env[node.id]
+        if isinstance(node, ast.BinOp):
+            left, right = self.evaluate(node.left, env), self.evaluate(node.right, env)
+            operators = {
+                ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b,
+                ast.Mult: lambda a, b: a * b, ast.Div: lambda a, b: a / b,
+                ast.FloorDiv: lambda a, b: a // b, ast.Mod: lambda a, b: a % b,
+                ast.Pow: lambda a, b: a ** b
+            }
+            operator = operators.get(type(node.op))
+            if operator is None:
+                raise UnknownValue()
+            try:
+                return operator(left, right)
+            except (ZeroDivisionError, OverflowError):
+                raise UnknownValue()
+        if isinstance(node, ast.UnaryOp):
+            operand = self.evaluate(node.operand, env)
+            if isinstance(node.op, ast.USub):
+                return -operand
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            if isinstance(node.op, ast.Not):
+                return not operand
+        if isinstance(node, ast.Compare) and len(node.ops) == 1:
+            left, right = self.evaluate(node.left, env), self.evaluate(node.comparators[0], env)
+            comparisons = {
+                ast.Gt: lambda a, b: a > b, ast.GtE: lambda a, b: a >= b,
+                ast.Lt: lambda a, b: a < b, ast.LtE: lambda a, b: a <= b,
+                ast.Eq: lambda a, b: a == b, ast.NotEq: lambda a, b: a != b
+            }
+            comparison = comparisons.get(type(node.ops[0]))
+            if comparison is not None:
+                return comparison(left, right)
+        if isinstance(node, ast.BoolOp):
+            values = [self.evaluate(value, env) for value in node.values]
+            return all(values) if isinstance(node.op, ast.And) else any(values)
+        if isinstance(node, ast.IfExp):
+            return self.evaluate(node.body if self.evaluate(node.test, env) else node.orelse, env)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in SAFE_FUNCTIONS \
+                and not node.keywords:
+            args = [self.evaluate(arg, env) for arg in node.args]
+            try:
+                return SAFE_FUNCTIONS[node.func.id](*args)
+            except (TypeError, ValueError):
+                raise UnknownValue()
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "len" \
+                and len(node.args) == 1 and isinstance(node.args[0], (ast.List, ast.Tuple)):
+            return len(node.args[0].elts)
+        raise UnknownValue()
+
+    def evaluate_or(self, node: Optional[ast.AST], env: Dict[str, Any], default: float, message: str) -> float:
+        """Evaluate a duration, falling back to a default (and a note) if it is not static."""
+        if node is None:
+            return default
+        try:
+            value = float(self.evaluate(node, env))
+        except (UnknownValue, TypeError, ValueError):
+            self.note(node, message)
+            return default
+        return max(0.0, value)
+
+    # Statements
+
+    def run_block(self, statements: List[ast.stmt], env: Dict[str, Any], class_name: Optional[str],
+                  scene_var: str, depth: int) -> float:
+        """Total duration of a block of statements, updating the known locals in env."""
+        seconds = 0.0
+        for statement in statements:
+            seconds += self.run_statement(statement, env, class_name, scene_var, depth)
+            if isinstance(statement, ast.Return):
+                break
+        return seconds
+
+    def run_statement(self, node: ast.stmt, env: Dict[str, Any], class_name: Optional[str],
+                      scene_var: str, depth: int) -> float:
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            return self.call_seconds(node.value, env, class_name, scene_var, depth)
+
+        if isinstance(node, ast.Assign):
+            seconds = 0.0
+            if isinstance(node.value, ast.Call):
+                seconds = self.call_seconds(node.value, env, class_name, scene_var, depth)
+            for target in node.targets:
+                self.assign(target, node.value, env)
+            return seconds
+
+        if isinstance(node, ast.AnnAssign) and node.value is not None:
+            self.assign(node.target, node.value, env)
+            return 0.0
+
+        if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            updated = ast.BinOp(left=ast.Name(id=node.target.id, ctx=ast.Load()), op=node.op, right=node.value)
+            self.assign(node.target, updated, env)
+            return 0.0
+
+        if isinstance(node, ast.For):
+            return self.run_for(node, env, class_name, scene_var, depth)
+
+        if isinstance(node, ast.While):
+            self.note(node, "while loop counted once")
+            return self.run_block(node.body, env, class_name, scene_var, depth)
+
+        if isinstance(node, ast.If):
+            try:
+                branch = node.body if self.evaluate(node.test, env) else node.orelse
+                return self.run_block(branch, env, class_name, scene_var, depth)
+            except UnknownValue:
+                self.note(node, "condition not static, counted the longer branch")
+                body = self.run_block(node.body, dict(env), class_name, scene_var, depth)
+                orelse = self.run_block(node.orelse, dict(env), class_name, scene_var, depth)
+                return max(body, orelse)
+
+        if isinstance(node, (ast.With, ast.AsyncWith)):
+            return self.run_block(node.body, env, class_name, scene_var, depth)
+
+        if isinstance(node, ast.Try):
+            return (self.run_block(node.body, env, class_name, scene_var, depth)
+                    + self.run_block(node.orelse, env, class_name, scene_var, depth)
+                    + self.run_block(node.finalbody, env, class_name, scene_var, depth))
+
+        return 0.0
+
+    def assign(self, target: ast.AST, value: ast.AST, env: Dict[str, Any]):
+        """Track the value of a local if it can be evaluated, otherwise forget it."""
+        if isinstance(target, ast.Name):
+            try:
+                env[target.id] = self.evaluate(value, env)
+            except UnknownValue:
+                env.pop(target.id, None)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                if isinstance(element, ast.Name):
+                    env.pop(element.id, None)
+
+    def run_for(self, node: ast.For, env: Dict[str, Any], class_name: Optional[str],
+                scene_var: str, depth: int) -> float:
+        values = None
+        iterator = node.iter
+        if isinstance(iterator, ast.Call) and isinstance(iterator.func, ast.Name) and iterator.func.id == "range":
+            try:
+                args = [int(self.evaluate(arg, env)) for arg in iterator.args]
+                values = list(range(*args))
+            except (UnknownValue, TypeError, ValueError):
+                values = None
+        elif isinstance(iterator, (ast.List, ast.Tuple)):
+            values = []
+            for element in iterator.elts:
+                try:
+                    values.append(self.evaluate(element, env))
+                except UnknownValue:
+                    values.append(None)
+        elif isinstance(iterator, ast.Call) and isinstance(iterator.func, ast.Name) \
+                and iterator.func.id == "enumerate" and iterator.args \
+                and isinstance(iterator.args[0], (ast.List, ast.Tuple)):
+            values = [None] * len(iterator.args[0].elts)
+
+        if values is None:
+            self.note(node, "loop length not static, counted once")
+            values = [None]
+        if len(values) > MAX_LOOP_ITERATIONS:
+            self.note(node, f"loop limited to {MAX_LOOP_ITERATIONS} iterations")
+            values = values[:MAX_LOOP_ITERATIONS]
+
+        seconds = 0.0
+        for value in values:
+            if isinstance(node.target, ast.Name):
+                if value is None:
+                    env.pop(node.target.id, None)
+                else:
+                    env[node.target.id] = value
+            else:
+                self.assign(node.target, ast.Constant(value=None), env)
+            seconds += self.run_block(node.body, env, class_name, scene_var, depth)
+        seconds += self.run_block(node.orelse, env, class_name, scene_var, depth)
+        return seconds
+
+    # Calls
+
+    def call_seconds(self, call: ast.Call, env: Dict[str, Any], class_name: Optional[str],
+                     scene_var: str, depth: int) -> float:
+        func = call.func
+        keywords = {keyword.arg: keyword.value for keyword in call.keywords if keyword.arg}
+
+        # self.play(...), self.wait(...) and helper methods of the scene
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == scene_var:
+            if func.attr == "play":
+                return self.evaluate_or(keywords.get("run_time"), env, DEFAULT_PLAY_SECONDS,
+                                        "run_time not static, assumed the default")
+            if func.attr == "wait":
+                duration = call.args[0] if call.args else keywords.get("duration")
+                return self.evaluate_or(duration, env, DEFAULT_WAIT_SECONDS,
+                                        "wait duration not static, assumed the default")
+            method = self.find_method(class_name, func.attr) if class_name else None
+            if method is not None:
+                return self.enter(method, call, env, class_name, scene_var, depth, bound_self=True)
+            return 0.0
+
+        if not isinstance(func, ast.Name):
+            return 0.0
+
+        if func.id == "add_explanation_text" and self.passes_scene(call, scene_var):
+            return self.explanation_text_seconds(call, keywords, env)
+        if func.id == "clear_explanation_text" and self.passes_scene(call, scene_var):
+            if not self.explanation_column.clear():
+                # Nothing to fade out: the helper plays no animation
+                return 0.0
+
+        # Helpers from functions.py with built-in timings
+        if func.id in HELPER_TIMINGS and self.passes_scene(call, scene_var):
+            default, parameter, position = HELPER_TIMINGS[func.id]
+            if parameter is None:
+                return default
+            value = keywords.get(parameter)
+            if value is None and len(call.args) > position:
+                value = call.args[position]
+            return self.evaluate_or(value, env, default, f"{parameter} of {func.id} not static")
+
+        # Module-level functions that animate the scene passed to them
+        if func.id in self.functions and self.passes_scene(call, scene_var):
+            function = self.functions[func.id]
+            return self.enter(function, call, env, None, scene_var, depth, bound_self=False)
+
+        return 0.0
+
+    def explanation_text_seconds(self, call: ast.Call, keywords: Dict[str, ast.AST], env: Dict[str, Any]) -> float:
+        """
+        Duration of add_explanation_text: its Write animation, and when the new text does not
+        fit below the shown ones, the fade-out of the oldest texts and the move of the rest.
+        """
+        font_size = keywords.get("font_size", call.args[2] if len(call.args) > 2 else None)
+        seconds, removed = self.explanation_column.add(
+            self.evaluate_or(font_size, env, EXPLANATION_FONT_SIZE, "font_size of add_explanation_text not static"))
+        if removed:
+            self.note(call, f"explanation column full, assumed {removed} older text(s) scrolled out")
+        return seconds
+
+    @staticmethod
+    def passes_scene(call: ast.Call, scene_var: str) -> bool:
+        return bool(call.args) and isinstance(call.args[0], ast.Name) and call.args[0].id == scene_var
+
+    def enter(self, function: ast.FunctionDef, call: ast.Call, env: Dict[str, Any], class_name: Optional[str],
+              scene_var: str, depth: int, bound_self: bool) -> float:
+        """Duration of a call into a method or function defined in the scenes file."""
+        if depth >= MAX_CALL_DEPTH:
+            self.note(call, f"call depth limit reached in {function.name}")
+            return 0.0
+
+        parameters = [arg.arg for arg in function.args.args]
+        if not parameters:
+            return 0.0
+        inner_scene_var = parameters[0]
+        remaining = parameters[1:]
+        args = call.args if bound_self else call.args[1:]
+
+        # Bind defaults first, then the passed arguments that can be evaluated
+        local_env = {}
+        defaults = function.args.defaults
+        for name, default in zip(parameters[len(parameters) - len(defaults):], defaults):
+            try:
+                local_env[name] = self.evaluate(default, {})
+            except UnknownValue:
+                pass
+        bindings = list(zip(remaining, args)) + [(k.arg, k.value) for k in call.keywords if k.arg in remaining]
+        for name, value in bindings:
+            try:
+                local_env[name] = self.evaluate(value, env)
+            except UnknownValue:
+                local_env.pop(name, None)
+
+        return self.run_block(function.body, local_env, class_name, inner_scene_var, depth + 1)
+
+def normalize_name(name: str) -> str:
+    """PartASetupScene, part_A_setup and part_a_setup_scene all become 'partasetup'."""
+    name = name.replace("_", "").lower()
+    return name[:-len("scene")] if name.endswith("scene") else name
+
+def load_scene_timings(timing_file: str, audio_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Steps of geometric_elements_with_timing.json with their scene audio duration.
+    If audio_dir holds a step's scene MP3 (<step_id>_scene.mp3), its duration is measured
+    from the file's frame headers instead of taken from the JSON.
+    """
+    with open(timing_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    timings = []
+    for step in data.get("solution_steps", []):
+        timing = {"step_id": step.get("step_id"), "duration_seconds": step.get("duration_scene_seconds"),
+                  "audio_source": "timing"}
+        audio_path = Path(audio_dir) / f"{step.get('step_id')}_scene.mp3" if audio_dir else None
+        if audio_path and audio_path.exists():
+            duration = mp3_duration_seconds(audio_path)
+            if duration > 0:
+                timing.update({"duration_seconds": round(duration, 2), "audio_source": str(audio_path)})
+        timings.append(timing)
+    return timings
+
+def check_scene_durations(scenes_file: str, timing_file: str, audio_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Compare the estimated duration of every scene with its audio duration.
+
+    Args:
+        scenes_file (str): Generated Manim scenes file (all_scenes.py)
+        timing_file (str): geometric_elements_with_timing.json with duration_scene_seconds per step
+        audio_dir (str): Directory with the scene MP3s (Scene/), measured in place of the JSON durations
+
+    Returns:
+        dict: {"success": bool, "scenes": per-scene estimates, "failed_scenes": names, "error": str}
+    """
+    try:
+        with open(scenes_file, "r", encoding="utf-8") as f:
+            source = f.read()
+        timings = load_scene_timings(timing_file, audio_dir)
+    except (OSError, json.JSONDecodeError) as e:
+        return {"success": False, "scenes": [], "failed_scenes": [], "error": str(e)}
+    return check_scene_code_durations(source, timings)
+
+def check_scene_code_durations(source: str, timings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare the estimated duration of every scene of generated code with its audio duration,
+    before the code is written anywhere (video_claude.py checks candidate responses with it).
+
+    Args:
+        source (str): Code of a Manim scenes file
+        timings (list): Steps with their audio durations (load_scene_timings)
+
+    Returns:
+        dict: Same layout as check_scene_durations()
+    """
+    try:
+        estimator = SceneDurationEstimator(source)
+    except SyntaxError as e:
+        return {"success": False, "scenes": [], "failed_scenes": [], "error": str(e)}
+
+    scene_names = estimator.scene_classes()
+    timings_by_name = {normalize_name(t["step_id"] or ""): t for t in timings}
+
+    scenes = []
+    for index, scene_name in enumerate(scene_names):
+        timing = timings_by_name.get(normalize_name(scene_name))
+        if timing is None and len(scene_names) == len(timings):
+            # Fall back to file order when the class names do not follow the step ids
+            timing = timings[index]
+
+        estimate = estimator.estimate(scene_name)
+        result = {
+            "scene": scene_name,
+            "step_id": timing["step_id"] if timing else None,
+            "estimated_seconds": estimate["seconds"],
+            "audio_seconds": timing["duration_seconds"] if timing else None,
+            "audio_source": timing["audio_source"] if timing else None,
+            "speed_factor": None,
+            "ok": True,
+            "approximate": estimate["approximate"],
+            "notes": estimate["notes"]
+        }
+        if timing and timing["duration_seconds"]:
+            speed_factor = estimate["seconds"] / timing["duration_seconds"]
+            result["speed_factor"] = round(speed_factor, 3)
+            result["ok"] = MIN_SPEED_FACTOR <= speed_factor <= MAX_SPEED_FACTOR
+        scenes.append(result)
+
+    failed = [scene["scene"] for scene in scenes if not scene["ok"]]
+    return {
+        "success": bool(scenes) and not failed,
+        "scenes": scenes,
+        "failed_scenes": failed,
+        "error": None if scenes else "No scene classes found"
+    }
+
+def print_report(report: Dict[str, Any]):
+    """Print one line per scene with its estimate and speed factor."""
+    if report["error"]:
+        print(f"❌ Duration check failed: {report['error']}")
+        return
+    for scene in report["scenes"]:
+        status = "✅" if scene["ok"] else "❌"
+        approximate = " (approximate)" if scene["approximate"] else ""
+        if scene["speed_factor"] is None:
+            print(f"   ⚠️  {scene['scene']}: ~{scene['estimated_seconds']:.2f}s, no audio duration to compare")
+        else:
+            print(f"   {status} {scene['scene']}: ~{scene['estimated_seconds']:.2f}s video vs "
+                  f"{scene['audio_seconds']:.2f}s audio (speed {scene['speed_factor']:.3f}x){approximate}")
+    if report["failed_scenes"]:
+        print(f"❌ {len(report['failed_scenes'])} scenes need a speed change outside "
+              f"{MIN_SPEED_FACTOR}x-{MAX_SPEED_FACTOR}x")
+
+def main():
+    """Check the generated scenes of a run from the command line."""
+    parser = argparse.ArgumentParser(description="Estimate scene durations of all_scenes.py without rendering")
+    parser.add_argument("--scenes-file", help="Scenes file to check (default: all_scenes.py in the run directory)")
+    parser.add_argument("--timing-file", help="Timing JSON (default: geometric_elements_with_timing.json in the run directory)")
+    parser.add_argument("--audio-dir", help="Scene audio directory (default: Scene/ in the run directory)")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    RunContext.add_argument(parser)
+
+    args = parser.parse_args()
+
+    context = RunContext(args.run_dir)
+    report = check_scene_durations(
+        args.scenes_file or str(context.scenes_file),
+        args.timing_file or str(context.geometric_timing_file),
+        args.audio_dir or str(context.scene_audio_dir)
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    sys.exit(0 if report["success"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Stream Extractors
+Consume a streamed chat completion token by token and hand out its complete parts as soon
+as they close, so downstream work starts before the generation ends (--stream).
+
+- read_sse_completion() / read_openai_completion(): read a streamed response (raw
+  OpenRouter server-sent events from requests, or an OpenAI client stream), pass every
+  text delta to a callback and return the full text with its token usage and time to
+  first token
+- PythonBlockExtractor: yields each top-level class or function of generated Python code
+  once the next top-level statement begins (video_claude.py: syntax check and LaTeX
+  warm-up of finished scene classes)
+- JsonStepExtractor: yields each item of a "solution_steps" array once its closing brace
+  arrives (generate_solution_steps.py: TTS prefetch of finished steps)
+- JsonDocumentExtractor: yields each top-level JSON object, fenced or bare, with the
+  unescaped LaTeX backslashes of its string literals repaired (generate_solution_steps.py:
+  the parse of the complete response, and of every streamed step via parse_json_document)
+
+Apart from JsonDocumentExtractor, the extractors never replace the final parse of the
+complete response: they only let work on finished parts overlap with the rest of the generation.
+"""
+
+import io
+import json
+import re
+import time
+import tokenize
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+class StreamError(RuntimeError):
+    """
+    Raised when a streamed completion reports an error instead of (more) tokens. The partial
+    completion (text and time to first token so far) is kept for the caller's usage record.
+    """
+
+    def __init__(self, message: str, completion: Optional["StreamedCompletion"] = None):
+        super().__init__(message)
+        self.completion = completion
+
+class StreamCancelled(Exception):
+    """Raised by an on_text callback to stop reading a stream; the connection is closed."""
+
+class StreamedCompletion:
+    """Text, token usage and timing of a streamed chat completion."""
+
+    def __init__(self, start_time: Optional[float] = None):
+        self.start_time = start_time if start_time is not None else time.time()
+        self.parts = []
+        self.usage = {}
+        self.finish_reason = None
+        self.ttft_seconds = None
+        self.wall_seconds = 0.0
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    def add_text(self, text: str, on_text: Optional[Callable[[str], None]] = None):
+        if not text:
+            return
+        if self.ttft_seconds is None:
+            self.ttft_seconds = time.time() - self.start_time
+        self.parts.append(text)
+        if on_text is not None:
+            on_text(text)
+
+    def finish(self) -> "StreamedCompletion":
+        self.wall_seconds = time.time() - self.start_time
+        if self.ttft_seconds is None:
+            self.ttft_seconds = self.wall_seconds
+        return self
+
+def _add_chunk(completion: StreamedCompletion, chunk: Dict[str, Any], on_text: Optional[Callable[[str], None]]):
+    """Add one parsed chunk (OpenAI chat.completion.chunk layout) to a completion."""
+    if chunk.get("error"):
+        error = chunk["error"]
+        raise StreamError(error.get("message", str(error)) if isinstance(error, dict) else str(error), completion)
+    if chunk.get("usage"):
+        completion.usage = chunk["usage"]
+    for choice in chunk.get("choices") or []:
+        completion.add_text((choice.get("delta") or {}).get("content") or "", on_text)
+        if choice.get("finish_reason"):
+            completion.finish_reason = choice["finish_reason"]
+
+def read_sse_completion(response, on_text: Optional[Callable[[str], None]] = None,
+                        start_time: Optional[float] = None) -> StreamedCompletion:
+    """
+    Read a streamed OpenRouter response (requests.post(..., stream=True) with "stream": true
+    in the payload).
+
+    Args:
+        response: requests.Response whose body is a server-sent event stream
+        on_text: Called with every text delta as it arrives
+        start_time: time.time() at which the request was sent (default: now)
+
+    Returns:
+        StreamedCompletion: Full text, usage of the final chunk and timing
+
+    Raises:
+        StreamError: If the stream reports an error
+        StreamCancelled: If on_text cancels the stream (close the response, e.g. with a with block)
+    """
+    completion = StreamedCompletion(start_time)
+    for line in response.iter_lines(decode_unicode=True):
+        # Blank lines separate events; lines starting with ":" are keep-alive comments
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        _add_chunk(completion, chunk, on_text)
+    return completion.finish()
+
+def read_openai_completion(stream: Iterable[Any], on_text: Optional[Callable[[str], None]] = None,
+                           start_time: Optional[float] = None) -> StreamedCompletion:
+    """
+    Read a streamed OpenAI client response (client.chat.completions.create(..., stream=True)).
+
+    Args:
+        stream: Iterable of chat.completion.chunk objects
+        on_text: Called with every text delta as it arrives
+        start_time: time.time() at which the request was sent (default: now)
+
+    Returns:
+        StreamedCompletion: Full text, usage of the final chunk and timing
+
+    Raises:
+        StreamError: If the stream reports an error
+        StreamCancelled: If on_text cancels the stream
+    """
+    completion = StreamedCompletion(start_time)
+    try:
+        for chunk in stream:
+            _add_chunk(completion, chunk.model_dump() if hasattr(chunk, "model_dump") else dict(chunk), on_text)
+    except BaseException:
+        # Stop the generation instead of leaving the connection to the garbage collector
+        if hasattr(stream, "close"):
+            stream.close()
+        raise
+    return completion.finish()
+
+def stream_options() -> Dict[str, Any]:
+    """Request fields that make OpenRouter stream the response and report usage in the final chunk."""
+    return {"stream": True, "stream_options": {"include_usage": True}}
+
+class PythonBlockExtractor:
+    """
+    Split streamed Python code into its top-level blocks.
+
+    A block (a class or function with its decorators, or any other top-level statement)
+    is complete once the next unindented line arrives outside any open string or bracket,
+    or when the stream ends. Markdown code fences and text before the first fence are skipped.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._block = []
+        self._in_fence = False
+        self._fenced = False
+        self.blocks = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Add streamed text.
+
+        Returns:
+            list: Blocks completed by this text, each {"kind": "class" | "def" | "statement",
+                  "name": str or None, "source": str}
+        """
+        self._pending += text
+        lines = self._pending.split("\n")
+        self._pending = lines.pop()
+        completed = []
+        for line in lines:
+            block = self._add_line(line)
+            if block is not None:
+                completed.append(block)
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """End of the stream: return the last block (if any)."""
+        completed = []
+        if self._pending:
+            block = self._add_line(self._pending)
+            self._pending = ""
+            if block is not None:
+                completed.append(block)
+        block = self._close_block()
+        if block is not None:
+            completed.append(block)
+        return completed
+
+    def _add_line(self, line: str) -> Optional[Dict[str, Any]]:
+        if line.lstrip().startswith("```"):
+            # A fence opens or closes the code; a closing fence ends the current block
+            self._in_fence = not self._in_fence
+            self._fenced = True
+            if self._in_fence:
+                # Anything before the opening fence is prose
+                self._block = []
+                return None
+            return self._close_block()
+        if self._fenced and not self._in_fence:
+            return None
+
+        block = None
+        starts_statement = line[:1] not in ("", " ", "\t", "#", ")", "]", "}")
+        if starts_statement and self._block and not self._only_decorators() and self._is_complete():
+            block = self._close_block()
+        self._block.append(line)
+        return block
+
+    def _only_decorators(self) -> bool:
+        code_lines = [line for line in self._block if line.strip() and not line.startswith("#")]
+        return bool(code_lines) and all(line.startswith("@") for line in code_lines)
+
+    def _is_complete(self) -> bool:
+        """Whether the current block has no open string, bracket or continuation line."""
+        try:
+            for _ in tokenize.generate_tokens(io.StringIO("\n".join(self._block) + "\n").readline):
+                pass
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            return False
+        return True
+
+    def _close_block(self) -> Optional[Dict[str, Any]]:
+        lines, self._block = self._block, []
+        while lines and not lines[-1].strip():
+            lines.pop()
+        if not any(line.strip() and not line.startswith("#") for line in lines):
+            return None
+
+        source = "\n".join(lines) + "\n"
+        kind, name = "statement", None
+        for line in lines:
+            if line.startswith(("@", "#")) or not line.strip():
+                continue
+            for keyword in ("class", "def", "async def"):
+                if line.startswith(keyword + " "):
+                    kind = "def" if keyword != "class" else "class"
+                    name = line[len(keyword) + 1:].split("(")[0].split(":")[0].strip()
+            break
+        block = {"kind": kind, "name": name, "source": source}
+        self.blocks.append(block)
+        return block
+
+def check_block_syntax(source: str) -> Optional[str]:
+    """Compile a code block; returns None if it is valid Python, else the syntax error."""
+    try:
+        compile(source, "<streamed block>", "exec")
+    except SyntaxError as e:
+        return f"line {e.lineno}: {e.msg}"
+    return None
+
+class JsonStepExtractor:
+    """
+    Pick the items of a JSON array (by default "solution_steps") out of streamed text as
+    soon as each item's closing brace arrives.
+
+    The scanner tracks strings and nesting across feeds and keeps no state per character
+    beyond a small stack, so every character is looked at once. Prose and markdown around
+    the JSON documents are skipped; several documents in one response are numbered in order.
+    """
+
+    def __init__(self, array_key: str = "solution_steps",
+                 parse: Optional[Callable[[str], Any]] = None):
+        """
+        Args:
+            array_key (str): Key of the arrays whose items are extracted
+            parse (callable): Turns the text of an item into a value (default: json.loads);
+                              items it cannot parse are skipped
+        """
+        self.array_key = array_key
+        self.parse = parse or json.loads
+        self.buffer = ""
+        self.items = []
+        self.document_index = -1
+        self._position = 0
+        # One frame per open object or array:
+        # [bracket, key in parent, last key seen, start of the open item, items completed]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Add streamed text.
+
+        Returns:
+            list: Items completed by this text, each {"document": index of the JSON document,
+                  "owner": key of the object holding the array (None at the top level),
+                  "index": position in the array, "value": parsed item}
+        """
+        self.buffer += text
+        completed = []
+        buffer, stack = self.buffer, self._stack
+        position = self._position
+        while position < len(buffer):
+            char = buffer[position]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start:position]
+            elif not stack:
+                # Outside any document: wait for the next object
+                if char == "{":
+                    self.document_index += 1
+                    stack.append(["{", None, None, None, 0])
+            elif char == '"':
+                self._in_string = True
+                self._string_start = position + 1
+            elif char == ":":
+                if stack[-1][0] == "{":
+                    stack[-1][2] = self._last_string
+            elif char in "{[":
+                parent = stack[-1]
+                key = parent[2] if parent[0] == "{" else None
+                if parent[0] == "[" and char == "{" and parent[1] == self.array_key:
+                    parent[3] = position
+                stack.append([char, key, None, None, 0])
+            elif char in "}]":
+                stack.pop()
+                if stack and char == "}" and stack[-1][0] == "[" and stack[-1][3] is not None:
+                    item = self._complete_item(stack, buffer[stack[-1][3]:position + 1])
+                    stack[-1][3] = None
+                    if item is not None:
+                        completed.append(item)
+            position += 1
+        self._position = position
+        return completed
+
+    def _complete_item(self, stack: List[list], item_text: str) -> Optional[Dict[str, Any]]:
+        array = stack[-1]
+        index = array[4]
+        array[4] += 1
+        try:
+            value = self.parse(item_text)
+        except ValueError:
+            return None
+        owner = stack[-2][1] if len(stack) >= 2 else None
+        item = {"document": self.document_index, "owner": owner, "index": index, "value": value}
+        self.items.append(item)
+        return item
+
+_OUTSIDE_TOKENS = re.compile(r"```|\{")
+_STRING_TOKENS = re.compile(r'["\\]')
+# A string literal whose escapes are all valid JSON and none a LaTeX lookalike (\text, \neq)
+_CLEAN_STRING = r'"[^"\\]*(?:\\(?:["\\/]|u[0-9a-fA-F]{4}|[bfnrt](?![a-z]))[^"\\]*)*"'
+# Everything up to the next brace or string that needs repairing (or is still incomplete)
+_DOCUMENT_SKIP = re.compile(r'[^{}"`]*(?:' + _CLEAN_STRING + r'[^{}"`]*)*')
+# A document that json can parse as it is
+_CLEAN_DOCUMENT = re.compile(r'[^"]*(?:' + _CLEAN_STRING + r'[^"]*)*')
+# strict=False: raw line breaks inside strings are common in model output
+_DECODER = json.JSONDecoder(strict=False)
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+def _is_latex_backslash(text: str, position: int, final: bool) -> Optional[bool]:
+    r"""
+    Decide whether the backslash at text[position], inside a JSON string, starts a LaTeX
+    command the model forgot to escape rather than a JSON escape sequence.
+
+    \\, \" and \/ are escapes. \u is an escape only before four hex digits (not in \underline).
+    \b, \f, \n, \r and \t are escapes unless a lowercase letter follows, which makes them
+    \beta, \frac, \neq, \right, \text... Everything else (\angle, \circ, \{, \,) is LaTeX.
+
+    Returns:
+        bool or None: True for LaTeX, False for an escape, None if the text ends too early
+                      to tell (only when final is False)
+    """
+    following = text[position + 1:position + 6]
+    if not following:
+        return None if not final else True
+    char = following[0]
+    if char in '"\\/':
+        return False
+    if char == "u":
+        if len(following) < 5 and not final:
+            return None
+        return not (len(following) == 5 and all(digit in _HEX_DIGITS for digit in following[1:]))
+    if char in "bfnrt":
+        if len(following) < 2 and not final:
+            return None
+        return "a" <= following[1:2] <= "z"
+    return True
+
+class JsonDocumentExtractor:
+    """
+    Pick the top-level JSON objects out of (streamed) text in one pass.
+
+    Objects are found inside markdown ```json fences or, in a response without fences, bare
+    in the text; once a response has used a fence, text outside fences is treated as prose.
+    While scanning, every backslash inside a string literal that starts a LaTeX command
+    instead of a JSON escape is doubled, so LaTeX such as "$\\angle ABC$" survives while
+    keys, numbers and already escaped text are left alone. Each object is parsed once, when
+    its closing brace arrives.
+
+    An object that is already valid JSON with no LaTeX lookalike escapes is parsed directly
+    by json. Otherwise the scanner jumps between the characters that matter with compiled
+    patterns: plain text and string literals that need no repair are skipped in one match,
+    so only braces and the strings holding LaTeX are looked at in Python.
+    """
+
+    def __init__(self):
+        self.documents = []
+        self.errors = []
+        self.repaired = 0
+        self._buffer = ""
+        # Characters dropped from the front of the buffer, for offsets in the whole text
+        self._dropped = 0
+        self._position = 0
+        self._in_document = False
+        self._in_string = False
+        self._in_fence = False
+        self._fenced = False
+        self._depth = 0
+        self._start = 0
+        self._copied = 0
+        self._parts = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Add (streamed) text.
+
+        Returns:
+            list: JSON objects completed by this text
+        """
+        self._buffer += text
+        return self._scan(final=False)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        End of the text: settle escapes that were waiting for more text. An object still
+        open here (a truncated response) is recorded in errors.
+
+        Returns:
+            list: JSON objects completed at the end of the text
+        """
+        completed = self._scan(final=True)
+        if self._in_document:
+            self.errors.append({"offset": self._dropped + self._start, "error": "unterminated JSON object"})
+            self._in_document = self._in_string = False
+        return completed
+
+    def _scan(self, final: bool) -> List[Dict[str, Any]]:
+        completed = []
+        buffer, position = self._buffer, self._position
+        while True:
+            if self._in_string:
+                match = _STRING_TOKENS.search(buffer, position)
+                if match is None:
+                    position = len(buffer)
+                    break
+                position = match.start()
+                if buffer[position] == '"':
+                    self._in_string = False
+                    position += 1
+                    continue
+                latex = _is_latex_backslash(buffer, position, final)
+                if latex is None:
+                    break
+                if latex:
+                    # Copy up to the backslash plus one extra: the backslash itself follows
+                    # with the next copied part
+                    self._parts.append(buffer[self._copied:position] + "\\")
+                    self._copied = position
+                    self.repaired += 1
+                    position += 1
+                else:
+                    position += 2
+            elif self._in_document:
+                position = _DOCUMENT_SKIP.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                char = buffer[position]
+                position += 1
+                if char == '"':
+                    self._in_string = True
+                elif char == "`":
+                    fence = buffer[position - 1:position + 2]
+                    if fence == "```":
+                        # No JSON has a fence outside its strings: the "object" was a brace
+                        # in the prose before a fenced block
+                        self.errors.append({"offset": self._dropped + self._start, "error": "code fence inside the object"})
+                        self._in_document = False
+                        position -= 1
+                    elif "```".startswith(fence) and not final:
+                        position -= 1
+                        break
+                elif char == "{":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        document = self._complete_document(buffer[self._copied:position])
+                        if document is not None:
+                            completed.append(document)
+            else:
+                match = _OUTSIDE_TOKENS.search(buffer, position)
+                if match is None:
+                    # Keep a possibly split fence for the next feed
+                    position = max(position, len(buffer) - 2)
+                    break
+                position = match.end()
+                if match.group() == "```":
+                    self._in_fence = not self._in_fence
+                    self._fenced = True
+                elif self._in_fence or not self._fenced:
+                    document, end = self._decode_clean(buffer, position - 1)
+                    if document is not None:
+                        completed.append(document)
+                        position = end
+                        continue
+                    self._in_document = True
+                    self._depth = 1
+                    self._start = self._copied = position - 1
+                    self._parts = []
+
+        if not self._in_document and position:
+            # Text before the next object is never needed again
+            self._buffer = buffer[position:]
+            self._dropped += position
+            position = 0
+        self._position = position
+        return completed
+
+    def _decode_clean(self, buffer: str, start: int):
+        """
+        Parse the object at buffer[start] directly if it is complete and needs no repair,
+        so most documents never go through the scanner. Tried once per object.
+        """
+        try:
+            document, end = _DECODER.raw_decode(buffer, start)
+        except ValueError:
+            return None, start
+        if not _CLEAN_DOCUMENT.fullmatch(buffer, start, end):
+            # Valid JSON, but a LaTeX command such as \frac was read as an escape
+            return None, start
+        self.documents.append(document)
+        return document, end
+
+    def _complete_document(self, tail: str) -> Optional[Dict[str, Any]]:
+        self._in_document = False
+        self._parts.append(tail)
+        text, self._parts = "".join(self._parts), []
+        try:
+            document = _DECODER.decode(text)
+        except ValueError as e:
+            self.errors.append({"offset": self._dropped + self._start, "error": str(e)})
+            return None
+        if not isinstance(document, dict):
+            return None
+        self.documents.append(document)
+        return document
+
+def extract_json_documents(text: str) -> List[Dict[str, Any]]:
+    """Extract the JSON objects of a complete text (see JsonDocumentExtractor)."""
+    extractor = JsonDocumentExtractor()
+    extractor.feed(text)
+    extractor.finish()
+    return extractor.documents
+
+def parse_json_document(text: str) -> Dict[str, Any]:
+    """
+    Parse the text of a single JSON object with its LaTeX backslashes repaired.
+
+    Raises:
+        ValueError: If the text holds no valid JSON object
+    """
+    extractor = JsonDocumentExtractor()
+    extractor.feed(text)
+    extractor.finish()
+    if not extractor.documents:
+        problem = extractor.errors[0]["error"] if extractor.errors else "no JSON object found"
+        raise ValueError(f"Invalid JSON object: {problem}")
+    return extractor.documents[0]
@@ -1,64 +1,193 @@
 #!/usr/bin/env python3
 """
 Terminal Pipeline Script
-Orchestrates the entire geometry video generation pipeline sequentially.
+Orchestrates the entire geometry video generation pipeline as a dependency graph.
 
-This script runs the following steps in order:
+The pipeline consists of the following steps:
 1. generate_solution_steps.py - Generate solution steps from question image
 2. geo_scriptwriter_parallel.py - Generate audio files and timing data
 3. integrated_geometry_pipeline.py - Generate geometric blueprint and Manim code
 4. video_claude.py - Generate comprehensive Manim scenes
 5. render_and_concatenate_scenes.py - Render and concatenate final video
 
-Each step is validated before proceeding to the next.
+Each step declares the steps it depends on plus its input and output files.
+A step starts as soon as all of its dependencies have finished, so steps 2 and 3
+(which both only need step 1's solution JSON) run at the same time.
+Each step is validated before any step that depends on it is started.
+
+All inputs and outputs of a run live in its run directory (--run-dir, default: the
+script directory), so several pipelines can run at once in different run directories.
+
+Every completed step is recorded in a checkpoint manifest (checkpoints/<question>.json)
+together with hashes of its inputs and outputs. With --resume, steps whose inputs and
+outputs are unchanged since the last run are skipped, and --from-step/--to-step limit
+the run to a range of steps.
+
+With --in-process, each step calls its script's run_stage() function inside this
+process instead of starting a new Python interpreter, so the heavy imports are paid
+once and stage results are passed back in memory.
+
+Token usage is never parsed from console output: every LLM call appends a usage record
+(model, tokens, wall time, time to first token, retries, cache hit) to the run's
+usage_records.jsonl, and the records of this run are aggregated into the cost and
+latency report pipeline_token_usage_report.json (see usage_records.py).
+
+After Step 4 the generated scenes are checked statically against their audio durations
+(scene_duration_checker.py). Scenes the renderer could not stretch to their audio are
+regenerated with the LLM cache bypassed (--max-scene-regenerations times) before any
+rendering starts. With --scene-candidates K, Step 4 runs the same checks on K whole-file
+generations started at once and keeps the first that passes, so a bad sample costs the
+time of the fastest good one instead of a full regeneration.
 """
 
 import os
 import sys
 import subprocess
 import time
+import json
 import argparse
+import importlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Tuple, List
+from typing import Any, Tuple, List, Dict, Callable, Optional
+
+from pipeline_checkpoints import CheckpointManifest, script_modules
+from run_context import RunContext, StageResult
+from usage_records import UsageLog, aggregate_usage, build_usage_report
+from scene_duration_checker import check_scene_durations, print_report
 
 # Configure detailed logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('pipeline.log'),
+        logging.FileHandler(Path(__file__).resolve().parent / 'pipeline.log'),
         logging.StreamHandler(sys.stdout)
     ]
 )
 logger = logging.getLogger(__name__)
 
+class PipelineStep:
+    """
+    A node in the pipeline graph: a runnable step with its dependencies, inputs and outputs.
+    The options are the settings that change what the step produces; they are part of its
+    checkpoint, so a resumed run with different options runs the step again. The resource
+    ("api" or "cpu") says which concurrency limit the step counts against when several
+    pipelines share a process (see batch_pipeline.py). Optional inputs and outputs are files
+    that only exist in some modes (coordinates.json); they are part of the checkpoint but
+    are not required to exist.
+    """
+    
+    def __init__(self, name: str, title: str, script: str, run: Callable[[], bool],
+                 depends_on: Optional[List[str]] = None,
+                 inputs: Optional[List[str]] = None,
+                 outputs: Optional[List[str]] = None,
+                 options: Optional[Dict[str, Any]] = None,
+                 optional_inputs: Optional[List[str]] = None,
+                 optional_outputs: Optional[List[str]] = None,
+                 resource: str = "api"):
+        self.name = name
+        self.title = title
+        self.script = script
+        self.run = run
+        self.depends_on = depends_on or []
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.options = options or {}
+        self.optional_inputs = optional_inputs or []
+        self.optional_outputs = optional_outputs or []
+        self.resource = resource
+
+def step_number(step_name: str) -> int:
+    """Return the number of a step name such as 'step_3'."""
+    return int(step_name.split("_")[-1])
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+def load_pipeline_env(pipeline_dir: Path):
+    """
+    Load the pipeline's .env file once per process for in-process stages
+    (a subprocess stage loads it itself when its script starts).
+    """
+    global _env_loaded
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv(pipeline_dir / ".env")
+            _env_loaded = True
+
 class TerminalPipeline:
     """Main pipeline orchestrator class."""
     
-    def __init__(self, question_image_path: str):
-        self.question_image_path = question_image_path
-        self.pipeline_dir = Path("/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline")
+    def __init__(self, question_image_path: str, run_dir: Optional[str] = None, resume: bool = False,
+                 from_step: Optional[int] = None, to_step: Optional[int] = None,
+                 resource_limits: Optional[Dict[str, threading.Semaphore]] = None,
+                 in_process: bool = False, max_scene_regenerations: int = 2, figure_mode: str = "auto",
+                 codegen: str = "auto", per_scene: bool = False, stream_llm: bool = False, scene_candidates: int = 1,
+                 scene_concurrency: Optional[int] = None):
+        # Scripts are run from the pipeline directory; all their files go to the run directory
+        self.context = RunContext(run_dir, question_image_path)
+        self.context.create_dirs()
+        self.question_image_path = self.context.question_image
+        self.pipeline_dir = self.context.script_dir
+        self.run_dir = self.context.run_dir
         self.start_time = time.time()
         
-        # Token tracking
-        self.token_usage = {
-            "total": {
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "total_tokens": 0
-            },
-            "by_step": {},
-            "by_model": {
-                "gemini": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
-                "claude": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
-            }
-        }
+        # Resume options
+        self.resume = resume
+        self.from_step = from_step
+        self.to_step = to_step
+        if from_step and to_step and from_step > to_step:
+            raise ValueError(f"--from-step {from_step} is after --to-step {to_step}")
+        
+        # In-process mode: stages run through their run_stage() functions
+        self.in_process = in_process
+        self.stage_results = {}
+        
+        # Fresh scene code generations allowed when the static duration check fails
+        self.max_scene_regenerations = max(0, max_scene_regenerations)
+        
+        # How Step 3 produces figure.py (see integrated_geometry_pipeline.FIGURE_MODES)
+        self.figure_mode = figure_mode
+        # How Step 4 produces all_scenes.py (see video_claude.CODEGEN_MODES)
+        self.codegen = codegen
+        # Step 4 LLM generation: one request per scene, in parallel
+        self.per_scene = per_scene
+        # Scene requests in flight with per_scene (None: video_claude.py's default)
+        self.scene_concurrency = max(1, scene_concurrency) if scene_concurrency else None
+        # Step 4 whole-file LLM generation: hedged requests, the first to pass the checks wins
+        self.scene_candidates = max(1, scene_candidates)
+        # Steps 1, 3 and 4 stream their LLM responses and start work on finished parts early
+        self.stream_llm = stream_llm
+        
+        # Token tracking: stages append one usage record per LLM call to the run's usage log;
+        # this run aggregates the records written after its start
+        self.usage_log = UsageLog(self.context.usage_log_file)
+        self.usage_log_offset = self.usage_log.offset()
+        self.token_usage = aggregate_usage([])
+        self.usage_report = build_usage_report([])
+        
+        # Dependency graph of pipeline steps
+        self.steps = self.build_step_graph()
+        
+        # Checkpoint manifest of completed steps for this question
+        manifest_path = self.context.checkpoint_dir / f"{Path(question_image_path).stem}.json"
+        self.checkpoints = CheckpointManifest(manifest_path, self.question_image_path)
+        self.skipped_steps = []
+        self.executed_steps = []
+        
+        # Shared concurrency limits by step resource ("api"/"cpu"), and per-step timings
+        self.resource_limits = resource_limits or {}
+        self.step_timings = {}
         
-        # Ensure we're in the correct directory
-        os.chdir(self.pipeline_dir)
         logger.info(f"Pipeline initialized in directory: {self.pipeline_dir}")
+        logger.info(f"Run directory: {self.run_dir}")
         logger.info(f"Question image: {self.question_image_path}")
+        logger.info(f"Checkpoint manifest: {manifest_path}")
+        logger.info(f"Execution mode: {'in-process' if in_process else 'subprocess per step'}")
     
     def validate_file_exists(self, file_path: str, step_name: str) -> bool:
         """Validate that a file exists and log the result."""
@@ -79,7 +208,8 @@ class TerminalPipeline:
         return all_exist
     
     def run_command(self, command: List[str], step_name: str) -> bool:
-        """Run a command and return success status."""
+        """Run a pipeline script for this run and return success status."""
+        command = command + ["--run-dir", str(self.run_dir)]
         logger.info(f"🚀 Starting {step_name}...")
         logger.info(f"   Command: {' '.join(command)}")
         
@@ -89,7 +219,8 @@ class TerminalPipeline:
                 command,
                 capture_output=True,
                 text=True,
-                cwd=self.pipeline_dir
+                cwd=self.pipeline_dir,
+                env=self.context.subprocess_env()
             )
             end_time = time.time()
             duration = end_time - start_time
@@ -98,14 +229,6 @@ class TerminalPipeline:
                 logger.info(f"✅ {step_name} completed successfully in {duration:.2f} seconds")
                 if result.stdout:
                     logger.debug(f"   Output: {result.stdout}")
-                
-                # Extract token usage from output if available
-                self.extract_token_usage_from_output(result.stdout, step_name)
-                
-                # Also check stderr for token information
-                if result.stderr:
-                    self.extract_token_usage_from_output(result.stderr, step_name)
-                
                 return True
             else:
                 logger.error(f"❌ {step_name} failed with return code {result.returncode}")
@@ -116,142 +239,285 @@ class TerminalPipeline:
             logger.error(f"❌ {step_name} failed with exception: {e}")
             return False
     
-    def extract_token_usage_from_output(self, output: str, step_name: str):
-        """Extract token usage information from command output."""
-        if not output:
-            return
-        
-        # Look for token usage patterns in the output
-        import re
-        
-        # Pattern for token usage information
-        token_patterns = [
-            r'Input tokens:\s*(\d+)',
-            r'Output tokens:\s*(\d+)',
-            r'Total tokens:\s*(\d+)',
-            r'prompt_tokens.*?(\d+)',
-            r'completion_tokens.*?(\d+)',
-            r'total_tokens.*?(\d+)',
-            r'Tokens:\s*(\d+)\s*\(input:\s*(\d+),\s*output:\s*(\d+)\)',
-            r'(\d+)\s*\(input:\s*(\d+),\s*output:\s*(\d+)\)'
+    def run_stage_in_process(self, module_name: str, step_name: str, **kwargs) -> bool:
+        """
+        Run a pipeline script's run_stage() function in this process and return success status.
+        
+        Args:
+            module_name (str): Module of the stage script, e.g. "video_claude"
+            step_name (str): Step name used for logging and token accounting
+            **kwargs: Extra keyword arguments for run_stage()
+        """
+        logger.info(f"🚀 Starting {step_name} (in-process)...")
+        
+        try:
+            load_pipeline_env(self.pipeline_dir)
+            start_time = time.time()
+            module = importlib.import_module(module_name)
+            result: StageResult = module.run_stage(self.context, **kwargs)
+            duration = time.time() - start_time
+        except Exception as e:
+            logger.error(f"❌ {step_name} failed with exception: {e}")
+            return False
+        
+        self.stage_results[step_name] = result
+        if not result.success:
+            logger.error(f"❌ {step_name} failed: {result.error}")
+            return False
+        
+        logger.info(f"✅ {step_name} completed successfully in {duration:.2f} seconds")
+        return True
+    
+    def run_step_script(self, script: str, command_args: Optional[List[str]] = None, **stage_kwargs) -> bool:
+        """Run a step's script, in this process or as a subprocess depending on the execution mode."""
+        if self.in_process:
+            return self.run_stage_in_process(Path(script).stem, script, **stage_kwargs)
+        return self.run_command(["python", script] + (command_args or []), script)
+    
+    def collect_token_usage(self):
+        """Aggregate the usage records written by this run's stages (both execution modes)."""
+        records = self.usage_log.read(self.usage_log_offset)
+        self.usage_report = build_usage_report(records)
+        self.token_usage = self.usage_report["token_usage"]
+    
+    def build_step_graph(self) -> Dict[str, PipelineStep]:
+        """
+        Declare every pipeline step with its dependencies, inputs and outputs.
+        Steps only read the outputs of the steps they depend on.
+        """
+        context = self.context
+        standard_json = str(context.solution_standard_file)
+        verbose_json = str(context.solution_verbose_file)
+        audio_timing_json = str(context.audio_timing_file)
+        timing_json = str(context.geometric_timing_file)
+        scene_audio_dir = str(context.scene_audio_dir)
+        coordinates_txt = str(context.coordinates_file)
+        figure_py = str(context.figure_file)
+        coordinates_json = str(context.coordinates_json_file)
+        scenes_py = str(context.scenes_file)
+        
+        steps = [
+            PipelineStep(
+                name="step_1",
+                title="GENERATE SOLUTION STEPS",
+                script="generate_solution_steps.py",
+                run=self.step_1_generate_solution_steps,
+                inputs=[self.question_image_path],
+                outputs=[standard_json, verbose_json]
+            ),
+            PipelineStep(
+                name="step_2",
+                title="GENERATE AUDIO FILES",
+                script="geo_scriptwriter_parallel.py",
+                run=self.step_2_generate_audio,
+                depends_on=["step_1"],
+                inputs=[standard_json, verbose_json],
+                outputs=[audio_timing_json, timing_json, scene_audio_dir]
+            ),
+            PipelineStep(
+                name="step_3",
+                title="GENERATE GEOMETRIC PIPELINE",
+                script="integrated_geometry_pipeline.py",
+                run=self.step_3_generate_geometry_pipeline,
+                depends_on=["step_1"],
+                inputs=[self.question_image_path, standard_json],
+                outputs=[coordinates_txt, figure_py],
+                # Only written when figure_builder.py built the figure
+                optional_outputs=[coordinates_json],
+                options={"figure_mode": self.figure_mode}
+            ),
+            PipelineStep(
+                name="step_4",
+                title="GENERATE VIDEO CODE",
+                script="video_claude.py",
+                run=self.step_4_generate_video_code,
+                depends_on=["step_2", "step_3"],
+                inputs=[self.question_image_path, standard_json, timing_json, coordinates_txt, figure_py],
+                outputs=[scenes_py, str(context.scenes_metadata_file)],
+                # Read by the scene templates when Step 3 built the figure
+                optional_inputs=[coordinates_json],
+                options={"codegen": self.codegen, "per_scene": self.per_scene,
+                         "scene_candidates": self.scene_candidates}
+            ),
+            PipelineStep(
+                name="step_5",
+                title="RENDER FINAL VIDEO",
+                script="render_and_concatenate_scenes.py",
+                run=self.step_5_render_final_video,
+                depends_on=["step_2", "step_4"],
+                # The generated scenes import functions.py when they are rendered
+                inputs=[scenes_py, timing_json, scene_audio_dir, str(self.pipeline_dir / "functions.py")],
+                outputs=[str(context.final_video)],
+                resource="cpu"
+            ),
         ]
         
-        step_tokens = {
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "total_tokens": 0
+        return {step.name: step for step in steps}
+    
+    def order_steps(self, steps: Dict[str, PipelineStep]) -> List[str]:
+        """
+        Return the step names in a valid execution order (topological sort).
+        Raises ValueError for unknown dependencies or dependency cycles.
+        """
+        for step in steps.values():
+            for dependency in step.depends_on:
+                if dependency not in steps:
+                    raise ValueError(f"{step.name} depends on unknown step '{dependency}'")
+        
+        ordered = []
+        remaining = dict(steps)
+        while remaining:
+            ready = [name for name, step in remaining.items()
+                     if all(dependency in ordered for dependency in step.depends_on)]
+            if not ready:
+                raise ValueError(f"Dependency cycle between steps: {', '.join(sorted(remaining))}")
+            for name in ready:
+                ordered.append(name)
+                del remaining[name]
+        
+        return ordered
+    
+    def start_step(self, step: PipelineStep) -> bool:
+        """
+        Log the step banner, check its declared inputs and run it.
+        Steps before --from-step, and with --resume steps that are up to date
+        according to the checkpoint manifest, reuse their existing outputs instead.
+        """
+        logger.info("=" * 60)
+        logger.info(f"{step.name.upper().replace('_', ' ')}: {step.title}")
+        logger.info("=" * 60)
+        
+        if self.from_step and step_number(step.name) < self.from_step:
+            if not self.validate_files_exist(step.outputs, f"{step.name} output"):
+                logger.error(f"❌ {step.name} is before --from-step {self.from_step} but its outputs are missing")
+                return False
+            logger.info(f"⏭️ {step.name} skipped (before --from-step {self.from_step}), reusing existing outputs")
+            self.skipped_steps.append(step.name)
+            return True
+        
+        if not self.validate_files_exist(step.inputs, f"{step.name} input"):
+            logger.error(f"❌ {step.name} cannot start - required input files not found")
+            return False
+        
+        # The step's script and the modules it imports are part of its inputs so that code
+        # changes invalidate the checkpoint
+        script = self.pipeline_dir / step.script
+        checkpoint_inputs = step.inputs + step.optional_inputs + [str(script)] + script_modules(script)
+        if self.resume and self.checkpoints.is_up_to_date(step.name, checkpoint_inputs, step.outputs, step.options,
+                                                          step.optional_outputs):
+            logger.info(f"⏭️ {step.name} skipped - inputs and outputs unchanged since the last run")
+            self.skipped_steps.append(step.name)
+            return True
+        
+        # Wait for a free slot of the step's resource when running under a batch
+        wait_start = time.time()
+        limit = self.resource_limits.get(step.resource)
+        if limit is not None:
+            limit.acquire()
+        start_time = time.time()
+        wait_seconds = start_time - wait_start
+        if wait_seconds >= 1:
+            logger.info(f"⏳ {step.name} waited {wait_seconds:.1f}s for a free {step.resource} slot")
+        
+        try:
+            success = step.run()
+        finally:
+            if limit is not None:
+                limit.release()
+        duration = time.time() - start_time
+        
+        self.step_timings[step.name] = {
+            "resource": step.resource,
+            "wait_seconds": round(wait_seconds, 2),
+            "duration_seconds": round(duration, 2),
+            "success": success
         }
         
-        # Extract token numbers from output
-        for i, pattern in enumerate(token_patterns):
-            matches = re.findall(pattern, output, re.IGNORECASE)
-            if matches:
-                try:
-                    if i < 6:  # First 6 patterns are single number patterns
-                        token_count = int(matches[0])
-                        if "prompt" in pattern.lower():
-                            step_tokens["prompt_tokens"] = token_count
-                        elif "completion" in pattern.lower():
-                            step_tokens["completion_tokens"] = token_count
-                        elif "total" in pattern.lower():
-                            step_tokens["total_tokens"] = token_count
-                    else:  # Last 2 patterns are multi-number patterns
-                        if len(matches[0]) >= 3:  # Ensure we have all 3 numbers
-                            total_tokens = int(matches[0][0])
-                            input_tokens = int(matches[0][1])
-                            output_tokens = int(matches[0][2])
-                            step_tokens["total_tokens"] = total_tokens
-                            step_tokens["prompt_tokens"] = input_tokens
-                            step_tokens["completion_tokens"] = output_tokens
-                except (ValueError, IndexError):
-                    continue
-        
-        # If we found any tokens, store them
-        if any(step_tokens.values()):
-            self.token_usage["by_step"][step_name] = step_tokens
-            
-            # Update totals
-            self.token_usage["total"]["prompt_tokens"] += step_tokens["prompt_tokens"]
-            self.token_usage["total"]["completion_tokens"] += step_tokens["completion_tokens"]
-            self.token_usage["total"]["total_tokens"] += step_tokens["total_tokens"]
-            
-            # Update by model (based on step name)
-            if "gemini" in step_name.lower() or "solution" in step_name.lower():
-                model_key = "gemini"
-            elif "claude" in step_name.lower() or "video" in step_name.lower():
-                model_key = "claude"
-            else:
-                model_key = "claude"  # Default for other steps
-            
-            self.token_usage["by_model"][model_key]["prompt_tokens"] += step_tokens["prompt_tokens"]
-            self.token_usage["by_model"][model_key]["completion_tokens"] += step_tokens["completion_tokens"]
-            self.token_usage["by_model"][model_key]["total_tokens"] += step_tokens["total_tokens"]
-            
-            logger.info(f"📊 Token usage for {step_name}: {step_tokens}")
+        if success:
+            self.executed_steps.append(step.name)
+            self.checkpoints.record_step(step.name, checkpoint_inputs, step.outputs, duration, step.options,
+                                         step.optional_outputs)
+        else:
+            self.checkpoints.record_failure(step.name, duration)
+        
+        return success
     
-    def extract_token_usage_from_metadata_files(self):
-        """Extract token usage from metadata files created by individual scripts."""
-        metadata_files = [
-            "all_scenes_metadata.json"
-        ]
+    def run_step_graph(self) -> bool:
+        """
+        Run all steps, starting each one as soon as its dependencies have completed.
+        Independent steps run concurrently. If a step fails, no new steps are started;
+        steps that are already running are allowed to finish.
+        """
+        try:
+            execution_order = self.order_steps(self.steps)
+        except ValueError as e:
+            logger.error(f"❌ Invalid pipeline graph: {e}")
+            return False
         
-        for metadata_file in metadata_files:
-            if os.path.exists(metadata_file):
-                try:
-                    import json
-                    with open(metadata_file, 'r') as f:
-                        metadata = json.load(f)
+        # Steps after --to-step are not run at all
+        if self.to_step:
+            execution_order = [name for name in execution_order if step_number(name) <= self.to_step]
+        
+        logger.info(f"🧭 Step execution order: {' → '.join(execution_order)}")
+        
+        completed = set()
+        failed = []
+        pending = list(execution_order)
+        running = {}
+        
+        with ThreadPoolExecutor(max_workers=len(self.steps)) as executor:
+            while pending or running:
+                # Start every step whose dependencies have all completed
+                if not failed:
+                    for name in list(pending):
+                        step = self.steps[name]
+                        if all(dependency in completed for dependency in step.depends_on):
+                            pending.remove(name)
+                            running[executor.submit(self.start_step, step)] = step
+                
+                if not running:
+                    break
+                
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        logger.error(f"❌ {step.name} raised an exception: {e}")
+                        success = False
                     
-                    if "prompt_tokens" in metadata and "completion_tokens" in metadata:
-                        step_name = metadata_file.replace("_metadata.json", "")
-                        step_tokens = {
-                            "prompt_tokens": metadata.get("prompt_tokens", 0),
-                            "completion_tokens": metadata.get("completion_tokens", 0),
-                            "total_tokens": metadata.get("total_tokens", 0)
-                        }
-                        
-                        self.token_usage["by_step"][step_name] = step_tokens
-                        self.token_usage["total"]["prompt_tokens"] += step_tokens["prompt_tokens"]
-                        self.token_usage["total"]["completion_tokens"] += step_tokens["completion_tokens"]
-                        self.token_usage["total"]["total_tokens"] += step_tokens["total_tokens"]
-                        
-                        # Determine model based on step name
-                        if "video" in step_name.lower():
-                            model_key = "claude"
-                        else:
-                            model_key = "claude"  # Default
-                        
-                        self.token_usage["by_model"][model_key]["prompt_tokens"] += step_tokens["prompt_tokens"]
-                        self.token_usage["by_model"][model_key]["completion_tokens"] += step_tokens["completion_tokens"]
-                        self.token_usage["by_model"][model_key]["total_tokens"] += step_tokens["total_tokens"]
-                        
-                        logger.info(f"📊 Token usage from {metadata_file}: {step_tokens}")
-                        
-                except Exception as e:
-                    logger.warning(f"Could not read token usage from {metadata_file}: {e}")
+                    if success:
+                        completed.add(step.name)
+                    else:
+                        logger.error(f"❌ Pipeline failed at {step.name.replace('_', ' ').title()}")
+                        failed.append(step.name)
+        
+        if failed:
+            if pending:
+                logger.error(f"⏭️ Steps not started because of the failure: {', '.join(pending)}")
+            logger.error("💡 Rerun with --resume to continue from the failed step")
+            return False
+        
+        if self.skipped_steps:
+            logger.info(f"⏭️ Steps reused from earlier runs: {', '.join(sorted(self.skipped_steps))}")
+        
+        return True
     
     def step_1_generate_solution_steps(self) -> bool:
         """Step 1: Generate solution steps from question image."""
-        logger.info("=" * 60)
-        logger.info("STEP 1: GENERATE SOLUTION STEPS")
-        logger.info("=" * 60)
-        
         # Run generate_solution_steps.py
-        command = [
-            "python", "generate_solution_steps.py",
-            "--question-image", self.question_image_path
-        ]
-        
-        success = self.run_command(command, "generate_solution_steps.py")
+        success = self.run_step_script(
+            "generate_solution_steps.py",
+            ["--question-image", self.question_image_path] + self.stream_args(),
+            stream=self.stream_llm
+        )
         if not success:
             return False
         
         # Validate outputs
         logger.info("🔍 Validating Step 1 outputs...")
-        expected_files = [
-            "math_solution_pipeline/math_solution_standard.json",
-            "math_solution_pipeline/math_solution_verbose.json"
-        ]
+        expected_files = self.steps["step_1"].outputs
         
         if not self.validate_files_exist(expected_files, "Step 1"):
             logger.error("❌ Step 1 validation failed - required files not found")
@@ -262,28 +528,23 @@ class TerminalPipeline:
     
     def step_2_generate_audio(self) -> bool:
         """Step 2: Generate audio files and timing data."""
-        logger.info("=" * 60)
-        logger.info("STEP 2: GENERATE AUDIO FILES")
-        logger.info("=" * 60)
-        
-        # Run geo_scriptwriter_parallel.py
-        command = ["python", "geo_scriptwriter_parallel.py"]
-        
-        success = self.run_command(command, "geo_scriptwriter_parallel.py")
+        # Run geo_scriptwriter_parallel.py (in-process, it takes the standard solution of Step 1 from memory)
+        step_1_result = self.stage_results.get("generate_solution_steps.py")
+        standard_solution = step_1_result.data.get("standard_json") if step_1_result else None
+        success = self.run_step_script("geo_scriptwriter_parallel.py", standard_solution=standard_solution)
         if not success:
             return False
         
         # Validate outputs
         logger.info("🔍 Validating Step 2 outputs...")
         
-        # Check for geometric_elements_with_timing.json
-        timing_file = "geometric_elements_with_timing.json"
-        if not self.validate_file_exists(timing_file, "Step 2"):
-            logger.error("❌ Step 2 validation failed - geometric_elements_with_timing.json not found")
+        # Check for deconstruct_parallel_symbols.json and geometric_elements_with_timing.json
+        if not self.validate_files_exist(self.steps["step_2"].outputs, "Step 2"):
+            logger.error("❌ Step 2 validation failed - timing files not found")
             return False
         
         # Check for audio directories and files
-        audio_dirs = ["Audio", "Scene"]
+        audio_dirs = [self.context.audio_dir, self.context.scene_audio_dir]
         for audio_dir in audio_dirs:
             if os.path.exists(audio_dir):
                 audio_files = list(Path(audio_dir).glob("*.mp3"))
@@ -296,26 +557,19 @@ class TerminalPipeline:
     
     def step_3_generate_geometry_pipeline(self) -> bool:
         """Step 3: Generate geometric blueprint and Manim code."""
-        logger.info("=" * 60)
-        logger.info("STEP 3: GENERATE GEOMETRIC PIPELINE")
-        logger.info("=" * 60)
-        
         # Run integrated_geometry_pipeline.py
-        command = [
-            "python", "integrated_geometry_pipeline.py",
-            "--question-image", self.question_image_path
-        ]
-        
-        success = self.run_command(command, "integrated_geometry_pipeline.py")
+        success = self.run_step_script(
+            "integrated_geometry_pipeline.py",
+            ["--question-image", self.question_image_path, "--figure-mode", self.figure_mode] + self.stream_args(),
+            figure_mode=self.figure_mode,
+            stream=self.stream_llm
+        )
         if not success:
             return False
         
         # Validate outputs
         logger.info("🔍 Validating Step 3 outputs...")
-        expected_files = [
-            "coordinates.txt",
-            "figure.py"
-        ]
+        expected_files = self.steps["step_3"].outputs
         
         if not self.validate_files_exist(expected_files, "Step 3"):
             logger.error("❌ Step 3 validation failed - required files not found")
@@ -326,52 +580,108 @@ class TerminalPipeline:
     
     def step_4_generate_video_code(self) -> bool:
         """Step 4: Generate comprehensive Manim scenes."""
-        logger.info("=" * 60)
-        logger.info("STEP 4: GENERATE VIDEO CODE")
-        logger.info("=" * 60)
-        
         # Run video_claude.py
-        command = [
-            "python", "video_claude.py",
-            "--question-image", self.question_image_path
-        ]
-        
-        success = self.run_command(command, "video_claude.py")
+        success = self.run_step_script(
+            "video_claude.py",
+            ["--question-image", self.question_image_path, "--codegen", self.codegen]
+            + self.per_scene_args() + self.candidates_args() + self.stream_args(),
+            codegen=self.codegen,
+            per_scene=self.per_scene,
+            stream=self.stream_llm,
+            candidates=self.scene_candidates,
+            **self.per_scene_kwargs()
+        )
         if not success:
             return False
         
         # Validate outputs
         logger.info("🔍 Validating Step 4 outputs...")
-        expected_files = [
-            "all_scenes.py",
-            "all_scenes_metadata.json"
-        ]
+        expected_files = self.steps["step_4"].outputs
         
         if not self.validate_files_exist(expected_files, "Step 4"):
             logger.error("❌ Step 4 validation failed - required files not found")
             return False
         
+        # Reject scenes that could not be matched to their audio before rendering them
+        regenerations = 0
+        while not self.check_scene_durations():
+            # Template scenes are deterministic, so only the LLM can produce different ones
+            if regenerations >= self.max_scene_regenerations or self.codegen == "template":
+                logger.error(f"❌ Step 4 validation failed - scene durations still out of range "
+                             f"after {regenerations} regenerations")
+                return False
+            regenerations += 1
+            logger.warning(f"🔁 Regenerating scene code without the LLM cache "
+                           f"({regenerations}/{self.max_scene_regenerations})...")
+            success = self.run_step_script(
+                "video_claude.py",
+                ["--question-image", self.question_image_path, "--no-cache", "--codegen", "llm",
+                 "--regeneration", str(regenerations)]
+                + self.per_scene_args() + self.candidates_args() + self.stream_args(),
+                use_cache=False,
+                regeneration=regenerations,
+                codegen="llm",
+                per_scene=self.per_scene,
+                stream=self.stream_llm,
+                candidates=self.scene_candidates,
+                **self.per_scene_kwargs()
+            )
+            if not success or not self.validate_files_exist(expected_files, "Step 4"):
+                return False
+        
         logger.info("✅ Step 4 completed and validated successfully")
         return True
     
+    def per_scene_args(self) -> List[str]:
+        """video_claude.py options for per-scene generation."""
+        if not self.per_scene:
+            return []
+        return ["--per-scene"] + (["--scene-concurrency", str(self.scene_concurrency)] if self.scene_concurrency else [])
+    
+    def per_scene_kwargs(self) -> Dict[str, int]:
+        """video_claude.run_stage() arguments matching per_scene_args()."""
+        return {"scene_concurrency": self.scene_concurrency} if self.per_scene and self.scene_concurrency else {}
+    
+    def candidates_args(self) -> List[str]:
+        """video_claude.py options for hedged whole-file generation."""
+        return ["--candidates", str(self.scene_candidates)] if self.scene_candidates > 1 else []
+    
+    def stream_args(self) -> List[str]:
+        """Options of the LLM steps for streamed responses."""
+        return ["--stream"] if self.stream_llm else []
+    
+    def check_scene_durations(self) -> bool:
+        """
+        Estimate each generated scene's duration from its code and compare it with the
+        scene's audio duration. The report is saved to scene_duration_check.json.
+        """
+        logger.info("⏱️ Checking estimated scene durations against the audio...")
+        report = check_scene_durations(str(self.context.scenes_file), str(self.context.geometric_timing_file),
+                                       str(self.context.scene_audio_dir))
+        print_report(report)
+        
+        try:
+            with open(self.context.duration_check_file, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not save scene duration report: {e}")
+        
+        if report["success"]:
+            logger.info("✅ All scene durations are within the renderer's speed limits")
+        else:
+            logger.warning(f"⚠️ Scenes out of range: {', '.join(report['failed_scenes']) or report['error']}")
+        return report["success"]
+    
     def step_5_render_final_video(self) -> bool:
         """Step 5: Render and concatenate final video."""
-        logger.info("=" * 60)
-        logger.info("STEP 5: RENDER FINAL VIDEO")
-        logger.info("=" * 60)
-        
         # Run render_and_concatenate_scenes.py
-        command = ["python", "render_and_concatenate_scenes.py"]
-        
-        success = self.run_command(command, "render_and_concatenate_scenes.py")
+        success = self.run_step_script("render_and_concatenate_scenes.py")
         if not success:
             return False
         
         # Validate outputs
         logger.info("🔍 Validating Step 5 outputs...")
-        expected_files = [
-            "final_geometry_video.mp4"
-        ]
+        expected_files = self.steps["step_5"].outputs
         
         if not self.validate_files_exist(expected_files, "Step 5"):
             logger.error("❌ Step 5 validation failed - final video not found")
@@ -381,39 +691,21 @@ class TerminalPipeline:
         return True
     
     def run_pipeline(self) -> bool:
-        """Run the complete pipeline sequentially."""
+        """Run the complete pipeline, executing independent steps concurrently."""
         logger.info("🎬 STARTING COMPLETE GEOMETRY VIDEO GENERATION PIPELINE")
         logger.info(f"📁 Question Image: {self.question_image_path}")
         logger.info(f"📁 Working Directory: {self.pipeline_dir}")
+        logger.info(f"📁 Run Directory: {self.run_dir}")
         logger.info("=" * 80)
         
-        # Step 1: Generate solution steps
-        if not self.step_1_generate_solution_steps():
-            logger.error("❌ Pipeline failed at Step 1")
+        if not self.run_step_graph():
+            # Keep the cost and latency of the failed attempt
+            self.collect_token_usage()
+            self.save_token_usage_report()
             return False
         
-        # Step 2: Generate audio files
-        if not self.step_2_generate_audio():
-            logger.error("❌ Pipeline failed at Step 2")
-            return False
-        
-        # Step 3: Generate geometric pipeline
-        if not self.step_3_generate_geometry_pipeline():
-            logger.error("❌ Pipeline failed at Step 3")
-            return False
-        
-        # Step 4: Generate video code
-        if not self.step_4_generate_video_code():
-            logger.error("❌ Pipeline failed at Step 4")
-            return False
-        
-        # Step 5: Render final video
-        if not self.step_5_render_final_video():
-            logger.error("❌ Pipeline failed at Step 5")
-            return False
-        
-        # Extract token usage from metadata files
-        self.extract_token_usage_from_metadata_files()
+        # Exact token usage from the usage records of this run
+        self.collect_token_usage()
         
         # Pipeline completed successfully
         end_time = time.time()
@@ -445,6 +737,7 @@ class TerminalPipeline:
             if tokens["total_tokens"] > 0:
                 logger.info(f"   • {step}: {tokens['total_tokens']:,} tokens")
                 logger.info(f"     - Input: {tokens['prompt_tokens']:,}, Output: {tokens['completion_tokens']:,}")
+        logger.info(f"💰 Estimated cost: ${self.usage_report['cost_usd']['total']:.4f}")
         logger.info("")
         
         # Print final summary to terminal
@@ -468,9 +761,11 @@ class TerminalPipeline:
             if tokens["total_tokens"] > 0:
                 print(f"   • {step}: {tokens['total_tokens']:,} tokens")
                 print(f"     - Input: {tokens['prompt_tokens']:,}, Output: {tokens['completion_tokens']:,}")
+        print("")
+        print(f"💰 ESTIMATED COST: ${self.usage_report['cost_usd']['total']:.4f}")
         print("=" * 80)
         
-        logger.info(f"📁 Final Video: {self.pipeline_dir}/final_geometry_video.mp4")
+        logger.info(f"📁 Final Video: {self.context.final_video}")
         logger.info(f"📁 Log File: {self.pipeline_dir}/pipeline.log")
         logger.info("=" * 80)
         
@@ -479,20 +774,52 @@ class TerminalPipeline:
         
         return True
     
+    def build_run_summary(self, success: bool) -> Dict:
+        """Summarize this run: outcome, duration, step timings, token usage and cost."""
+        self.collect_token_usage()
+        return {
+            "question_image": self.question_image_path,
+            "run_dir": str(self.run_dir),
+            "success": success,
+            "total_duration_seconds": round(time.time() - self.start_time, 2),
+            "executed_steps": self.executed_steps,
+            "skipped_steps": self.skipped_steps,
+            "step_timings": self.step_timings,
+            "token_usage": self.token_usage,
+            "cost_usd": self.usage_report["cost_usd"]["total"],
+            "tts_cache": self.load_stage_stats(self.context.tts_cache_stats_file),
+            "tts_requests": self.load_stage_stats(self.context.tts_request_stats_file)
+        }
+    
+    def load_stage_stats(self, stats_file: Path) -> Optional[Dict]:
+        """
+        Statistics a stage saved in the run directory, e.g. the TTS cache hits and misses
+        or the ElevenLabs request latencies of Step 2 (None if the stage did not save them).
+        """
+        try:
+            with open(stats_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
     def save_token_usage_report(self):
-        """Save comprehensive token usage report to JSON file."""
+        """Save the per-question cost and latency report (token usage, cost, step and LLM call timings)."""
         try:
-            import json
             report = {
                 "pipeline_info": {
                     "question_image": self.question_image_path,
                     "total_duration_seconds": time.time() - self.start_time,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "executed_steps": self.executed_steps,
+                    "skipped_steps": self.skipped_steps
                 },
-                "token_usage": self.token_usage
+                "step_timings": self.step_timings,
+                "tts_cache": self.load_stage_stats(self.context.tts_cache_stats_file),
+                "tts_requests": self.load_stage_stats(self.context.tts_request_stats_file),
+                **self.usage_report
             }
             
-            report_file = "pipeline_token_usage_report.json"
+            report_file = self.context.token_report_file
             with open(report_file, 'w') as f:
                 json.dump(report, f, indent=2)
             
@@ -512,6 +839,12 @@ def main():
 Examples:
   python terminal_pipeline.py --question-image "Math Questions/question_1.png"
   python terminal_pipeline.py --question-image "/path/to/your/question_image.png"
+  python terminal_pipeline.py --question-image "Math Questions/question_1.png" --no-cache
+  python terminal_pipeline.py --question-image "Math Questions/question_1.png" --resume
+  python terminal_pipeline.py --question-image "Math Questions/question_1.png" --from-step 5
+  python terminal_pipeline.py --question-image "Math Questions/question_1.png" --to-step 3
+  python terminal_pipeline.py --question-image "Math Questions/question_2.png" --run-dir runs/question_2
+  python terminal_pipeline.py --question-image "Math Questions/question_1.png" --in-process
         """
     )
     
@@ -520,9 +853,84 @@ Examples:
         required=True,
         help="Path to the question image file (required)"
     )
+    RunContext.add_argument(parser)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached LLM responses and call the APIs for every step"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip steps whose inputs and outputs are unchanged since the last run"
+    )
+    parser.add_argument(
+        "--from-step",
+        type=int,
+        choices=range(1, 6),
+        help="First step to run; earlier steps reuse their existing outputs"
+    )
+    parser.add_argument(
+        "--to-step",
+        type=int,
+        choices=range(1, 6),
+        help="Last step to run"
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run every step inside this process instead of starting a Python subprocess per step"
+    )
+    parser.add_argument(
+        "--max-scene-regenerations",
+        type=int,
+        default=2,
+        help="How often Step 4 may regenerate scenes whose estimated duration does not fit their audio (default: 2)"
+    )
+    parser.add_argument(
+        "--figure-mode",
+        choices=["auto", "builder", "llm"],
+        default="auto",
+        help="How Step 3 produces figure.py: from the blueprint tables without an LLM call (builder), "
+             "with the LLM (llm), or the builder with the LLM as fallback (auto, default)"
+    )
+    parser.add_argument(
+        "--codegen",
+        choices=["auto", "template", "llm"],
+        default="auto",
+        help="How Step 4 produces all_scenes.py: from the timing data without an LLM call (template), "
+             "with the LLM (llm), or the template with the LLM as fallback (auto, default)"
+    )
+    parser.add_argument(
+        "--per-scene",
+        action="store_true",
+        help="When Step 4 uses the LLM, request one scene per call in parallel instead of the whole file at once"
+    )
+    parser.add_argument(
+        "--scene-concurrency",
+        type=int,
+        help="Maximum number of scene requests in flight with --per-scene (default: video_claude.py's default)"
+    )
+    parser.add_argument(
+        "--scene-candidates",
+        type=int,
+        default=1,
+        help="When Step 4 asks the LLM for the whole file, start this many generations at once and keep the first "
+             "that passes the syntax, element id and duration checks (default: 1)"
+    )
+    parser.add_argument(
+        "--stream-llm",
+        action="store_true",
+        help="Stream the LLM responses of Steps 1, 3 and 4: finished steps are narrated into the TTS cache "
+             "and finished scene classes checked and their LaTeX compiled before generation ends"
+    )
     
     args = parser.parse_args()
     
+    # Step scripts inherit (or, in-process, share) the environment, so this reaches every LLM call
+    if args.no_cache:
+        os.environ["LLM_CACHE_BYPASS"] = "1"
+    
     # Validate question image exists
     if not os.path.exists(args.question_image):
         print(f"❌ Question image file not found: {args.question_image}")
@@ -530,12 +938,27 @@ Examples:
     
     # Initialize and run pipeline
     try:
-        pipeline = TerminalPipeline(args.question_image)
+        pipeline = TerminalPipeline(
+            args.question_image,
+            run_dir=args.run_dir,
+            resume=args.resume,
+            from_step=args.from_step,
+            to_step=args.to_step,
+            in_process=args.in_process,
+            max_scene_regenerations=args.max_scene_regenerations,
+            figure_mode=args.figure_mode,
+            codegen=args.codegen,
+            per_scene=args.per_scene,
+            stream_llm=args.stream_llm,
+            scene_candidates=args.scene_candidates,
+            scene_concurrency=args.scene_concurrency
+        )
         success = pipeline.run_pipeline()
         
         if success:
             print("\n🎉 Pipeline completed successfully!")
-            print(f"📹 Final video: {pipeline.pipeline_dir}/final_geometry_video.mp4")
+            if not args.to_step or args.to_step == 5:
+                print(f"📹 Final video: {pipeline.context.final_video}")
             sys.exit(0)
         else:
             print("\n❌ Pipeline failed. Check the log file for details.")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+LaTeX Warm-up
+Compile the MathTex and Tex strings of generated scene code into the run's shared Tex
+cache (media/Tex) while the rest of the code is still being generated.
+
+render_and_concatenate_scenes.py links media/Tex into every render job, so LaTeX compiled
+here is not compiled again by the render. Expressions are compiled by creating the Manim
+mobjects themselves, so the cached files are exactly the ones the render looks up.
+
+Only calls whose arguments are all string literals are compiled; calls with keywords that
+change the LaTeX source (a custom template, environment or substring isolation) are left
+to the render. Without Manim installed the warm-up is skipped.
+
+Manim's configuration is process-global, and batch_pipeline.py --in-process runs several
+pipelines in one process. Every compilation therefore sets the run's media directory
+with manim.tempconfig while holding a lock shared by all warm-ups of the process.
+"""
+
+import ast
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+TEX_CLASSES = ("MathTex", "Tex")
+# Keywords that change the compiled LaTeX source
+TEX_SOURCE_KEYWORDS = ("tex_template", "tex_environment", "arg_separator", "substrings_to_isolate",
+                       "tex_to_color_map", "isolate")
+
+# Held while a warm-up has manim.config switched to its run's media directory
+_MANIM_CONFIG_LOCK = threading.Lock()
+
+def find_tex_calls(source: str) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    Find the MathTex/Tex calls of a code block that can be compiled ahead of the render.
+
+    Returns:
+        list: (class name, string arguments) per call, without duplicates, in source order
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+
+    calls = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if name not in TEX_CLASSES or not node.args:
+            continue
+        if not all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in node.args):
+            continue
+        if any(keyword.arg in TEX_SOURCE_KEYWORDS or keyword.arg is None for keyword in node.keywords):
+            continue
+        call = (name, tuple(arg.value for arg in node.args))
+        if call not in calls:
+            calls.append(call)
+    return calls
+
+class TexWarmup:
+    """Compiles the LaTeX of finished code blocks on one background thread."""
+
+    def __init__(self, media_dir: Union[str, Path]):
+        """
+        Args:
+            media_dir: Media directory of the run; LaTeX is compiled into its Tex/ directory
+        """
+        self.media_dir = Path(media_dir)
+        self.compiled = 0
+        self.failures = []
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._manim = None
+        # One thread: compilations hold the process-wide config lock and are CPU bound anyway
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tex-warmup")
+        self._futures = []
+
+    def submit(self, source: str, label: str) -> int:
+        """
+        Queue the MathTex/Tex calls of a code block for compilation.
+
+        Args:
+            source (str): Code of a finished block, e.g. a scene class
+            label (str): Name of the block for the log
+
+        Returns:
+            int: Number of new expressions queued
+        """
+        with self._lock:
+            calls = [call for call in find_tex_calls(source) if call not in self._seen]
+            self._seen.update(calls)
+        if calls:
+            self._futures.append(self._executor.submit(self._compile, calls, label))
+        return len(calls)
+
+    def _load_manim(self) -> bool:
+        if self._manim is None:
+            try:
+                import manim
+                self._manim = manim
+            except ImportError as e:
+                logger.warning(f"⚠️  Manim not available, skipping LaTeX warm-up: {e}")
+                self._manim = False
+        return bool(self._manim)
+
+    def _compile(self, calls: List[Tuple[str, Tuple[str, ...]]], label: str):
+        if not self._load_manim():
+            return
+        with _MANIM_CONFIG_LOCK, self._manim.tempconfig({"media_dir": str(self.media_dir)}):
+            for class_name, args in calls:
+                try:
+                    getattr(self._manim, class_name)(*args)
+                    self.compiled += 1
+                except Exception as e:
+                    # Reported now, long before the render would hit the same LaTeX error
+                    self.failures.append({"block": label, "call": class_name, "args": list(args), "error": str(e)})
+                    logger.warning(f"⚠️  LaTeX error in {label}: {class_name}{args!r}: {e}")
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Wait for the queued compilations.
+
+        Returns:
+            dict: Number of expressions queued, compiled and failed, and the failures
+        """
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown()
+        return {
+            "queued": len(self._seen),
+            "compiled": self.compiled,
+            "failed": len(self.failures),
+            "failures": self.failures,
+            "manim_available": self._manim is not False
+        }
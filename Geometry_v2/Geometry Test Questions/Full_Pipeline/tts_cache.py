@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+TTS Audio Cache
+Content-addressed on-disk cache for the ElevenLabs text-to-speech calls made by
+geo_scriptwriter_parallel.py.
+
+Each entry is keyed by a SHA-256 hash of the sentence text, the voice ID, the model ID
+and the voice settings (plus the API base URL when it is not the ElevenLabs API). An entry stores the encoded MP3 exactly as returned by the API
+(<key>.mp3) next to a small metadata file (<key>.json) holding its measured duration, so
+a cache hit needs neither the HTTP call nor an audio decode.
+
+Eviction: when the cache grows beyond its maximum size, the least recently used
+entries are removed.
+
+Environment variables:
+- TTS_CACHE_DIR: cache directory (default: .tts_cache next to this script)
+- TTS_CACHE_MAX_BYTES: maximum total cache size in bytes (default: 500 MB)
+- TTS_CACHE_BYPASS: set to 1 to ignore cached audio (fresh audio is still stored)
+
+Usage: python tts_cache.py [--stats] [--clear]
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".tts_cache"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+def bypass_requested() -> bool:
+    """Return True if the TTS_CACHE_BYPASS environment variable is set."""
+    return os.environ.get("TTS_CACHE_BYPASS", "").strip().lower() in ("1", "true", "yes")
+
+class TTSAudioCache:
+    """On-disk cache of synthesized sentence audio keyed by a hash of the TTS request."""
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, max_bytes: Optional[int] = None,
+                 bypass: bool = False):
+        self.cache_dir = Path(cache_dir or os.environ.get("TTS_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.environ.get("TTS_CACHE_MAX_BYTES") or DEFAULT_MAX_BYTES)
+        self.bypass = bypass or bypass_requested()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        # Lookups may run on worker threads
+        self._counter_lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, model_id: str, voice_settings: Dict[str, Any],
+                 endpoint: Optional[str] = None) -> str:
+        """
+        Build the cache key for a TTS request.
+
+        Args:
+            text (str): Sentence text sent to the API
+            voice_id (str): ElevenLabs voice ID
+            model_id (str): ElevenLabs model ID
+            voice_settings (dict): Voice settings sent with the request
+            endpoint (str): API base URL if it is not the ElevenLabs API (e.g. a local stub server),
+                            so audio from a stand-in never answers requests meant for the real API
+
+        Returns:
+            str: Hex SHA-256 digest identifying the request
+        """
+        request = {
+            "text": text,
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "voice_settings": voice_settings
+        }
+        if endpoint:
+            request["endpoint"] = endpoint
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _audio_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp3"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """
+        Look up cached audio.
+
+        Returns:
+            tuple: (MP3 bytes, duration in seconds), or None on a miss (or when bypassing the cache)
+        """
+        if self.bypass:
+            self._count_miss()
+            return None
+
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._audio_path(key), "rb") as f:
+                audio_bytes = f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._count_miss()
+            return None
+
+        if len(audio_bytes) != meta.get("bytes"):
+            # Half-written or damaged entry
+            self._remove_entry(key)
+            self._count_miss()
+            return None
+
+        # Touch the entry so size-based eviction removes the least recently used entries first
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        with self._counter_lock:
+            self.hits += 1
+            self.bytes_served += len(audio_bytes)
+        return audio_bytes, float(meta["duration_seconds"])
+
+    def _count_miss(self):
+        with self._counter_lock:
+            self.misses += 1
+
+    def put(self, key: str, audio_bytes: bytes, duration_seconds: float, text: str = ""):
+        """
+        Store the audio of a request with its measured duration.
+        A stage stores hundreds of sentences at once, so eviction is not run per entry:
+        call evict() once the batch is stored.
+        """
+        meta = {
+            "key": key,
+            "created_at": time.time(),
+            "duration_seconds": duration_seconds,
+            "bytes": len(audio_bytes),
+            "text": text[:200]
+        }
+
+        # Audio first, metadata last: an entry only counts once its metadata file exists
+        self._write_atomic(self._audio_path(key), audio_bytes)
+        self._write_atomic(self._meta_path(key), json.dumps(meta).encode("utf-8"))
+
+    def put_file(self, key: str, audio_path: Union[str, Path], duration_seconds: float, text: str = ""):
+        """Store the audio of a request from an MP3 file (e.g. a streamed response written to disk)."""
+        with open(audio_path, "rb") as f:
+            audio_bytes = f.read()
+        self.put(key, audio_bytes, duration_seconds, text)
+
+    def _write_atomic(self, path: Path, content: bytes):
+        """Write to a temporary file first so concurrent readers never see a partial file."""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            self._remove(Path(temp_path))
+            raise
+
+    def _entries(self):
+        """(last use time, total bytes, key) of every entry in the cache."""
+        entries = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            key = meta_path.stem
+            try:
+                last_used = meta_path.stat().st_mtime
+                size = meta_path.stat().st_size + self._audio_path(key).stat().st_size
+            except FileNotFoundError:
+                continue
+            entries.append((last_used, size, key))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits within its size limit.
+
+        Returns:
+            int: Number of entries removed
+        """
+        entries = self._entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, key in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove_entry(key)
+            total_bytes -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Remove every cached entry. Returns the number of entries removed."""
+        removed = 0
+        for meta_path in self.cache_dir.glob("*.json"):
+            self._remove_entry(meta_path.stem)
+            removed += 1
+        for audio_path in self.cache_dir.glob("*.mp3"):
+            self._remove(audio_path)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries, total size and hit/miss counters of the cache."""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": len(entries),
+            "total_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "bytes_served": self.bytes_served
+        }
+
+    def _remove_entry(self, key: str):
+        self._remove(self._meta_path(key))
+        self._remove(self._audio_path(key))
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+def main():
+    """Inspect or clear the TTS audio cache from the command line."""
+    parser = argparse.ArgumentParser(description="Inspect or clear the TTS audio cache")
+    parser.add_argument("--stats", action="store_true", help="Show cache size and entry count")
+    parser.add_argument("--clear", action="store_true", help="Remove all cached audio")
+
+    args = parser.parse_args()
+
+    cache = TTSAudioCache()
+
+    if args.clear:
+        removed = cache.clear()
+        print(f"🧹 Removed {removed} cached audio files from {cache.cache_dir}")
+
+    stats = cache.stats()
+    print(f"📁 Cache directory: {stats['cache_dir']}")
+    print(f"📊 Entries: {stats['entries']} ({stats['total_bytes'] / (1024 * 1024):.2f} MB of {stats['max_bytes'] / (1024 * 1024):.0f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+TTS Rate Limiter
+Adaptive concurrency control and retry policy for the ElevenLabs requests made by
+geo_scriptwriter_parallel.py.
+
+AdaptiveConcurrencyLimiter replaces a fixed semaphore with an AIMD controller:
+- While requests succeed within the latency target, the limit grows by one request
+  for every full window of successes (additive increase)
+- A 429 or 5xx response halves the limit (multiplicative decrease) and, if the
+  response carries Retry-After, pauses all new requests until that time has passed
+- A successful but slow request lowers the limit by one
+
+RetryPolicy retries failed requests with full-jitter exponential backoff, waiting at
+least as long as the server asked for with Retry-After.
+
+Every request is recorded in a LatencyHistogram, reported at the end of the stage.
+"""
+
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0]
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date).
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable_status(status: Optional[int]) -> bool:
+    """429, 5xx and connection errors (status None) are worth retrying; other errors are not."""
+    return status is None or status == 429 or status >= 500
+
+class LatencyHistogram:
+    """Bucketed request latencies with exact percentiles."""
+
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.samples = []
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the recorded latencies (None if nothing was recorded)."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(1, int(-(-pct * len(ordered) // 100)))
+        return round(ordered[rank - 1], 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound:g}s" for bound in self.buckets] + [f">{self.buckets[-1]:g}s"]
+        return {
+            "count": len(self.samples),
+            "mean_seconds": round(sum(self.samples) / len(self.samples), 3) if self.samples else None,
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+            "max_seconds": round(max(self.samples), 3) if self.samples else None,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+    def format(self, width: int = 30) -> List[str]:
+        """Text bar chart of the buckets, one line per bucket."""
+        lines = []
+        peak = max(self.counts) or 1
+        labels = [f"<= {bound:g}s" for bound in self.buckets] + [f" > {self.buckets[-1]:g}s"]
+        for label, count in zip(labels, self.counts):
+            lines.append(f"{label:>9} | {'#' * round(count / peak * width):<{width}} {count}")
+        return lines
+
+class RetryPolicy:
+    """Retry schedule: full-jitter exponential backoff, never shorter than Retry-After."""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+        """
+        Args:
+            max_attempts (int): Attempts per request including the first one
+            base_delay (float): Backoff ceiling after the first failure, in seconds
+            max_delay (float): Largest backoff ceiling, in seconds
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait after failed attempt number `attempt` (0-based)."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return max(retry_after, backoff)
+        return backoff
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on the number of requests in flight, with a shared Retry-After pause."""
+
+    def __init__(self, initial_limit: int = 5, min_limit: int = 1, max_limit: int = 16,
+                 latency_target_seconds: float = 10.0):
+        """
+        Args:
+            initial_limit (int): Requests allowed in flight at the start
+            min_limit (int): Lowest limit after backing off
+            max_limit (int): Highest limit reached while latency is healthy
+            latency_target_seconds (float): Latency above which a success counts as slow
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial_limit))
+        self.latency_target_seconds = latency_target_seconds
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.paused_until = 0.0
+        self.successes_in_window = 0
+        self.limit_history = [self.limit]
+        self.status_counts = {}
+        self.retries = 0
+        self.histogram = LatencyHistogram()
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created on first use so the limiter can be built outside the event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        """Wait for a free request slot (and for any Retry-After pause to end)."""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < self.limit:
+                    break
+                await condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def release(self, status: Optional[int], latency_seconds: float, retry_after: Optional[float] = None):
+        """
+        Free a request slot and adapt the limit to the outcome of the request.
+
+        Args:
+            status (int): HTTP status of the response, None for a connection error or timeout
+            latency_seconds (float): Time the request took
+            retry_after (float): Retry-After delay sent by the server, in seconds
+        """
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            self.histogram.record(latency_seconds)
+            status_key = str(status) if status is not None else "error"
+            self.status_counts[status_key] = self.status_counts.get(status_key, 0) + 1
+
+            if status == 429 or (status is not None and status >= 500):
+                self._set_limit(self.limit // 2)
+                self.successes_in_window = 0
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            elif status == 200 and latency_seconds > self.latency_target_seconds:
+                self._set_limit(self.limit - 1)
+                self.successes_in_window = 0
+            elif status == 200:
+                self.successes_in_window += 1
+                if self.successes_in_window >= self.limit:
+                    self._set_limit(self.limit + 1)
+                    self.successes_in_window = 0
+
+            condition.notify_all()
+
+    def _set_limit(self, limit: int):
+        limit = min(self.max_limit, max(self.min_limit, limit))
+        if limit != self.limit:
+            self.limit = limit
+            self.limit_history.append(limit)
+
+    def report(self) -> Dict[str, Any]:
+        """Request statistics: latency histogram, status counts, retries and how the limit moved."""
+        return {
+            "requests": self.histogram.to_dict()["count"],
+            "retries": self.retries,
+            "status_counts": self.status_counts,
+            "final_limit": self.limit,
+            "peak_in_flight": self.peak_in_flight,
+            "limit_history": self.limit_history,
+            "latency": self.histogram.to_dict()
+        }
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+TTS Stub Server
+Local stand-in for the ElevenLabs text-to-speech endpoint, for benchmarking and
+regression-testing the audio stage (geo_scriptwriter_parallel.py) offline.
+
+POST /v1/text-to-speech/<voice_id> returns deterministic audio whose duration is
+proportional to the length of the text (POST /v1/text-to-speech/<voice_id>/stream sends
+the same audio with chunked transfer encoding, spread over the response delay):
+- MP3 (default): silent MPEG-1 Layer III frames (44.1 kHz, mono, 128 kbps) that any
+  decoder, including ffmpeg/pydub, reads as silence of the expected length
+- PCM (?output_format=pcm_<rate>): raw signed 16-bit little-endian mono samples
+
+Latency and failures can be injected to exercise the concurrency limiter and retries:
+- --latency / --latency-per-char / --jitter: response delay
+- --error-rate: fraction of requests answered with a 500
+- --rate-limit-rate: fraction of requests answered with a 429 and Retry-After
+- --max-concurrent: requests beyond this many in flight are answered with a 429
+
+Usage:
+  python tts_stub_server.py --port 8765
+  ELEVENLABS_BASE_URL=http://127.0.0.1:8765 ELEVENLABS_API_KEY=stub \\
+      python geo_scriptwriter_parallel.py --run-dir runs/benchmark --no-cache
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+MP3_SAMPLE_RATE = 44100
+MP3_SAMPLES_PER_FRAME = 1152
+MP3_BITRATE = 128000
+# MPEG-1 Layer III, no CRC, 128 kbps, 44.1 kHz, no padding, mono, original
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC4])
+MP3_FRAME_BYTES = 144 * MP3_BITRATE // MP3_SAMPLE_RATE
+# All-zero side information and main data decode as a silent frame
+SILENT_MP3_FRAME = MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - len(MP3_FRAME_HEADER))
+
+TTS_PATH = re.compile(r"^/v1/text-to-speech/(?P<voice_id>[^/?]+)(?P<stream>/stream)?$")
+STREAM_CHUNK_BYTES = 4096
+
+def audio_seconds_for_text(text: str, seconds_per_char: float) -> float:
+    """Duration of the stub audio for a text (at least one MP3 frame)."""
+    return max(MP3_SAMPLES_PER_FRAME / MP3_SAMPLE_RATE, len(text) * seconds_per_char)
+
+def make_mp3(seconds: float) -> bytes:
+    """Silent MP3 of (at least) the given duration, rounded up to whole frames."""
+    frames = max(1, -(-int(seconds * MP3_SAMPLE_RATE) // MP3_SAMPLES_PER_FRAME))
+    return SILENT_MP3_FRAME * frames
+
+def make_pcm(seconds: float, sample_rate: int) -> bytes:
+    """Silent 16-bit mono PCM of the given duration."""
+    return bytes(2 * int(round(seconds * sample_rate)))
+
+class StubSettings:
+    """Behaviour of the stub server, shared by all request handlers."""
+
+    def __init__(self, seconds_per_char: float = 0.06, latency: float = 0.2, latency_per_char: float = 0.002,
+                 jitter: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, max_concurrent: int = 0, seed: Optional[int] = None):
+        self.seconds_per_char = seconds_per_char
+        self.latency = latency
+        self.latency_per_char = latency_per_char
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.max_concurrent = max_concurrent
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {}
+
+    def draw(self) -> float:
+        with self.lock:
+            return self.random.random()
+
+    def count(self, status: int):
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+class StubTTSHandler(BaseHTTPRequestHandler):
+    """Answers ElevenLabs text-to-speech requests with generated audio."""
+
+    settings = StubSettings()
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        match = TTS_PATH.match(path)
+        if not match:
+            return self.send_error_json(404, "Unknown endpoint")
+        if not self.headers.get("xi-api-key"):
+            return self.send_error_json(401, "Missing xi-api-key header")
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            text = body["text"]
+        except (ValueError, KeyError):
+            return self.send_error_json(400, "Request body must be JSON with a 'text' field")
+
+        settings = self.settings
+        with settings.lock:
+            settings.in_flight += 1
+            over_limit = settings.max_concurrent and settings.in_flight > settings.max_concurrent
+        try:
+            if over_limit or settings.draw() < settings.rate_limit_rate:
+                return self.send_error_json(429, "Too many concurrent requests",
+                                            {"Retry-After": f"{settings.retry_after:g}"})
+
+            delay = settings.latency + settings.latency_per_char * len(text)
+            if settings.jitter:
+                delay += settings.draw() * settings.jitter
+            streaming = bool(match.group("stream"))
+            # A stream starts after the base latency and spreads the rest over its chunks
+            time.sleep(settings.latency if streaming else delay)
+
+            if settings.draw() < settings.error_rate:
+                return self.send_error_json(500, "Injected server error")
+
+            seconds = audio_seconds_for_text(text, settings.seconds_per_char)
+            output_format = dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("output_format", "mp3")
+            if output_format.startswith("pcm_"):
+                audio, content_type = make_pcm(seconds, int(output_format[4:])), "audio/pcm"
+            else:
+                audio, content_type = make_mp3(seconds), "audio/mpeg"
+
+            settings.count(200)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            if streaming:
+                self.send_chunked(audio, max(0.0, delay - settings.latency))
+                return
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+        finally:
+            with settings.lock:
+                settings.in_flight -= 1
+
+    def send_chunked(self, audio: bytes, duration: float):
+        """Send audio with chunked transfer encoding, one chunk at a time over `duration` seconds."""
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = [audio[i:i + STREAM_CHUNK_BYTES] for i in range(0, len(audio), STREAM_CHUNK_BYTES)]
+        for chunk in chunks:
+            time.sleep(duration / len(chunks))
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_error_json(self, status: int, message: str, headers: Optional[dict] = None):
+        self.settings.count(status)
+        body = json.dumps({"detail": {"status": status, "message": message}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, settings: Optional[StubSettings] = None) -> ThreadingHTTPServer:
+    """Create (but do not start) a stub server; port 0 picks a free port (see server.server_address)."""
+    handler = type("ConfiguredStubTTSHandler", (StubTTSHandler,), {"settings": settings or StubSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    """Run the stub TTS server from the command line."""
+    parser = argparse.ArgumentParser(description="Local stand-in for the ElevenLabs text-to-speech API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--seconds-per-char", type=float, default=0.06, help="Audio seconds per text character (default: 0.06)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Base response delay in seconds (default: 0.2)")
+    parser.add_argument("--latency-per-char", type=float, default=0.002, help="Extra delay per text character (default: 0.002)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429 (default: 1)")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="Answer requests beyond this many in flight with a 429 (0: no limit)")
+    parser.add_argument("--seed", type=int, help="Seed for latency jitter and error injection")
+
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        seconds_per_char=args.seconds_per_char,
+        latency=args.latency,
+        latency_per_char=args.latency_per_char,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        max_concurrent=args.max_concurrent,
+        seed=args.seed
+    )
+    server = make_server(args.host, args.port, settings)
+    host, port = server.server_address[:2]
+    print(f"🔊 Stub TTS server listening on http://{host}:{port}")
+    print(f"   Set ELEVENLABS_BASE_URL=http://{host}:{port} to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 Responses by status: {settings.counts}")
+
+if __name__ == "__main__":
+    main()
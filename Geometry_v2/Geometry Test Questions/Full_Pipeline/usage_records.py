@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Usage Records
+Machine-readable token and latency accounting for the LLM calls of a pipeline run.
+
+Every LLM call made by a stage (generate_solution_steps.py, integrated_geometry_pipeline.py
+and video_claude.py) appends one UsageRecord as a JSON line to usage_records.jsonl in the
+run directory. A record holds the model, the prompt and completion tokens reported by the
+API, the wall time, the time to first token, the number of retries and whether the
+response came from the LLM response cache. Retries are counted by video_claude.py: a
+scene or diagram request repeated after a rejected answer, and every call of a Step 4
+run that terminal_pipeline.py started again because the scene durations were off.
+
+terminal_pipeline.py reads back the records written during its run, aggregates them
+exactly (no parsing of console output) and turns them into the per-question cost and
+latency report (pipeline_token_usage_report.json).
+
+Streamed calls (--stream) record when the first token arrived; for calls that are not
+streamed the first token arrives together with the full response, so time to first token
+equals the wall time of the call.
+
+Usage: python usage_records.py [--run-dir DIR]
+"""
+
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# OpenRouter prices in USD per 1M tokens (input, output)
+MODEL_PRICES = {
+    "anthropic/claude-sonnet-4": {"input": 3.00, "output": 15.00},
+    "google/gemini-2.5-pro": {"input": 1.25, "output": 10.00}
+}
+
+_write_lock = threading.Lock()
+
+class UsageRecord:
+    """Token usage and latency of a single LLM call."""
+
+    def __init__(self, stage: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                 wall_seconds: float = 0.0, ttft_seconds: Optional[float] = None, retries: int = 0,
+                 cached: bool = False, success: bool = True, call: Optional[str] = None,
+                 timestamp: Optional[float] = None):
+        """
+        Args:
+            stage (str): Stage script that made the call, e.g. "video_claude"
+            model (str): Model identifier, e.g. "anthropic/claude-sonnet-4"
+            prompt_tokens (int): Input tokens reported by the API (0 for a cache hit)
+            completion_tokens (int): Output tokens reported by the API (0 for a cache hit)
+            wall_seconds (float): Time from sending the request to having the full response
+            ttft_seconds (float): Time from sending the request to receiving the first token
+            retries (int): Number of repeated attempts before the call succeeded or gave up
+            cached (bool): Whether the response came from the LLM response cache
+            success (bool): Whether the call returned a usable response
+            call (str): Purpose of the call within the stage, e.g. "blueprint"
+            timestamp (float): Unix time at which the call finished
+        """
+        self.stage = stage
+        self.model = model
+        self.prompt_tokens = int(prompt_tokens or 0)
+        self.completion_tokens = int(completion_tokens or 0)
+        self.wall_seconds = float(wall_seconds or 0.0)
+        self.ttft_seconds = ttft_seconds
+        self.retries = int(retries or 0)
+        self.cached = cached
+        self.success = success
+        self.call = call or stage
+        self.timestamp = timestamp or time.time()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def cost_usd(self) -> Optional[float]:
+        """Cost of the call at MODEL_PRICES, or None for a model without a known price."""
+        prices = MODEL_PRICES.get(self.model)
+        if prices is None:
+            return None
+        return (self.prompt_tokens * prices["input"] + self.completion_tokens * prices["output"]) / 1_000_000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "call": self.call,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "ttft_seconds": round(self.ttft_seconds, 3) if self.ttft_seconds is not None else None,
+            "retries": self.retries,
+            "cached": self.cached,
+            "success": self.success,
+            "timestamp": self.timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UsageRecord":
+        return cls(
+            stage=data["stage"],
+            model=data["model"],
+            prompt_tokens=data.get("prompt_tokens", 0),
+            completion_tokens=data.get("completion_tokens", 0),
+            wall_seconds=data.get("wall_seconds", 0.0),
+            ttft_seconds=data.get("ttft_seconds"),
+            retries=data.get("retries", 0),
+            cached=data.get("cached", False),
+            success=data.get("success", True),
+            call=data.get("call"),
+            timestamp=data.get("timestamp")
+        )
+
+class UsageLog:
+    """Append-only JSON lines file of the UsageRecords of one run directory."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def record(self, record: UsageRecord):
+        """Append a record. Each record is a single write, so concurrent stages never interleave lines."""
+        line = json.dumps(record.to_dict()) + "\n"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _write_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def offset(self) -> int:
+        """Current end of the log; records appended later are read with read(offset)."""
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def read(self, start_offset: int = 0) -> List[UsageRecord]:
+        """Read the records appended at or after a byte offset of the log."""
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(start_offset)
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(UsageRecord.from_dict(json.loads(line)))
+                except (ValueError, KeyError):
+                    continue
+        return records
+
+def _empty_tokens() -> Dict[str, int]:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+def aggregate_usage(records: List[UsageRecord]) -> Dict[str, Any]:
+    """
+    Sum the token usage of a list of records.
+
+    Returns:
+        dict: {"total": tokens, "by_step": stage -> tokens, "by_model": model -> tokens}
+    """
+    usage = {"total": _empty_tokens(), "by_step": {}, "by_model": {}}
+    for record in records:
+        for bucket in (usage["total"],
+                       usage["by_step"].setdefault(record.stage, _empty_tokens()),
+                       usage["by_model"].setdefault(record.model, _empty_tokens())):
+            bucket["prompt_tokens"] += record.prompt_tokens
+            bucket["completion_tokens"] += record.completion_tokens
+            bucket["total_tokens"] += record.total_tokens
+    return usage
+
+def build_usage_report(records: List[UsageRecord]) -> Dict[str, Any]:
+    """
+    Build the cost and latency report of a run from its records.
+
+    Returns:
+        dict: Token usage (see aggregate_usage), cost in USD by model and stage,
+              latency totals by stage and the individual calls
+    """
+    cost = {"total": 0.0, "by_model": {}, "by_step": {}, "unpriced_models": []}
+    latency = {}
+    for record in records:
+        call_cost = record.cost_usd()
+        if call_cost is None:
+            if record.model not in cost["unpriced_models"]:
+                cost["unpriced_models"].append(record.model)
+            call_cost = 0.0
+        cost["total"] += call_cost
+        cost["by_model"][record.model] = cost["by_model"].get(record.model, 0.0) + call_cost
+        cost["by_step"][record.stage] = cost["by_step"].get(record.stage, 0.0) + call_cost
+
+        stage_latency = latency.setdefault(record.stage, {
+            "calls": 0, "cache_hits": 0, "failed_calls": 0, "retries": 0,
+            "wall_seconds": 0.0, "max_ttft_seconds": None
+        })
+        stage_latency["calls"] += 1
+        stage_latency["cache_hits"] += int(record.cached)
+        stage_latency["failed_calls"] += int(not record.success)
+        # Calls that repeated an earlier request (a record's retries is its attempt number - 1)
+        stage_latency["retries"] += int(record.retries > 0)
+        stage_latency["wall_seconds"] += record.wall_seconds
+        if record.ttft_seconds is not None:
+            previous = stage_latency["max_ttft_seconds"]
+            stage_latency["max_ttft_seconds"] = max(previous or 0.0, record.ttft_seconds)
+
+    cost["total"] = round(cost["total"], 6)
+    for key in ("by_model", "by_step"):
+        cost[key] = {name: round(value, 6) for name, value in cost[key].items()}
+    for stage_latency in latency.values():
+        stage_latency["wall_seconds"] = round(stage_latency["wall_seconds"], 3)
+
+    return {
+        "token_usage": aggregate_usage(records),
+        "cost_usd": cost,
+        "llm_latency": latency,
+        "calls": [record.to_dict() for record in records]
+    }
+
+def main():
+    """Print the cost and latency report of the usage records in a run directory."""
+    from run_context import RunContext
+
+    parser = argparse.ArgumentParser(description="Summarize the LLM usage records of a run directory")
+    RunContext.add_argument(parser)
+
+    args = parser.parse_args()
+
+    context = RunContext(args.run_dir)
+    records = UsageLog(context.usage_log_file).read()
+    if not records:
+        print(f"❌ No usage records in {context.usage_log_file}")
+        return
+
+    report = build_usage_report(records)
+    print(f"📊 {len(records)} LLM calls in {context.usage_log_file}")
+    for stage, tokens in report["token_usage"]["by_step"].items():
+        stage_latency = report["llm_latency"][stage]
+        print(f"   • {stage}: {tokens['total_tokens']:,} tokens, {stage_latency['wall_seconds']:.1f}s, "
+              f"{stage_latency['cache_hits']} cache hits, {stage_latency['retries']} retries, "
+              f"${report['cost_usd']['by_step'][stage]:.4f}")
+    print(f"💰 Total: {report['token_usage']['total']['total_tokens']:,} tokens, ${report['cost_usd']['total']:.4f}")
+
+if __name__ == "__main__":
+    main()
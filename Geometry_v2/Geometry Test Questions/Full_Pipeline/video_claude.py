@@ -12,16 +12,27 @@ import logging
 import time
 import base64
 import re
+import ast
 import argparse
 import sys
+import threading
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from openai import OpenAI
 
 # Import the enhanced prompt and style config
-import sys
-sys.path.append('/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline')
 from pipeline_prompts import ENHANCED_CODE_GENERATION_PROMPT_v4
+from llm_cache import LLMResponseCache
+from run_context import RunContext, StageResult
+from usage_records import UsageLog, UsageRecord
+from scene_code_generator import SceneTemplateError, scene_class_name, write_scenes_file
+from stream_extractors import (PythonBlockExtractor, StreamCancelled, check_block_syntax, read_openai_completion,
+                               stream_options)
+from tex_warmup import TexWarmup
+from element_id_checker import check_element_ids
+from scene_duration_checker import check_scene_code_durations, load_scene_timings
 # Load environment variables from current directory
 load_dotenv('.env')
 
@@ -32,16 +43,127 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# How all_scenes.py is produced:
+# - template: locally by scene_code_generator.py from the timing data and coordinates.json, no LLM call
+# - llm: by Claude with ENHANCED_CODE_GENERATION_PROMPT_v4
+# - auto: template, falling back to the LLM for elements or animations the template cannot express
+CODEGEN_MODES = ("auto", "template", "llm")
+
+# Per-scene generation (--per-scene): one request for the diagram functions, then one request
+# per solution step in parallel, all sharing the prompt and input files as a cached prefix
+SCENE_CONCURRENCY = 4
+SCENE_ATTEMPTS = 3
+SCENE_MAX_TOKENS = 8000
+
+# Hedged generation (--candidates K): K whole-file requests at once, each streamed and checked
+# as it completes (syntax, element ids, scene durations); the first one that passes is kept
+# and the others are cancelled. Candidate i samples at HEDGE_TEMPERATURES[i], so candidate 1
+# is the regular request and reuses its cached response
+HEDGE_TEMPERATURES = (0.1, 0.4, 0.7, 1.0)
+
+DIAGRAM_FUNCTIONS_INSTRUCTIONS = """
+==================================================
+FINAL INSTRUCTIONS
+==================================================
+Generate ONLY the complete diagram creation functions (create_complete_diagram_main, or
+create_complete_diagram_a, create_complete_diagram_b, ... for multi-part problems) described
+above. Each function returns {"complete_figure": VGroup, "elements": dict}, and the keys of
+"elements" MUST be the element ids used in the JSON (starting_diagram and geometric_elements,
+including the *_label ids).
+
+Do NOT write imports or scene classes: the scene classes are generated separately and call these functions.
+Return a single ```python code block.
+"""
+
+SCENE_CLASS_INSTRUCTIONS = """
+==================================================
+FINAL INSTRUCTIONS
+==================================================
+Generate ONLY the scene class for solution step "{step_id}":
+
+    class {class_name}(Scene):  # ThreeDScene for a 3D figure
+
+It MUST call one of the diagram creation functions above ({functions}) and use the keys of its
+"elements" dict; do NOT redefine those functions and do NOT write imports or any other class.
+Use the audio file {audio_path} and follow the timing rules for these sentences:
+
+{step_json}
+
+Return a single ```python code block.
+"""
+
+class StreamedSceneChecks:
+    """
+    Checks the scene classes (and diagram functions) of a streamed response as soon as each
+    one is complete (--stream): a syntax check right away and, if a TexWarmup is given,
+    compilation of its MathTex/Tex strings in the background while the remaining scenes are generated.
+    """
+    
+    def __init__(self, tex_warmup: Optional[TexWarmup] = None):
+        self.extractor = PythonBlockExtractor()
+        self.tex_warmup = tex_warmup
+        self.start_time = time.time()
+        self.scenes = []
+    
+    def feed(self, text: str):
+        """Add streamed text (the on_text callback of make_api_call)."""
+        for block in self.extractor.feed(text):
+            self.check_block(block)
+    
+    def check_block(self, block: Dict[str, Any]):
+        # Scene classes and the diagram functions they call
+        if block["kind"] not in ("class", "def"):
+            return
+        elapsed = time.time() - self.start_time
+        error = check_block_syntax(block["source"])
+        self.scenes.append({"name": block["name"], "complete_after_seconds": round(elapsed, 2), "syntax_error": error})
+        if error:
+            logger.warning(f"⚠️  {block['name']} complete after {elapsed:.1f}s with a syntax error ({error}), "
+                           f"fixed after generation")
+            return
+        logger.info(f"✓ {block['name']} complete after {elapsed:.1f}s, syntax OK")
+        if self.tex_warmup is not None:
+            self.tex_warmup.submit(block["source"], block["name"])
+    
+    def finish(self) -> dict:
+        """
+        End of the response: check the last block and wait for the LaTeX warm-up.
+        
+        Returns:
+            dict: Per-block completion times and syntax errors, plus the LaTeX warm-up summary
+        """
+        for block in self.extractor.finish():
+            self.check_block(block)
+        summary = {"scenes": self.scenes}
+        if self.tex_warmup is not None:
+            summary["tex_warmup"] = self.tex_warmup.close()
+            logger.info(f"🔤 LaTeX warm-up: {summary['tex_warmup']['compiled']} expressions compiled, "
+                        f"{summary['tex_warmup']['failed']} failed")
+        return summary
+
 class SingleClaudeAPICall:
     """Make a single API call to Claude Sonnet 4 using OpenRouter API."""
     
-    def __init__(self, api_key: str = None, model: str = "anthropic/claude-sonnet-4"):
+    def __init__(self, api_key: str = None, model: str = "anthropic/claude-sonnet-4", use_cache: bool = True,
+                 usage_log: UsageLog = None, stream: bool = False, regeneration: int = 0):
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable not set")
         
         self.model = model
         self.client = OpenAI(api_key=self.api_key, base_url="https://openrouter.ai/api/v1")
+        # Cached responses are ignored (but still refreshed) when use_cache is False
+        self.response_cache = LLMResponseCache(bypass=not use_cache)
+        # Token and latency record of every API call (default: the current run directory)
+        self.usage_log = usage_log or UsageLog(RunContext().usage_log_file)
+        # Stream responses token by token, so finished scene classes are checked during generation
+        self.stream = stream
+        # Step 4 runs before this one that were rejected (terminal_pipeline.py regenerations);
+        # counted into the retries of every usage record
+        self.regeneration = max(0, regeneration)
+        # Response and cleaned code of the last successful generate_complete_manim_code call
+        self.last_response = None
+        self.last_code = None
         
         logger.info(f"Initialized API client with model: {self.model}")
     
@@ -82,16 +204,16 @@ class SingleClaudeAPICall:
         
         return loaded_files
     
-    def create_comprehensive_prompt(self, loaded_files: dict, additional_context: str = ""):
+    def create_input_files_prompt(self, loaded_files: dict):
         """
-        Create a comprehensive prompt that includes all input files.
+        Create the enhanced prompt followed by all input files. This part is the same for
+        every request about one question, so per-scene requests send it as a cached prefix.
         
         Args:
             loaded_files (dict): Dictionary containing loaded file contents
-            additional_context (str): Additional context to append
             
         Returns:
-            str: Complete prompt for API call
+            str: Prompt with the input files section
         """
         # Start with the enhanced prompt
         prompt = ENHANCED_CODE_GENERATION_PROMPT_v4
@@ -115,6 +237,21 @@ class SingleClaudeAPICall:
                 
                 prompt += "\n"
         
+        return prompt
+    
+    def create_comprehensive_prompt(self, loaded_files: dict, additional_context: str = ""):
+        """
+        Create a comprehensive prompt that includes all input files.
+        
+        Args:
+            loaded_files (dict): Dictionary containing loaded file contents
+            additional_context (str): Additional context to append
+            
+        Returns:
+            str: Complete prompt for API call
+        """
+        prompt = self.create_input_files_prompt(loaded_files)
+        
         # Note: additional_context intentionally omitted from final prompt
         
         # Add final instructions
@@ -265,7 +402,10 @@ The generated code should be ready to render immediately with Manim.
     
 
     
-    def make_api_call(self, prompt: str, image_path: str = None, temperature: float = 0.1, max_tokens: int = 20000):
+    def make_api_call(self, prompt: str, image_path: str = None, temperature: float = 0.1, max_tokens: int = 20000,
+                      cached_prefix: Optional[List[str]] = None, call: str = "scene_code",
+                      on_text: Optional[Callable[[str], None]] = None, stream: Optional[bool] = None,
+                      retries: int = 0):
         """
         Make a single API call to Claude Sonnet 4.
         
@@ -274,18 +414,47 @@ The generated code should be ready to render immediately with Manim.
             image_path (str, optional): Path to an image file to include
             temperature (float): Temperature for response generation (0.0 to 1.0)
             max_tokens (int): Maximum number of tokens in the response
+            cached_prefix (list, optional): Text blocks sent before the prompt, each marked with
+                                            cache_control so requests sharing them reuse the provider's prompt cache
+            call (str): Purpose of the call, recorded in the usage log
+            on_text (callable, optional): Called with the response text as it arrives (every
+                                          streamed delta, or the whole text of a cached or non-streamed response);
+                                          raising StreamCancelled from it stops a streamed generation
+            stream (bool, optional): Stream this response (default: the stream setting of the caller)
+            retries (int): Earlier attempts of the same request, recorded in the usage log
             
         Returns:
-            dict: API response with content and metadata
+            dict: API response with content and metadata, or None if the call failed or was cancelled
         """
+        start_time = None
+        stream = self.stream if stream is None else stream
+        retries += self.regeneration
         try:
             messages = [{"role": "user", "content": prompt}]
+            image_bytes = []
+            
+            if cached_prefix:
+                # Image first, then the shared text: the cache breakpoints cover both
+                content = []
+                if image_path and os.path.exists(image_path):
+                    with open(image_path, "rb") as image_file:
+                        raw_image = image_file.read()
+                    content.append({
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/png;base64,{base64.b64encode(raw_image).decode('utf-8')}"}
+                    })
+                    image_bytes.append(raw_image)
+                for block in cached_prefix:
+                    content.append({"type": "text", "text": block, "cache_control": {"type": "ephemeral"}})
+                content.append({"type": "text", "text": prompt})
+                messages[0]["content"] = content
             
             # Add image if provided
-            if image_path and os.path.exists(image_path):
+            elif image_path and os.path.exists(image_path):
                 try:
                     with open(image_path, "rb") as image_file:
-                        image_data = base64.b64encode(image_file.read()).decode('utf-8')
+                        raw_image = image_file.read()
+                    image_data = base64.b64encode(raw_image).decode('utf-8')
                     
                     messages[0]["content"] = [
                         {
@@ -299,10 +468,41 @@ The generated code should be ready to render immediately with Manim.
                             }
                         }
                     ]
+                    image_bytes.append(raw_image)
                     logger.info(f"Including image in API call: {image_path}")
                 except Exception as e:
                     logger.warning(f"Failed to include image: {e}")
             
+            # Return the cached response if this exact request was made before
+            cache_key = self.response_cache.make_key(
+                model=self.model,
+                prompt_parts=(cached_prefix or []) + [prompt],
+                images=image_bytes,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"⚡ Using cached Claude response (saved {cached['total_tokens']} tokens)")
+                self.usage_log.record(UsageRecord("video_claude", self.model, cached=True, retries=retries, call=call))
+                if on_text is not None:
+                    on_text(cached['content'])
+                return {
+                    'content': cached['content'],
+                    'metadata': {
+                        'duration': 0.0,
+                        'prompt_tokens': 0,
+                        'completion_tokens': 0,
+                        'total_tokens': 0,
+                        'response_length': len(cached['content']),
+                        'speed_chars_per_sec': None,
+                        'model': self.model,
+                        'temperature': temperature,
+                        'max_tokens': max_tokens,
+                        'cache_hit': True
+                    }
+                }
+            
             # Calculate input tokens (rough estimate)
             input_tokens = len(prompt.split()) * 1.3  # Rough estimate for tokens
             logger.info(f"📊 Estimated input tokens: {input_tokens:.0f}")
@@ -321,19 +521,36 @@ The generated code should be ready to render immediately with Manim.
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **(stream_options() if stream else {})
             )
             
-            end_time = time.time()
-            duration = end_time - start_time
-            
-            result = response.choices[0].message.content
-            
-            # Extract token usage from response
-            usage = response.usage
-            prompt_tokens = usage.prompt_tokens if usage else None
-            completion_tokens = usage.completion_tokens if usage else None
-            total_tokens = usage.total_tokens if usage else None
+            if stream:
+                # Tokens are handed to on_text as they arrive; usage comes with the final chunk
+                completion = read_openai_completion(response, on_text, start_time)
+                result = completion.content
+                duration = completion.wall_seconds
+                ttft = completion.ttft_seconds
+                usage = completion.usage
+                prompt_tokens = usage.get("prompt_tokens")
+                completion_tokens = usage.get("completion_tokens")
+                total_tokens = usage.get("total_tokens")
+                logger.info(f"⚡ First token after {ttft:.2f} seconds")
+            else:
+                end_time = time.time()
+                duration = end_time - start_time
+                # The response is not streamed, so the first token arrives with the rest
+                ttft = duration
+                
+                result = response.choices[0].message.content
+                if on_text is not None:
+                    on_text(result)
+                
+                # Extract token usage from response
+                usage = response.usage
+                prompt_tokens = usage.prompt_tokens if usage else None
+                completion_tokens = usage.completion_tokens if usage else None
+                total_tokens = usage.total_tokens if usage else None
             
             # Log detailed metrics
             logger.info(f"⏱️  API call completed in {duration:.2f} seconds")
@@ -350,6 +567,23 @@ The generated code should be ready to render immediately with Manim.
             logger.info(f"📄 Response length: {len(result)} characters")
             logger.info(f"⚡ Average speed: {len(result)/duration:.0f} characters/second")
             
+            self.usage_log.record(UsageRecord(
+                "video_claude", self.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                wall_seconds=duration,
+                ttft_seconds=ttft,
+                retries=retries,
+                call=call
+            ))
+            
+            self.response_cache.put(cache_key, {
+                'content': result,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': total_tokens
+            })
+            
             # Return comprehensive response
             return {
                 'content': result,
@@ -360,17 +594,156 @@ The generated code should be ready to render immediately with Manim.
                     'total_tokens': total_tokens,
                     'response_length': len(result),
                     'speed_chars_per_sec': len(result)/duration,
+                    'ttft_seconds': ttft,
+                    'streamed': stream,
                     'model': self.model,
                     'temperature': temperature,
-                    'max_tokens': max_tokens
+                    'max_tokens': max_tokens,
+                    'cache_hit': False
                 }
             }
             
+        except StreamCancelled:
+            logger.info(f"🛑 {call}: generation cancelled")
+            if start_time is not None:
+                # Tokens generated before the cancellation are not reported by the API
+                self.usage_log.record(UsageRecord(
+                    "video_claude", self.model,
+                    wall_seconds=time.time() - start_time,
+                    retries=retries,
+                    success=False,
+                    call=call
+                ))
+            return None
         except Exception as e:
             logger.error(f"API call failed: {e}")
+            if start_time is not None:
+                self.usage_log.record(UsageRecord(
+                    "video_claude", self.model,
+                    wall_seconds=time.time() - start_time,
+                    retries=retries,
+                    success=False,
+                    call=call
+                ))
             return None
     
-    def generate_complete_manim_code(self, input_config: dict, additional_context: str = "", output_file: str = "all_scenes.py"):
+    def prepare_code(self, content: str, output_file: str = "all_scenes.py") -> str:
+        """
+        Clean a whole-file response into Python code, fixing common syntax issues if needed.
+        
+        Raises:
+            SyntaxError: If the code is still invalid after the fixes
+        """
+        # Clean the code output
+        logger.info("🧹 Cleaning code output...")
+        cleaned_code = self.clean_code_output(content)
+        
+        # Validate that the cleaned code is valid Python
+        logger.info("🔍 Validating Python syntax...")
+        try:
+            compile(cleaned_code, output_file, 'exec')
+            logger.info("✅ Code syntax validation passed")
+        except SyntaxError as e:
+            logger.error(f"❌ Code syntax validation failed: {e}")
+            logger.error("Attempting to fix common syntax issues...")
+            cleaned_code = self.fix_common_syntax_issues(cleaned_code)
+            # Try validation again
+            compile(cleaned_code, output_file, 'exec')
+            logger.info("✅ Code syntax validation passed after fixes")
+        return cleaned_code
+    
+    def check_candidate(self, code: str, timings: Optional[List[dict]]) -> List[str]:
+        """
+        Static checks of a hedged candidate's code: element ids against the diagram functions
+        and, if timings are given, every scene's estimated duration against its audio.
+        
+        Returns:
+            list: Problems found (empty if the candidate passes)
+        """
+        problems = []
+        id_report = check_element_ids(code)
+        problems += [f"{unknown['scene']} line {unknown['line']}: unknown element id '{unknown['element_id']}'"
+                     for unknown in id_report["unknown_ids"]]
+        if timings is not None:
+            duration_report = check_scene_code_durations(code, timings)
+            if duration_report["error"]:
+                problems.append(duration_report["error"])
+            problems += [f"{scene['scene']}: ~{scene['estimated_seconds']:.2f}s of video for "
+                         f"{scene['audio_seconds']:.2f}s of audio"
+                         for scene in duration_report["scenes"] if not scene["ok"]]
+        return problems
+    
+    def request_hedged_code(self, prompt: str, image_path: Optional[str], candidates: int,
+                            timings: Optional[List[dict]], output_file: str = "all_scenes.py"
+                            ) -> Tuple[Optional[dict], Optional[str], dict]:
+        """
+        Start `candidates` whole-file requests at once and keep the first response that passes
+        the syntax check and check_candidate(); the other requests are cancelled mid-stream.
+        
+        Returns:
+            tuple: (winning response or None, its cleaned code or None, summary of every candidate)
+        """
+        start_time = time.time()
+        stop_candidates = threading.Event()
+        
+        def cancel_if_stopped(text: str):
+            if stop_candidates.is_set():
+                raise StreamCancelled()
+        
+        def generate(index: int):
+            # Always streamed: a non-streamed request could not be cancelled
+            return self.make_api_call(prompt, image_path, temperature=HEDGE_TEMPERATURES[index],
+                                      call=f"scene_code:candidate_{index + 1}", on_text=cancel_if_stopped, stream=True)
+        
+        logger.info(f"🚀 Starting {candidates} candidate generations (temperatures "
+                    f"{', '.join(str(t) for t in HEDGE_TEMPERATURES[:candidates])})...")
+        results = [{"candidate": index + 1, "temperature": HEDGE_TEMPERATURES[index], "status": "cancelled"}
+                   for index in range(candidates)]
+        winner = None
+        executor = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="candidate")
+        try:
+            futures = {executor.submit(generate, index): index for index in range(candidates)}
+            for future in as_completed(futures):
+                index = futures[future]
+                result = results[index]
+                response = future.result()
+                if response is None:
+                    result["status"] = "failed"
+                    continue
+                result["complete_after_seconds"] = round(time.time() - start_time, 2)
+                result["tokens"] = response['metadata'].get('total_tokens')
+                try:
+                    code = self.prepare_code(response['content'], output_file)
+                    problems = self.check_candidate(code, timings)
+                except SyntaxError as e:
+                    problems = [f"syntax error: {e}"]
+                if problems:
+                    result.update({"status": "rejected", "problems": problems})
+                    logger.warning(f"⚠️  Candidate {index + 1} rejected after {result['complete_after_seconds']:.1f}s "
+                                   f"({len(problems)} problems): {problems[0]}")
+                    continue
+                result["status"] = "accepted"
+                logger.info(f"✅ Candidate {index + 1} accepted after {result['complete_after_seconds']:.1f}s, "
+                            f"cancelling the others")
+                winner = (response, code)
+                break
+        finally:
+            # The other requests stop at their next token; the winner does not wait for them
+            stop_candidates.set()
+            executor.shutdown(wait=False)
+        
+        summary = {
+            "candidates": candidates,
+            "winner": next((r["candidate"] for r in results if r["status"] == "accepted"), None),
+            "wall_seconds": round(time.time() - start_time, 2),
+            "results": results
+        }
+        if winner is None:
+            return None, None, summary
+        return winner[0], winner[1], summary
+    
+    def generate_complete_manim_code(self, input_config: dict, additional_context: str = "", output_file: str = "all_scenes.py",
+                                     media_dir: Optional[str] = None, candidates: int = 1, audio_dir: Optional[str] = None):
         """
         Generate complete Manim code using all input files.
         
@@ -378,6 +751,12 @@ The generated code should be ready to render immediately with Manim.
             input_config (dict): Dictionary containing file paths
             additional_context (str): Additional context for the prompt
             output_file (str): Output file name
+            media_dir (str, optional): Media directory of the run; when streaming, the LaTeX of
+                                       each finished scene class is compiled into its Tex cache
+            candidates (int): Number of hedged requests started at once (see request_hedged_code);
+                              1 makes a single request
+            audio_dir (str, optional): Scene audio directory, whose MP3 durations the hedged
+                                       candidates are checked against (default: the timing data)
             
         Returns:
             bool: True if successful, False otherwise
@@ -394,53 +773,297 @@ The generated code should be ready to render immediately with Manim.
             # Get image path for API call
             image_path = loaded_files.get("question_image")
             
+            if candidates > 1:
+                return self.generate_hedged_manim_code(prompt, image_path, input_config, output_file,
+                                                       candidates, audio_dir)
+            
             # Make API call
             logger.info("🚀 Making comprehensive API call...")
-            response = self.make_api_call(prompt, image_path)
+            stream_checks = None
+            if self.stream:
+                stream_checks = StreamedSceneChecks(TexWarmup(media_dir) if media_dir else None)
+            response = self.make_api_call(prompt, image_path, on_text=stream_checks.feed if stream_checks else None)
+            if stream_checks is not None:
+                stream_summary = stream_checks.finish()
+                if response:
+                    response['metadata']['stream_checks'] = stream_summary
             
             if not response:
                 logger.error("❌ API call failed!")
                 return False
             
-            # Clean the code output
-            logger.info("🧹 Cleaning code output...")
-            cleaned_code = self.clean_code_output(response['content'])
-            
-            # Validate that the cleaned code is valid Python
-            logger.info("🔍 Validating Python syntax...")
             try:
-                compile(cleaned_code, output_file, 'exec')
-                logger.info("✅ Code syntax validation passed")
+                cleaned_code = self.prepare_code(response['content'], output_file)
             except SyntaxError as e:
-                logger.error(f"❌ Code syntax validation failed: {e}")
-                logger.error("Attempting to fix common syntax issues...")
-                cleaned_code = self.fix_common_syntax_issues(cleaned_code)
-                # Try validation again
-                try:
-                    compile(cleaned_code, output_file, 'exec')
-                    logger.info("✅ Code syntax validation passed after fixes")
-                except SyntaxError as e2:
-                    logger.error(f"❌ Code syntax still invalid after fixes: {e2}")
-                    return False
+                logger.error(f"❌ Code syntax still invalid after fixes: {e}")
+                return False
+            
+            self.save_generated_code(response, cleaned_code, output_file)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error generating code: {e}")
+            return False
+    
+    def generate_hedged_manim_code(self, prompt: str, image_path: Optional[str], input_config: dict,
+                                   output_file: str, candidates: int, audio_dir: Optional[str] = None) -> bool:
+        """
+        Whole-file generation with hedged candidates (generate_complete_manim_code(candidates=K)).
+        
+        Returns:
+            bool: True if a candidate passed the checks and was saved, False otherwise
+        """
+        if candidates > len(HEDGE_TEMPERATURES):
+            logger.warning(f"⚠️  At most {len(HEDGE_TEMPERATURES)} candidates are supported, using {len(HEDGE_TEMPERATURES)}")
+            candidates = len(HEDGE_TEMPERATURES)
+        
+        timings = None
+        try:
+            timings = load_scene_timings(input_config["deconstruct_parallel"], audio_dir)
+        except (KeyError, OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️  No timing data, candidates are not checked against the audio durations: {e}")
+        
+        response, cleaned_code, hedge_summary = self.request_hedged_code(prompt, image_path, candidates, timings, output_file)
+        if response is None:
+            logger.error(f"❌ None of the {candidates} candidates passed the checks")
+            return False
+        
+        # Tokens of every candidate that finished; cancelled ones are not reported by the API
+        finished = [r for r in hedge_summary["results"] if r.get("tokens") is not None]
+        metadata = dict(response['metadata'])
+        metadata['total_tokens_all_candidates'] = sum(int(r["tokens"] or 0) for r in finished)
+        metadata['hedge'] = hedge_summary
+        self.save_generated_code({'content': response['content'], 'metadata': metadata}, cleaned_code, output_file)
+        return True
+    
+    def save_generated_code(self, response: dict, cleaned_code: str, output_file: str):
+        """Write the code and its metadata and keep them as the last result."""
+        # Save the cleaned code
+        logger.info(f"💾 Saving code to {output_file}...")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(cleaned_code)
+        
+        logger.info(f"✅ Successfully generated and saved: {output_file}")
+        
+        # Save metadata
+        metadata_file = str(Path(output_file).with_name(f"{Path(output_file).stem}_metadata.json"))
+        with open(metadata_file, 'w') as f:
+            json.dump(response['metadata'], f, indent=2)
+        logger.info(f"📊 Metadata saved to: {metadata_file}")
+        
+        self.last_response = response
+        self.last_code = cleaned_code
+    
+    def extract_python_code(self, content: str) -> str:
+        """Code of the (longest) ```python block of a response, or the whole response without fences."""
+        blocks = re.findall(r"```(?:python)?[ \t]*\n(.*?)```", content, re.DOTALL)
+        code = max(blocks, key=len) if blocks else re.sub(r"^```(?:python)?|```$", "", content.strip())
+        return code.strip()
+    
+    def parse_generated_code(self, content: str) -> Tuple[str, ast.Module]:
+        """Extract and parse the code of a response, fixing common syntax issues if needed."""
+        code = self.extract_python_code(content)
+        try:
+            return code, ast.parse(code)
+        except SyntaxError:
+            code = self.fix_common_syntax_issues(code)
+            return code, ast.parse(code)
+    
+    def extract_diagram_functions(self, content: str) -> Tuple[str, List[str]]:
+        """
+        Diagram creation functions of a response (imports and scene classes are dropped).
+        
+        Returns:
+            tuple: (source of the functions, names of the create_complete_diagram_* functions)
+        
+        Raises:
+            SyntaxError: If the code does not parse
+            ValueError: If there is no create_complete_diagram_* function
+        """
+        code, tree = self.parse_generated_code(content)
+        kept = [node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.Assign))]
+        names = [node.name for node in kept
+                 if isinstance(node, ast.FunctionDef) and node.name.startswith("create_complete_diagram")]
+        if not names:
+            raise ValueError("no create_complete_diagram_* function in the response")
+        return "\n\n".join(ast.get_source_segment(code, node) for node in kept), names
+    
+    def extract_scene_class(self, content: str, class_name: str, diagram_functions: List[str]) -> str:
+        """
+        Source of the scene class of a response, checked against the diagram functions.
+        
+        Raises:
+            SyntaxError: If the code does not parse
+            ValueError: If the class is missing or calls an undefined diagram function
+        """
+        code, tree = self.parse_generated_code(content)
+        classes = [node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == class_name]
+        if not classes:
+            raise ValueError(f"no class {class_name} in the response")
+        for node in ast.walk(classes[0]):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+                    and node.func.id.startswith("create_complete_diagram") and node.func.id not in diagram_functions:
+                raise ValueError(f"{class_name} calls {node.func.id}(), which is not defined "
+                                 f"(available: {', '.join(diagram_functions)})")
+        return ast.get_source_segment(code, classes[0])
+    
+    def request_code(self, prompt: str, image_path: Optional[str], cached_prefix: List[str], call: str,
+                     extract, label: str) -> Tuple[Optional[Any], List[dict], int]:
+        """
+        Request code until `extract(content)` accepts it, up to SCENE_ATTEMPTS times. A rejected
+        response is quoted back with the reason, so a retry is a new request rather than a cache hit.
+        
+        Returns:
+            tuple: (value returned by extract, or None after the last failed attempt;
+                    metadata of every response; number of attempts, failed API calls included)
+        """
+        responses = []
+        attempt_prompt = prompt
+        for attempt in range(1, SCENE_ATTEMPTS + 1):
+            response = self.make_api_call(attempt_prompt, image_path, max_tokens=SCENE_MAX_TOKENS,
+                                          cached_prefix=cached_prefix, call=call, retries=attempt - 1)
+            if not response:
+                logger.warning(f"⚠️  {label}: API call failed (attempt {attempt}/{SCENE_ATTEMPTS})")
+                continue
+            responses.append(response['metadata'])
+            try:
+                return extract(response['content']), responses, attempt
+            except (SyntaxError, ValueError) as e:
+                logger.warning(f"⚠️  {label}: rejected (attempt {attempt}/{SCENE_ATTEMPTS}): {e}")
+                attempt_prompt = (f"{prompt}\n\nYour previous answer was rejected: {e}\n"
+                                  f"Previous answer:\n{response['content']}\n\nReturn a corrected version.")
+        return None, responses, SCENE_ATTEMPTS
+    
+    def generate_per_scene_manim_code(self, input_config: dict, output_file: str = "all_scenes.py",
+                                      max_concurrent: int = SCENE_CONCURRENCY, media_dir: Optional[str] = None):
+        """
+        Generate the Manim code one scene at a time: the diagram functions first, then one
+        request per step_id in parallel (at most max_concurrent at once). Every request shares
+        the prompt and input files as a cached prefix; each scene class is checked and retried
+        on its own, and the classes are assembled into output_file in step order.
+        
+        Args:
+            input_config (dict): Dictionary containing file paths
+            output_file (str): Output file name
+            max_concurrent (int): Maximum number of scene requests in flight
+            media_dir (str, optional): Media directory of the run; when streaming, the LaTeX of
+                                       each accepted scene class is compiled into its Tex cache
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        start_time = time.time()
+        tex_warmup = TexWarmup(media_dir) if self.stream and media_dir else None
+        try:
+            logger.info("📁 Loading input files...")
+            loaded_files = self.load_input_files(input_config)
+            image_path = loaded_files.get("question_image")
+            timing = loaded_files.get("deconstruct_parallel")
+            steps = timing.get("solution_steps", []) if isinstance(timing, dict) else []
+            if not steps:
+                logger.error("❌ No solution steps in the timing data")
+                return False
+            
+            shared_prefix = self.create_input_files_prompt(loaded_files)
+            
+            logger.info("🚀 Generating the diagram functions...")
+            diagram, diagram_responses, diagram_attempts = self.request_code(
+                DIAGRAM_FUNCTIONS_INSTRUCTIONS, image_path, [shared_prefix], "scene_code:diagram",
+                self.extract_diagram_functions, "Diagram functions"
+            )
+            if diagram is None:
+                logger.error("❌ Could not generate the diagram functions")
+                return False
+            diagram_code, diagram_functions = diagram
+            if tex_warmup is not None:
+                tex_warmup.submit(diagram_code, "diagram functions")
+            
+            def generate_scene(step: dict):
+                class_name = scene_class_name(step["step_id"])
+                prompt = SCENE_CLASS_INSTRUCTIONS.format(
+                    step_id=step["step_id"],
+                    class_name=class_name,
+                    functions=", ".join(diagram_functions),
+                    audio_path=step.get("audio_file_scene", f"{step['step_id']}_scene.mp3"),
+                    step_json=json.dumps(step, indent=2)
+                )
+                
+                def extract(content: str) -> str:
+                    scene_code = self.extract_scene_class(content, class_name, diagram_functions)
+                    compile(f"{diagram_code}\n\n{scene_code}", f"{class_name}.py", "exec")
+                    return scene_code
+                
+                scene_code, scene_responses, attempts = self.request_code(
+                    prompt, image_path, [shared_prefix, diagram_code], f"scene_code:{step['step_id']}", extract, class_name)
+                if scene_code is not None and tex_warmup is not None:
+                    # Compiled while the remaining scenes are still being generated
+                    tex_warmup.submit(scene_code, class_name)
+                return scene_code, scene_responses, attempts
+            
+            logger.info(f"🚀 Generating {len(steps)} scenes ({min(max_concurrent, len(steps))} at a time)...")
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent, len(steps)))) as executor:
+                results = list(executor.map(generate_scene, steps))
+            
+            failed = [step["step_id"] for step, (scene_code, _, _) in zip(steps, results) if scene_code is None]
+            if failed:
+                logger.error(f"❌ Could not generate scenes for: {', '.join(failed)}")
+                return False
+            
+            header = "\n".join([
+                "#!/usr/bin/env python3",
+                "",
+                "import sys",
+                "import os",
+                "from manim import *",
+                "import numpy as np",
+                "",
+                "sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))",
+                "from functions import *"
+            ])
+            code = "\n\n".join([header, diagram_code] + [scene_code for scene_code, _, _ in results]) + "\n"
+            compile(code, output_file, 'exec')
             
-            # Save the cleaned code
             logger.info(f"💾 Saving code to {output_file}...")
             with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(cleaned_code)
+                f.write(code)
             
-            logger.info(f"✅ Successfully generated and saved: {output_file}")
-            
-            # Save metadata
-            metadata_file = output_file.replace('.py', '_metadata.json')
+            responses = diagram_responses + [metadata for _, scene_responses, _ in results for metadata in scene_responses]
+            # Every request sent, including attempts that failed at the API and left no response
+            requests_sent = diagram_attempts + sum(attempts for _, _, attempts in results)
+            metadata = {
+                'duration': time.time() - start_time,
+                'prompt_tokens': sum(int(r.get('prompt_tokens') or 0) for r in responses),
+                'completion_tokens': sum(int(r.get('completion_tokens') or 0) for r in responses),
+                'total_tokens': sum(int(r.get('total_tokens') or 0) for r in responses),
+                'response_length': len(code),
+                'model': self.model,
+                'mode': 'per_scene',
+                'requests': requests_sent,
+                'scenes': [
+                    {"step_id": step["step_id"], "class": scene_class_name(step["step_id"]), "attempts": attempts}
+                    for step, (_, _, attempts) in zip(steps, results)
+                ],
+                'cache_hit': all(r.get('cache_hit') for r in responses)
+            }
+            if tex_warmup is not None:
+                metadata['tex_warmup'] = tex_warmup.close()
+                tex_warmup = None
+            metadata_file = str(Path(output_file).with_name(f"{Path(output_file).stem}_metadata.json"))
             with open(metadata_file, 'w') as f:
-                json.dump(response['metadata'], f, indent=2)
-            logger.info(f"📊 Metadata saved to: {metadata_file}")
+                json.dump(metadata, f, indent=2)
+            logger.info(f"✅ Successfully generated and saved: {output_file} "
+                        f"({len(steps)} scenes, {requests_sent} requests, {metadata['duration']:.2f} seconds)")
             
+            self.last_response = {'content': code, 'metadata': metadata}
+            self.last_code = code
             return True
-            
+        
         except Exception as e:
             logger.error(f"❌ Error generating code: {e}")
             return False
+        finally:
+            if tex_warmup is not None:
+                tex_warmup.close()
     
     def save_response(self, response: dict, output_file: str = "claude_response.txt"):
         """
@@ -467,12 +1090,146 @@ The generated code should be ready to render immediately with Manim.
         except Exception as e:
             logger.error(f"Failed to save response: {e}")
 
+def generate_scenes_from_template(context: RunContext, codegen: str) -> Optional[StageResult]:
+    """
+    Generate all_scenes.py with scene_code_generator.py.
+    
+    Returns:
+        StageResult: The result of the stage, or None if the LLM should generate the scenes instead
+    """
+    if not context.coordinates_json_file.exists():
+        if codegen == "template":
+            return StageResult.failure(f"Coordinate model not found: {context.coordinates_json_file}")
+        logger.info("📐 No coordinate model (figure.py came from the LLM), generating scenes with the LLM")
+        return None
+    
+    logger.info("🧩 Generating scene code from the timing data and coordinate model...")
+    try:
+        result = write_scenes_file(context)
+    except SceneTemplateError as e:
+        logger.warning(f"⚠️ The scene template cannot express this solution ({len(e.problems)} problems):")
+        for problem in e.problems:
+            logger.warning(f"   • {problem}")
+        if codegen == "template":
+            return StageResult.failure(f"Scene template failed: {e}")
+        logger.info("   Falling back to the LLM for the scene code")
+        return None
+    except (OSError, json.JSONDecodeError, SyntaxError) as e:
+        logger.error(f"❌ Error generating scene code: {e}")
+        return StageResult.failure(f"Scene template failed: {e}")
+    
+    logger.info(f"✅ {len(result['scenes'])} scenes generated without an LLM call "
+                f"in {result['metadata']['duration']:.2f} seconds")
+    return StageResult(
+        True,
+        outputs={
+            "scenes": str(context.scenes_file),
+            "metadata": str(context.scenes_metadata_file)
+        },
+        data={"scenes_code": result["scenes_code"], "generator": "template"},
+        token_usage={"claude": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+    )
+
+def run_stage(context: RunContext, use_cache: bool = True, codegen: str = "auto", per_scene: bool = False,
+              scene_concurrency: int = SCENE_CONCURRENCY, stream: bool = False, candidates: int = 1,
+              regeneration: int = 0) -> StageResult:
+    """
+    Run Step 4 (scene code generation) in the calling process.
+    
+    Args:
+        context (RunContext): Run whose solution, timing, coordinates and figure files
+                              are used and which receives all_scenes.py
+        use_cache (bool): Whether cached LLM responses may be used
+        codegen (str): One of CODEGEN_MODES; how all_scenes.py is produced
+        per_scene (bool): Ask the LLM for one scene per request, in parallel, instead of the whole file at once
+        scene_concurrency (int): Maximum number of scene requests in flight with per_scene
+        stream (bool): Stream the LLM responses; finished scene classes are syntax-checked and
+                       their LaTeX compiled into the run's Tex cache before generation ends
+        candidates (int): Start this many whole-file requests at once and keep the first that passes
+                          the syntax, element id and duration checks (not used with per_scene)
+        regeneration (int): Number of earlier Step 4 runs of this pipeline run whose scenes were
+                            rejected; recorded as retries of every LLM call
+        
+    Returns:
+        StageResult: Paths of the scene code and its metadata, the generated code and Claude token usage
+    """
+    if codegen not in CODEGEN_MODES:
+        return StageResult.failure(f"Unknown codegen mode: {codegen}")
+    if codegen != "llm":
+        result = generate_scenes_from_template(context, codegen)
+        if result is not None:
+            return result
+    
+    question_image_path = context.question_image
+    if not question_image_path or not os.path.exists(question_image_path):
+        return StageResult.failure(f"Question image file not found: {question_image_path}")
+    
+    input_config = {
+        "math_solution": str(context.solution_standard_file),
+        "deconstruct_parallel": str(context.geometric_timing_file),
+        "question_image": question_image_path,
+        "coordinates": str(context.coordinates_file),
+        "geometry_code": str(context.figure_file)
+    }
+    
+    try:
+        api_caller = SingleClaudeAPICall(use_cache=use_cache, usage_log=UsageLog(context.usage_log_file), stream=stream,
+                                         regeneration=regeneration)
+    except Exception as e:
+        return StageResult.failure(f"Failed to initialize API caller: {e}")
+    
+    if per_scene:
+        if candidates > 1:
+            logger.info("Hedged candidates apply to whole-file generation; per-scene requests are retried one by one")
+        generated = api_caller.generate_per_scene_manim_code(input_config=input_config, output_file=str(context.scenes_file),
+                                                             max_concurrent=scene_concurrency, media_dir=str(context.media_dir))
+    else:
+        generated = api_caller.generate_complete_manim_code(input_config=input_config, output_file=str(context.scenes_file),
+                                                            media_dir=str(context.media_dir), candidates=candidates,
+                                                            audio_dir=str(context.scene_audio_dir))
+    if not generated:
+        return StageResult.failure("Code generation failed")
+    
+    metadata = api_caller.last_response['metadata']
+    return StageResult(
+        True,
+        outputs={
+            "scenes": str(context.scenes_file),
+            "metadata": str(context.scenes_metadata_file)
+        },
+        data={"scenes_code": api_caller.last_code, "generator": "llm"},
+        token_usage={
+            "claude": {
+                "prompt_tokens": int(metadata.get('prompt_tokens') or 0),
+                "completion_tokens": int(metadata.get('completion_tokens') or 0),
+                "total_tokens": int(metadata.get('total_tokens') or 0)
+            }
+        }
+    )
+
 def main():
     """Main function to run the video generation from command line."""
     
     # Set up command line argument parser
     parser = argparse.ArgumentParser(description="Generate comprehensive Manim code from question image and pipeline data")
     parser.add_argument("--question-image", help="Path to the question image file (required)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses and call the API")
+    parser.add_argument("--codegen", choices=CODEGEN_MODES, default="auto",
+                        help="Generate the scenes from the timing data without an LLM call (template), with the LLM (llm), "
+                             "or with the template and the LLM as fallback (auto, default)")
+    parser.add_argument("--per-scene", action="store_true",
+                        help="Ask the LLM for one scene per request, in parallel, instead of the whole file at once")
+    parser.add_argument("--scene-concurrency", type=int, default=SCENE_CONCURRENCY,
+                        help=f"Maximum number of scene requests in flight with --per-scene (default: {SCENE_CONCURRENCY})")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the LLM response; check each scene class and compile its LaTeX as soon as it is complete")
+    parser.add_argument("--candidates", type=int, default=1,
+                        help=f"Start this many whole-file generations at once (at most {len(HEDGE_TEMPERATURES)}) and keep "
+                             "the first that passes the syntax, element id and duration checks (default: 1)")
+    parser.add_argument("--regeneration", type=int, default=0,
+                        help="Number of earlier runs whose scenes were rejected, recorded as retries in the usage log "
+                             "(set by terminal_pipeline.py)")
+    RunContext.add_argument(parser)
     
     args = parser.parse_args()
     
@@ -490,42 +1247,26 @@ def main():
         print(f"❌ Question image file not found: {question_image_path}")
         sys.exit(1)
     
-    # Define input file configuration with dynamic question image path
-    input_config = {
-        "math_solution": "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/math_solution_pipeline/math_solution_standard.json",
-        "deconstruct_parallel": "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/geometric_elements_with_timing.json",
-        "question_image": question_image_path,
-        "coordinates": "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/coordinates.txt",
-        "geometry_code": "/Users/kairos/Desktop/Prompt Generation/Geometry_v2/Geometry Test Questions/Full_Pipeline/figure.py"
-    }
+    context = RunContext(args.run_dir, question_image_path)
     
     # Note: ENHANCED_STYLE_CONFIG is automatically included from geometry_prompts.py
     
-    # Initialize the API caller
-    try:
-        api_caller = SingleClaudeAPICall()
-        logger.info("✅ API caller initialized successfully")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize API caller: {e}")
-        sys.exit(1)
-    
     # Generate complete Manim code
     logger.info("🎬 Starting comprehensive Manim code generation...")
     logger.info(f"📁 Question image: {question_image_path}")
     
-    success = api_caller.generate_complete_manim_code(
-        input_config=input_config,
-        output_file="all_scenes.py"
-    )
+    result = run_stage(context, use_cache=not args.no_cache, codegen=args.codegen, per_scene=args.per_scene,
+                       scene_concurrency=args.scene_concurrency, stream=args.stream, candidates=args.candidates,
+                       regeneration=args.regeneration)
     
-    if success:
+    if result.success:
         logger.info("✅ Code generation completed successfully!")
         logger.info("📁 Generated files:")
-        logger.info("   - all_scenes.py (main code file)")
-        logger.info("   - all_scenes_metadata.json (generation metadata)")
+        logger.info(f"   - {context.scenes_file} (main code file)")
+        logger.info(f"   - {context.scenes_metadata_file} (generation metadata)")
         logger.info("🎬 Ready to render with: manim -pql all_scenes.py SceneClassName")
     else:
-        logger.error("❌ Code generation failed!")
+        logger.error(f"❌ {result.error}")
         sys.exit(1)
 
 if __name__ == "__main__":